@@ -1,12 +1,24 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request, jsonify, make_response, render_template_string
 import sys
 import os
 import io
+import csv
+import json
+import time
+import hashlib
+import datetime
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from functools import wraps
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
 # Import everything from ppaPrediction
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import ppaPrediction as elo_module
+import ppaMetrics as metrics
+import ppaProfile
 from ppaPrediction import (
     train_elo, predict, predict_match, resolve_player,
     save_bet, get_reliability_score, get_elo,
@@ -24,6 +36,60 @@ def get_csvs(division):
 
 app = Flask(__name__)
 
+# ====== METRICS ======
+# Request timing hooks are only installed when PPA_METRICS is set.
+if metrics.ENABLED:
+    from flask.json.provider import DefaultJSONProvider
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with metrics.timer('ppa_json_serialize_seconds'):
+                return super().dumps(obj, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _start_timer():
+        request.environ['ppa.start'] = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        start = request.environ.get('ppa.start')
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            metrics.observe('ppa_http_request_seconds', time.perf_counter() - start,
+                            endpoint=endpoint, method=request.method)
+            metrics.inc('ppa_http_requests_total', endpoint=endpoint, status=response.status_code)
+        return response
+
+# ====== PROFILING ======
+# In debug mode any request with ?profile=1 is profiled on its own (see
+# ppaProfile); the report path comes back in the X-Profile header.
+@app.before_request
+def _start_profile():
+    if app.debug and request.args.get('profile') not in (None, '', '0'):
+        label = (request.endpoint or 'unmatched').replace('.', '_')
+        request.environ['ppa.profile'] = ppaProfile.Profiler(label).start()
+
+@app.after_request
+def _stop_profile(response):
+    profiler = request.environ.pop('ppa.profile', None)
+    if profiler is not None:
+        paths = profiler.stop()
+        response.headers['X-Profile'] = paths['report'] if paths else 'busy'
+    return response
+
+@app.teardown_request
+def _drop_profile(exc):
+    # after_request is skipped when a view raises; still release the profiler.
+    profiler = request.environ.pop('ppa.profile', None)
+    if profiler is not None:
+        profiler.stop()
+
+@app.route('/api/metrics')
+def api_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 HTML = '''<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -680,6 +746,9 @@ HTML = '''<!DOCTYPE html>
     <button class="div-btn active" onclick="switchDivision('mens', this)">Men's Doubles</button>
     <button class="div-btn" onclick="switchDivision('womens', this)">Women's Doubles</button>
     <button class="div-btn" onclick="switchDivision('mixed', this)">Mixed Doubles</button>
+    <span style="flex:1"></span>
+    <button class="div-btn eng-btn active" onclick="switchEngine('elo', this)">ELO</button>
+    <button class="div-btn eng-btn" onclick="switchEngine('glicko2', this)">Glicko-2</button>
   </div>
 
   <nav class="nav-tabs">
@@ -826,6 +895,7 @@ let currentBetData = null;
 let currentSettleIdx = null;
 let selectedTeam = null;
 let currentDivision = 'mens';
+let currentEngine = 'elo';
 
 function switchTab(name) {
   document.querySelectorAll('.panel').forEach(p => p.classList.remove('active'));
@@ -836,7 +906,7 @@ function switchTab(name) {
 
 function switchDivision(div, btn) {
   currentDivision = div;
-  document.querySelectorAll('.div-btn').forEach(b => b.classList.remove('active'));
+  document.querySelectorAll('.div-btn:not(.eng-btn)').forEach(b => b.classList.remove('active'));
   btn.classList.add('active');
   const labels = {'mens': "Men's Doubles", 'womens': "Women's Doubles", 'mixed': 'Mixed Doubles'};
   const label = labels[div] || div;
@@ -848,7 +918,23 @@ function switchDivision(div, btn) {
   });
 }
 
+function switchEngine(engine, btn) {
+  currentEngine = engine;
+  document.querySelectorAll('.eng-btn').forEach(b => b.classList.remove('active'));
+  btn.classList.add('active');
+  ['predict','bet','accuracy'].forEach(id => {
+    const res = document.getElementById(id + '-result');
+    if (res) res.innerHTML = '';
+  });
+}
+
+// Read-only endpoints go out as GETs and are revalidated with the ETag of
+// the last response, so repeat views come back as 304s served from apiCache.
+const GET_ENDPOINTS = new Set(['/api/rankings', '/api/teams', '/api/player', '/api/accuracy']);
+const apiCache = new Map();
+
 async function api(endpoint, data) {
+  if (GET_ENDPOINTS.has(endpoint)) return apiGet(endpoint, data);
   const res = await fetch(endpoint, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
@@ -857,6 +943,17 @@ async function api(endpoint, data) {
   return res.json();
 }
 
+async function apiGet(endpoint, params) {
+  const url = endpoint + '?' + new URLSearchParams(params);
+  const cached = apiCache.get(url);
+  const res = await fetch(url, { headers: cached ? { 'If-None-Match': cached.etag } : {} });
+  if (res.status === 304 && cached) return cached.data;
+  const data = await res.json();
+  const etag = res.headers.get('ETag');
+  if (etag) apiCache.set(url, { etag, data });
+  return data;
+}
+
 function showLoading(id) { document.getElementById(id).classList.add('show'); }
 function hideLoading(id) { document.getElementById(id).classList.remove('show'); }
 
@@ -870,7 +967,7 @@ async function runPredict() {
   if (players.some(p => !p)) return alert('Please enter all 4 players.');
   showLoading('predict-loading');
   document.getElementById('predict-result').innerHTML = '';
-  const data = await api('/api/predict', { players, division: currentDivision });
+  const data = await api('/api/predict', { players, division: currentDivision, engine: currentEngine });
   hideLoading('predict-loading');
   const p1 = (data.prob_team1 * 100).toFixed(1);
   const p2 = (data.prob_team2 * 100).toFixed(1);
@@ -920,7 +1017,7 @@ async function runBet() {
   if (players.some(p => !p) || !bankroll || !odds1 || !odds2) return alert('Please fill all fields.');
   showLoading('bet-loading');
   document.getElementById('bet-result').innerHTML = '';
-  const data = await api('/api/bet', { players, bankroll, odds1, odds2, tournament, division: currentDivision });
+  const data = await api('/api/bet', { players, bankroll, odds1, odds2, tournament, division: currentDivision, engine: currentEngine });
   hideLoading('bet-loading');
   currentBetData = data;
 
@@ -1063,9 +1160,9 @@ async function loadRankings() {
   document.getElementById('rankings-result').innerHTML = '';
   const data = await api('/api/rankings', { division: currentDivision });
   hideLoading('rankings-loading');
-  const rows = data.players.map((p, i) => `
+  const rows = data.players.map(p => `
     <tr>
-      <td><span class="rank-num">${i+1}</span></td>
+      <td><span class="rank-num">${p.rank}</span></td>
       <td class="player-name">${p.name}</td>
       <td class="elo-value">${p.elo}</td>
       <td>${p.matches}</td>
@@ -1093,9 +1190,9 @@ async function loadTeams() {
     document.getElementById('teams-result').innerHTML = `<div class="result-box error show">${data.error}</div>`;
     return;
   }
-  const rows = data.pairs.map((p, i) => `
+  const rows = data.pairs.map(p => `
     <tr>
-      <td><span class="rank-num">${i+1}</span></td>
+      <td><span class="rank-num">${p.rank}</span></td>
       <td class="player-name">${p.player1}</td>
       <td style="color:var(--muted);font-family:DM Mono,monospace;font-size:0.7rem;">+</td>
       <td class="player-name">${p.player2}</td>
@@ -1112,7 +1209,7 @@ async function loadTeams() {
 async function runAccuracy() {
   showLoading('accuracy-loading');
   document.getElementById('accuracy-result').innerHTML = '';
-  const data = await api('/api/accuracy', { division: currentDivision });
+  const data = await api('/api/accuracy', { division: currentDivision, engine: currentEngine });
   hideLoading('accuracy-loading');
 
   const lines = data.results.map(r => {
@@ -1156,7 +1253,7 @@ async function lookupPlayer() {
   document.getElementById('player-result').innerHTML = `
     <div style="margin-top:20px;display:grid;grid-template-columns:repeat(3,1fr);gap:16px;">
       <div class="stat-card"><div class="stat-label">Player</div><div style="font-family:Bebas Neue,sans-serif;font-size:1.6rem;color:var(--text)">${data.name}</div></div>
-      <div class="stat-card"><div class="stat-label">ELO Rating</div><div class="stat-value">${data.elo}</div></div>
+      <div class="stat-card"><div class="stat-label">ELO Rating · Rank ${data.rank} of ${data.total}</div><div class="stat-value">${data.elo}</div></div>
       <div class="stat-card"><div class="stat-label">Matches Played</div><div class="stat-value" style="color:var(--accent)">${data.matches}</div></div>
     </div>
     <div class="card" style="margin-top:16px;">
@@ -1168,6 +1265,21 @@ async function lookupPlayer() {
         <span style="font-family:Bebas Neue,sans-serif;font-size:1.8rem;color:var(--green)">${data.reliability}%</span>
       </div>
     </div>
+    <div style="margin-top:16px;display:grid;grid-template-columns:repeat(3,1fr);gap:16px;">
+      <div class="stat-card"><div class="stat-label">Record</div><div class="stat-value" style="color:var(--accent)">${data.wins}-${data.losses}</div></div>
+      <div class="stat-card"><div class="stat-label">Win Rate</div><div class="stat-value" style="color:var(--green)">${data.win_rate === null ? '—' : (data.win_rate * 100).toFixed(1) + '%'}</div></div>
+      <div class="stat-card"><div class="stat-label">Form (oldest → latest)</div><div class="stat-value" style="color:var(--accent2)">${data.form.results || '—'}</div></div>
+    </div>
+    <div class="card" style="margin-top:16px;">
+      <div class="stat-label" style="margin-bottom:12px;">Partners</div>
+      <div class="output-scroll">${data.partners.slice(0, 10).map(p =>
+        `<div><span class="t-name">${p.partner}</span><span style="color:var(--muted)"> · ${p.played} played · </span><span class="t-acc">${(p.win_rate * 100).toFixed(0)}%</span>${p.pair_elo === null ? '' : `<span style="color:var(--muted)"> · Pair ELO: </span><span class="t-loss">${p.pair_elo.toFixed(3)}</span>`}</div>`).join('')}</div>
+    </div>
+    <div class="card" style="margin-top:16px;">
+      <div class="stat-label" style="margin-bottom:12px;">Recent Matches</div>
+      <div class="output-scroll">${data.recent_matches.map(m =>
+        `<div><span style="color:${m.won ? 'var(--green)' : 'var(--red)'}">${m.won ? 'W' : 'L'} ${m.sets}</span> <span class="t-name">w/ ${m.partner}</span> vs ${m.opponents.join(' / ')}<span style="color:var(--muted)"> · ${m.tournament}${m.round ? ' ' + m.round : ''} · ${m.date}</span></div>`).join('')}</div>
+    </div>
     ${data.corrected ? `<div style="font-family:DM Mono,monospace;font-size:0.7rem;color:var(--muted);margin-top:8px;">⚡ Auto-corrected: "${data.original}" → "${data.name}"</div>` : ''}
   `;
 }
@@ -1179,11 +1291,203 @@ async function lookupPlayer() {
 def index():
     return render_template_string(HTML)
 
-def _train(division='mens'):
-    cfg = get_csvs(division)
-    if not os.path.exists(cfg['match_csv']):
-        raise FileNotFoundError(f"Match CSV not found: {cfg['match_csv']}")
-    elo_module.train_elo(cfg['match_csv'])
+# ====== MODEL SERVING ======
+# A background thread polls each division's match CSV and retrains in a
+# worker process whenever it changes, then swaps the new model into MODELS.
+# Requests only ever install an already-trained model (a handful of global
+# rebinds), so they keep serving the previous version until the swap and never
+# pay for a replay. Only the very first request for a division waits for its
+# initial training. The what-if checkpoints, every engine's accuracy backtest
+# and the tournament segments are produced by the same worker, so requests
+# only read them.
+POLL_SECONDS = 2.0
+EXPORT_PAGE = 200
+MODELS = {}
+_serve_lock = threading.Lock()
+_train_locks = {}
+_train_locks_guard = threading.Lock()
+_installed = None
+_worker = None
+_pool = None
+
+def _division(division):
+    return division if division in DIVISIONS else 'mens'
+
+def _file_version(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+def _train_lock(division):
+    # Created on first use, so divisions added to DIVISIONS after import get one too.
+    with _train_locks_guard:
+        return _train_locks.setdefault(division, threading.Lock())
+
+def _train_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+def refresh_model(division):
+    """Retrain division if its match CSV changed since the current model; returns the current model."""
+    path = DIVISIONS[division]['match_csv']
+    if not os.path.exists(path):
+        return MODELS.get(division)
+    mtime = os.stat(path).st_mtime_ns
+    with _train_lock(division):
+        current = MODELS.get(division)
+        if current is not None and current['source_mtime'] == mtime:
+            return current
+        version = _file_version(path)
+        if current is not None and current['version'] == version:
+            MODELS[division] = dict(current, source_mtime=mtime)
+            return MODELS[division]
+        scale = DIVISIONS[division]['scale']
+        state = _train_pool().submit(elo_module.train_snapshot, os.path.abspath(path),
+                                       record_timeline=True, vectorized=True,
+                                       calibration_scale=scale).result()
+        # Checkpoints need the row-by-row replay, so they get their own pass rather than slowing the wave replay.
+        state['checkpoints'] = _train_pool().submit(elo_module.train_checkpoints, os.path.abspath(path)).result()
+        engines = {name: _train_pool().submit(elo_module.train_engine_snapshot, os.path.abspath(path), name,
+                                              scale).result()
+                   for name in elo_module.ENGINES if name != 'elo'}
+        accuracy = {name: _train_pool().submit(elo_module.accuracy_report, os.path.abspath(path), scale, name).result()
+                    for name in elo_module.ENGINES}
+        tournaments = _train_pool().submit(elo_module.match_segments, os.path.abspath(path)).result()
+        MODELS[division] = {
+            'division': division,
+            'state': state,
+            'engines': engines,
+            'accuracy': accuracy,
+            'tournaments': tournaments,
+            'version': version,
+            'source_mtime': mtime,
+            'trained_at': time.time(),
+        }
+        return MODELS[division]
+
+def _watch():
+    while True:
+        for division in DIVISIONS:
+            try:
+                refresh_model(division)
+            except Exception as e:
+                print(f"Background training failed for {division}: {e}")
+        time.sleep(POLL_SECONDS)
+
+def _ensure_worker():
+    global _worker
+    if _worker is None:
+        with _serve_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_watch, name='model-trainer', daemon=True)
+                _worker.start()
+
+def current_model(division):
+    _ensure_worker()
+    division = _division(division)
+    model = MODELS.get(division)
+    if model is not None:
+        return model
+    if not os.path.exists(DIVISIONS[division]['match_csv']):
+        raise FileNotFoundError(f"Match CSV not found: {DIVISIONS[division]['match_csv']}")
+    return refresh_model(division)
+
+@contextmanager
+def using(model):
+    """Hold the serving lock with model's state installed in ppaPrediction."""
+    global _installed
+    with _serve_lock:
+        if _installed is not model:
+            elo_module.install_state(model['state'])
+            _installed = model
+        yield model
+
+@contextmanager
+def replaying():
+    """Hold the serving lock for a request that replays history into ppaPrediction's globals."""
+    global _installed
+    with _serve_lock:
+        _installed = None
+        try:
+            yield
+        finally:
+            _installed = None
+
+def model_engine(model, name):
+    """The named rating engine with model's ratings; None for ELO, which is served from ppaPrediction's globals."""
+    if name == 'elo':
+        return None
+    if name not in model['engines']:
+        raise ValueError(f"Unknown rating engine '{name}' (choose from {', '.join(elo_module.ENGINES)})")
+    return elo_module.get_engine(name, DIVISIONS[model['division']]['scale']).install(model['engines'][name])
+
+def model_info(model):
+    return {
+        'model_version': model['version'],
+        'model_trained_at': datetime.datetime.fromtimestamp(model['trained_at']).isoformat(timespec='seconds'),
+        'calibrated': model['state']['calibration'] is not None,
+    }
+
+# ====== HTTP CACHING ======
+# Read-only endpoints answer GET as well as POST. Their output depends only on
+# the division model and the query, so the ETag is derived from the model
+# version plus endpoint and parameters, and Last-Modified from the training
+# time. With PPA_DECAY_HALF_LIFE set, ratings also decay from one day to the
+# next, so the day is part of the ETag and Last-Modified is at least that
+# day's start. A matching If-None-Match / If-Modified-Since gets a 304 before
+# any work is done.
+def request_params():
+    if request.method == 'GET':
+        return request.args.to_dict()
+    return request.get_json(silent=True) or {}
+
+def _decay_day():
+    """The day number decayed ratings are served for, or None when ratings do not decay."""
+    if elo_module.DECAY_HALF_LIFE_DAYS is None:
+        return None
+    return elo_module.day_number(datetime.datetime.now(datetime.timezone.utc).date())
+
+def _etag(model, params, day=None):
+    key = request.path + '?' + '&'.join(f'{k}={params[k]}' for k in sorted(params))
+    version = model['version'] if day is None else f"{model['version']}-d{day}"
+    return version + '-' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+def _last_modified(model, day=None):
+    modified = int(model['trained_at'])
+    if day is not None:
+        modified = max(modified, day * 86400)
+    return datetime.datetime.fromtimestamp(modified, datetime.timezone.utc)
+
+def cacheable(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        params = request_params()
+        try:
+            model = current_model(params.get('division', 'mens'))
+        except FileNotFoundError:
+            return view(*args, **kwargs)
+        day = _decay_day()
+        etag = _etag(model, params, day)
+        last_modified = _last_modified(model, day)
+        if request.method == 'GET':
+            if request.if_none_match:
+                fresh = request.if_none_match.contains(etag)
+            else:
+                fresh = request.if_modified_since is not None and request.if_modified_since >= last_modified
+            if fresh:
+                response = make_response('', 304)
+                response.set_etag(etag)
+                response.last_modified = last_modified
+                return response
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.public = True
+            response.cache_control.no_cache = True
+        return response
+    return wrapper
 
 @app.route('/api/predict', methods=['POST'])
 def api_predict():
@@ -1191,24 +1495,33 @@ def api_predict():
     div = d.get('division', 'mens')
     cfg = get_csvs(div)
     try:
-        _train(div)
+        model = current_model(div)
+        engine = model_engine(model, d.get('engine', 'elo'))
     except FileNotFoundError as e:
         return jsonify({'error': str(e)}), 404
-    corrected = []
-    players = []
-    for p in d['players']:
-        r = elo_module.resolve_player(p)
-        if r != p:
-            corrected.append(f"'{p}' → '{r}'")
-        players.append(r)
-    prob = elo_module.predict([players[0], players[1]], [players[2], players[3]], cfg['scale'])
-    return jsonify({
-        'prob_team1': prob,
-        'prob_team2': 1 - prob,
-        'team1': [players[0], players[1]],
-        'team2': [players[2], players[3]],
-        'corrected': corrected if corrected else None
-    })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with using(model):
+        corrected = []
+        players = []
+        for p in d['players']:
+            r = elo_module.resolve_player(p)
+            if r != p:
+                corrected.append(f"'{p}' → '{r}'")
+            players.append(r)
+        if engine is None:
+            prob = elo_module.predict([players[0], players[1]], [players[2], players[3]], cfg['scale'])
+        else:
+            prob = engine.predict([players[0], players[1]], [players[2], players[3]])
+        return jsonify({
+            'prob_team1': prob,
+            'prob_team2': 1 - prob,
+            'team1': [players[0], players[1]],
+            'team2': [players[2], players[3]],
+            'corrected': corrected if corrected else None,
+            'engine': d.get('engine', 'elo'),
+            **model_info(model)
+        })
 
 @app.route('/api/bet', methods=['POST'])
 def api_bet():
@@ -1216,34 +1529,100 @@ def api_bet():
     div = d.get('division', 'mens')
     cfg = get_csvs(div)
     try:
-        _train(div)
+        model = current_model(div)
+        engine = model_engine(model, d.get('engine', 'elo'))
     except FileNotFoundError as e:
         return jsonify({'error': str(e)}), 404
-    corrected = []
-    players = []
-    for p in d['players']:
-        r = elo_module.resolve_player(p)
-        if r != p:
-            corrected.append(f"'{p}' → '{r}'")
-        players.append(r)
-    result = elo_module.predict_match(
-        [players[0], players[1]], [players[2], players[3]],
-        bankroll=d['bankroll'], odds_team1=d['odds1'], odds_team2=d['odds2'],
-        scale=cfg['scale'], return_kelly=True
-    )
-    return jsonify({
-        'prob_team1': result['probability_team1'],
-        'prob_team2': result['probability_team2'],
-        'bet_team1': result['suggested_bet_team1'],
-        'bet_team2': result['suggested_bet_team2'],
-        'reliability': result['reliability_factor'],
-        'team1': [players[0], players[1]],
-        'team2': [players[2], players[3]],
-        'odds1': d['odds1'],
-        'odds2': d['odds2'],
-        'tournament': d.get('tournament', ''),
-        'corrected': corrected if corrected else None
-    })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with using(model):
+        corrected = []
+        players = []
+        for p in d['players']:
+            r = elo_module.resolve_player(p)
+            if r != p:
+                corrected.append(f"'{p}' → '{r}'")
+            players.append(r)
+        result = elo_module.predict_match(
+            [players[0], players[1]], [players[2], players[3]],
+            bankroll=d['bankroll'], odds_team1=d['odds1'], odds_team2=d['odds2'],
+            scale=cfg['scale'], return_kelly=True, engine=engine
+        )
+        return jsonify({
+            'prob_team1': result['probability_team1'],
+            'prob_team2': result['probability_team2'],
+            'bet_team1': result['suggested_bet_team1'],
+            'bet_team2': result['suggested_bet_team2'],
+            'reliability': result['reliability_factor'],
+            'team1': [players[0], players[1]],
+            'team2': [players[2], players[3]],
+            'odds1': d['odds1'],
+            'odds2': d['odds2'],
+            'tournament': d.get('tournament', ''),
+            'corrected': corrected if corrected else None,
+            'engine': d.get('engine', 'elo'),
+            **model_info(model)
+        })
+
+@app.route('/api/slate', methods=['POST'])
+def api_slate():
+    d = request.json
+    div = d.get('division', 'mens')
+    cfg = get_csvs(div)
+    try:
+        model = current_model(div)
+        engine = model_engine(model, d.get('engine', 'elo'))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with using(model):
+        corrected = []
+        rows = []
+        for bet in d['bets']:
+            players = []
+            for p in bet['players']:
+                r = elo_module.resolve_player(p)
+                if r != p:
+                    corrected.append(f"'{p}' → '{r}'")
+                players.append(r)
+            rows.append(players + [bet['odds1'], bet['odds2']])
+        slate = pd.DataFrame(rows, columns=elo_module.SLATE_COLS)
+        result = elo_module.predict_slate(slate, bankroll=d.get('bankroll', 100), scale=cfg['scale'], engine=engine,
+                                          fraction=d.get('fraction', 1.0), max_fraction=d.get('max_fraction', 1.0))
+        return jsonify({**result, 'corrected': corrected if corrected else None,
+                        'engine': d.get('engine', 'elo'), **model_info(model)})
+
+@app.route('/api/scan', methods=['POST'])
+def api_scan():
+    """Edges for a slate of lines: a JSON body with "lines", or an uploaded CSV/JSON "file"."""
+    upload = request.files.get('file')
+    d = request.form.to_dict() if upload else request.json
+    div = d.get('division', 'mens')
+    cfg = get_csvs(div)
+    try:
+        model = current_model(div)
+        engine = model_engine(model, d.get('engine', 'elo'))
+        if upload is None:
+            slate = elo_module.slate_frame(d['lines'])
+        elif upload.filename.lower().endswith('.json'):
+            data = json.load(upload.stream)
+            slate = elo_module.slate_frame(data['lines'] if isinstance(data, dict) else data)
+        else:
+            slate = elo_module.slate_frame(pd.read_csv(upload.stream).to_dict('records'))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+    with using(model):
+        slate, corrections = elo_module.resolve_slate(slate)
+        lines = elo_module.scan_edges(slate, bankroll=float(d.get('bankroll', 100)), scale=cfg['scale'], engine=engine)
+        return jsonify({
+            'lines': lines,
+            'corrected': [f"'{n}' → '{r}'" for n, r in corrections.items()] or None,
+            'engine': d.get('engine', 'elo'),
+            **model_info(model)
+        })
 
 @app.route('/api/save_bet', methods=['POST'])
 def api_save_bet():
@@ -1312,163 +1691,228 @@ def api_settle():
     df.to_csv(cfg['bet_csv'], index=False)
     return jsonify({'ok': True, 'pnl': pnl})
 
-@app.route('/api/rankings', methods=['POST'])
+@app.route('/api/rankings', methods=['GET', 'POST'])
+@cacheable
 def api_rankings():
-    d = request.json
+    d = request_params()
     div = d.get('division', 'mens')
     try:
-        _train(div)
+        model = current_model(div)
     except FileNotFoundError as e:
         return jsonify({'error': str(e)}), 404
-    top = sorted(elo_module.player_elo.items(), key=lambda x: x[1], reverse=True)[:10]
-    players = []
-    for name, elo in top:
-        players.append({
-            'name': name,
-            'elo': round(elo, 3),
-            'matches': elo_module.matches_played.get(name, 0),
-            'reliability': elo_module.get_reliability_score(name)
-        })
-    return jsonify({'players': players})
-
-@app.route('/api/accuracy', methods=['POST'])
+    with using(model):
+        offset = max(0, int(d.get('offset', 0)))
+        limit = max(1, int(d.get('limit', 10)))
+        players = []
+        for row in elo_module.iter_leaderboard(offset, limit):
+            players.append({
+                'rank': row['rank'],
+                'name': row['player'],
+                'elo': round(row['elo'], 3),
+                'matches': row['matches_played'],
+                'reliability': row['reliability_score']
+            })
+        return jsonify({'players': players, 'offset': offset, 'total': len(elo_module.rank_index), **model_info(model)})
+
+@app.route('/api/rankings/export')
+@cacheable
+def api_rankings_export():
+    div = request.args.get('division', 'mens')
+    try:
+        model = current_model(div)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    # A trained model's rank index never changes, so the export reads it a page at a time, reinstalling the
+    # model for each page. Memory stays at one page, and the serve lock is not held while the client reads.
+    total = len(model['state']['rank_index'])
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(['rank', 'player', 'elo', 'matches_played', 'reliability_score'])
+        for offset in range(0, total, EXPORT_PAGE):
+            with using(model):
+                rows = list(elo_module.iter_leaderboard(offset, EXPORT_PAGE))
+            for row in rows:
+                writer.writerow([row['rank'], row['player'], row['elo'], row['matches_played'], row['reliability_score']])
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    return Response(generate(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={div}_rankings.csv'})
+
+@app.route('/api/accuracy', methods=['GET', 'POST'])
+@cacheable
 def api_accuracy():
-    import io, sys
-    d = request.json
+    d = request_params()
     cfg = get_csvs(d.get('division', 'mens'))
     if not os.path.exists(cfg['match_csv']):
         return jsonify({'error': f"Match CSV not found: {cfg['match_csv']}"}), 404
+    engine_name = d.get('engine', 'elo')
+    if engine_name not in elo_module.ENGINES:
+        return jsonify({'error': f"Unknown rating engine '{engine_name}'"}), 400
+    # The backtest only depends on the match CSV, so the trainer computes it with the model.
+    model = current_model(d.get('division', 'mens'))
+    return jsonify({**model['accuracy'][engine_name], **model_info(model)})
+
+@app.route('/api/tournaments', methods=['GET', 'POST'])
+@cacheable
+def api_tournaments():
+    d = request_params()
+    try:
+        model = current_model(d.get('division', 'mens'))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    # The trainer works the segments out with the model, so they always describe the data it was trained on.
+    segments = model['tournaments']
+    return jsonify({'tournaments': segments, 'total': len(segments),
+                    'matches': sum(seg['matches'] for seg in segments), **model_info(model)})
 
-    # Capture stdout from tournament_accuracy
-    old_stdout = sys.stdout
-    sys.stdout = buffer = io.StringIO()
+@app.route('/api/teams', methods=['GET', 'POST'])
+@cacheable
+def api_teams():
+    d = request_params()
+    div = d.get('division', 'mens')
     try:
-        raw_results = elo_module.tournament_accuracy(cfg['match_csv'], scale=0.15)
-    finally:
-        sys.stdout = old_stdout
-
-    # Parse results into structured format
-    results = []
-    cum_correct = cum_total = cum_log_loss = 0
-    WARMUP = 11
-    for t_idx, (t, acc, ll) in enumerate(raw_results):
-        is_warmup = t_idx < WARMUP
-        entry = {'tournament': t, 'accuracy': acc, 'log_loss': ll, 'warmup': is_warmup}
-        if not is_warmup:
-            # rough match count from accuracy - use raw_results as-is
-            entry['cum_accuracy'] = acc  # will be overwritten below
-            entry['cum_log_loss'] = ll
-        else:
-            entry['cum_accuracy'] = 0
-            entry['cum_log_loss'] = 0
-        results.append(entry)
-
-    # Recompute cumulative properly
-    cum_correct = cum_total = 0
-    cum_log_loss = 0.0
-    for i, (t, acc, ll) in enumerate(raw_results):
-        if i >= WARMUP:
-            # We don't have match counts from tournament_accuracy return value
-            # so use the captured output to get final numbers
-            pass
-
-    # Get final numbers from the captured buffer output
-    output = buffer.getvalue()
-    final_acc = 0
-    final_ll = 0
-    for line in output.split('\n'):
-        if 'Final Post-Warmup Accuracy' in line:
-            try:
-                final_acc = float(line.split(':')[1].strip().replace('%','')) / 100
-            except:
-                pass
-        if 'Final Post-Warmup Log Loss' in line:
-            try:
-                final_ll = float(line.split(':')[1].strip())
-            except:
-                pass
-
-    # Recompute cumulative from scratch using same logic as tournament_accuracy
-    import pandas as pd, math as _math
-    df = pd.read_csv(cfg['match_csv'])
-    df = df.sort_values(by='date').reset_index(drop=True)
-    tournaments = df['tournament'].unique()
-    elo_module.player_elo = {}
-    elo_module.recent_elo = {}
-    elo_module.matches_played = {}
-    elo_module.tournaments_seen = set()
-    elo_module.pair_elo.clear()
-    elo_module.pair_matches.clear()
-    cum_correct = cum_total = 0
-    cum_log_loss_total = 0.0
-    results2 = []
-    for t_idx, t in enumerate(tournaments):
-        t_matches = df[df['tournament'] == t]
-        is_warmup = t_idx < WARMUP
-        correct = total = 0
-        log_loss = 0.0
-        for _, row in t_matches.iterrows():
-            team1 = [row['team1_player1'], row['team1_player2']]
-            team2 = [row['team2_player1'], row['team2_player2']]
-            prob = elo_module.predict(team1, team2, cfg['scale'])
-            actual = 1 if row['team1_sets'] > row['team2_sets'] else 0
-            if (1 if prob > 0.5 else 0) == actual:
-                correct += 1
-            log_loss += -(_math.log(prob + 1e-9) if actual else _math.log(1 - prob + 1e-9))
-            total += 1
-            elo_module.update_elo(team1, team2, row['team1_sets'], row['team2_sets'], scale=cfg['scale'])
-        acc = correct / total
-        ll = log_loss / total
-        entry = {'tournament': t, 'accuracy': acc, 'log_loss': ll, 'warmup': is_warmup}
-        if not is_warmup:
-            cum_correct += correct
-            cum_total += total
-            cum_log_loss_total += log_loss
-            entry['cum_accuracy'] = cum_correct / cum_total
-            entry['cum_log_loss'] = cum_log_loss_total / cum_total
-        else:
-            entry['cum_accuracy'] = 0
-            entry['cum_log_loss'] = 0
-        results2.append(entry)
+        model = current_model(div)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    with using(model):
+        offset = max(0, int(d.get('offset', 0)))
+        limit = max(1, int(d.get('limit', 10)))
+        min_matches = max(0, int(d.get('min_matches', elo_module.PAIR_MIN_MATCHES)))
+        player = d.get('player')
+        if player:
+            player = elo_module.resolve_player(player)
+        rows, total = elo_module.top_pairs(limit, offset, min_matches, player)
+        pairs = []
+        for rank, ((p1, p2), elo, matches) in enumerate(rows, start=offset + 1):
+            pairs.append({'rank': rank, 'player1': p1, 'player2': p2, 'pair_elo': round(elo, 3), 'matches': matches})
+        return jsonify({'pairs': pairs, 'offset': offset, 'total': total, 'min_matches': min_matches, 'player': player,
+                        **model_info(model)})
+
+@app.route('/api/player', methods=['GET', 'POST'])
+@cacheable
+def api_player():
+    d = request_params()
+    div = d.get('division', 'mens')
+    try:
+        model = current_model(div)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    with using(model):
+        name = d['name']
+        resolved = elo_module.resolve_player(name)
+        if resolved not in elo_module.player_elo:
+            return jsonify({'error': f'Player "{name}" not found.'})
+        profile = elo_module.player_profile(resolved, max(1, int(d.get('recent', 10))))
+        return jsonify({
+            'name': resolved,
+            'original': name,
+            'corrected': resolved != name,
+            'elo': round(elo_module.get_elo(resolved), 3),
+            'rank': elo_module.player_rank(resolved),
+            'total': len(elo_module.rank_index),
+            'matches': elo_module.matches_played.get(resolved, 0),
+            'reliability': elo_module.get_reliability_score(resolved),
+            **profile,
+            **model_info(model)
+        })
 
-    final_acc2 = cum_correct / cum_total if cum_total > 0 else 0
-    final_ll2 = cum_log_loss_total / cum_total if cum_total > 0 else 0
-    return jsonify({'results': results2, 'final_accuracy': final_acc2, 'final_log_loss': final_ll2})
+@app.route('/api/h2h', methods=['GET', 'POST'])
+@cacheable
+def api_h2h():
+    d = request_params()
+    div = d.get('division', 'mens')
+    try:
+        model = current_model(div)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    players = d.get('players') or []
+    if isinstance(players, str):
+        players = [p.strip() for p in players.split(',') if p.strip()]
+    if len(players) not in (2, 4):
+        return jsonify({'error': 'Give 4 players (two teams) or 2 players.'}), 400
+    limit = max(1, int(d.get('limit', 20)))
+    with using(model):
+        resolved = [elo_module.resolve_player(p) for p in players]
+        corrected = [f"'{p}' → '{r}'" for p, r in zip(players, resolved) if r != p]
+        if len(resolved) == 4:
+            team1, team2 = resolved[:2], resolved[2:]
+            result = elo_module.head_to_head(team1, team2, limit)
+        else:
+            team1, team2 = resolved[:1], resolved[1:]
+            result = elo_module.player_head_to_head(resolved[0], resolved[1], limit)
+        return jsonify({**result, 'team1': team1, 'team2': team2, 'corrected': corrected if corrected else None,
+                        **model_info(model)})
 
-@app.route('/api/teams', methods=['POST'])
-def api_teams():
+@app.route('/api/player_history', methods=['POST'])
+def api_player_history():
     d = request.json
     div = d.get('division', 'mens')
     try:
-        _train(div)
+        model = current_model(div)
     except FileNotFoundError as e:
         return jsonify({'error': str(e)}), 404
-    pairs = []
-    for (p1, p2), elo in elo_module.pair_elo.items():
-        matches = elo_module.pair_matches.get((p1, p2), 0)
-        pairs.append({'player1': p1, 'player2': p2, 'pair_elo': round(elo, 3), 'matches': matches})
-    pairs = sorted(pairs, key=lambda x: x['pair_elo'], reverse=True)[:10]
-    return jsonify({'pairs': pairs})
-
-@app.route('/api/player', methods=['POST'])
-def api_player():
+    with using(model):
+        name = d['name']
+        resolved = elo_module.resolve_player(name)
+        if resolved not in elo_module.player_elo:
+            return jsonify({'error': f'Player "{name}" not found.'})
+        tl = elo_module.timeline
+        dates, match_idx, elos = elo_module.player_history(tl, resolved, points=int(d.get('points', 200)))
+        result = {
+            'name': resolved,
+            'original': name,
+            'corrected': resolved != name,
+            'history': [{'date': dt, 'match': int(m), 'elo': round(float(e), 4)}
+                        for dt, m, e in zip(dates, match_idx, elos)],
+            **model_info(model)
+        }
+        if d.get('as_of'):
+            result['as_of'] = d['as_of']
+            result['elo_as_of'] = round(elo_module.rating_as_of(tl, resolved, d['as_of']), 4)
+        return jsonify(result)
+
+@app.route('/api/whatif', methods=['POST'])
+def api_whatif():
     d = request.json
     div = d.get('division', 'mens')
     try:
-        _train(div)
+        model = current_model(div)
     except FileNotFoundError as e:
         return jsonify({'error': str(e)}), 404
-    name = d['name']
-    resolved = elo_module.resolve_player(name)
-    if resolved not in elo_module.player_elo:
-        return jsonify({'error': f'Player "{name}" not found.'})
+    limit = max(1, int(d.get('limit', 20)))
+    with replaying():
+        # The trainer records checkpoints with the model; only the short replay after one runs here.
+        store = model['state']['checkpoints']
+        try:
+            if d.get('before'):
+                state = elo_module.state_before(d['before'], store)
+                info = {'checkpoint': d['before'], 'checkpoint_row': store['positions'][store['labels'].index(d['before'])],
+                        'replayed': 0}
+            else:
+                changes = {}
+                for change in d.get('changes', []):
+                    row = int(change['row'])
+                    if not 0 <= row < len(store['rows']):
+                        raise ValueError(f"No match with row id {row}")
+                    if change.get('remove'):
+                        changes[row] = None
+                    elif change.get('flip'):
+                        team1_sets, team2_sets = store['rows'][row][5:]
+                        changes[row] = (team2_sets, team1_sets)
+                    else:
+                        changes[row] = (int(change['team1_sets']), int(change['team2_sets']))
+                state, info = elo_module.what_if(changes, store)
+        except (KeyError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        rankings = elo_module.compare_states(model['state'], state, limit)
     return jsonify({
-        'name': resolved,
-        'original': name,
-        'corrected': resolved != name,
-        'elo': round(elo_module.get_elo(resolved), 3),
-        'matches': elo_module.matches_played.get(resolved, 0),
-        'reliability': elo_module.get_reliability_score(resolved)
+        'rankings': [dict(r, elo=round(r['elo'], 3),
+                          base_elo=None if r['base_elo'] is None else round(r['base_elo'], 3)) for r in rankings],
+        **info,
+        **model_info(model)
     })
 
 if __name__ == '__main__':
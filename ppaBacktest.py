@@ -0,0 +1,215 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import ppaPrediction as elo_module
+
+# ====== CONFIG ======
+WARMUP_TOURNAMENTS = 11
+DEFAULT_MARGIN = 0.05       # bookmaker overround spread over both sides
+DEFAULT_NOISE = 0.3         # sd of market disagreement with the model, in logits
+DEFAULT_PATHS = 1000
+RUIN_LEVEL = 0.01           # a path is ruined once it falls below this share of the start
+
+MIN_ODDS = 1.01            # shortest price a book will offer
+
+PLAYER_COLS = ['team1_player1', 'team1_player2', 'team2_player1', 'team2_player2']
+
+STRATEGIES = {
+    'kelly_reliability': 'single-bet Kelly x reliability, as predict_match suggests',
+    'kelly': 'full single-bet Kelly',
+    'half_kelly': 'half single-bet Kelly',
+    'flat': '1% of the starting bankroll on every bet with an edge',
+}
+
+
+# ====== HISTORY ======
+def replay_history(match_csv, scale=0.1, engine=None, warmup=WARMUP_TOURNAMENTS):
+    """Post-warmup matches of match_csv with the model's pre-match prob_team1 and reliability."""
+    engine = engine or elo_module.EloEngine(scale)
+    df, segments = elo_module.load_matches(match_csv)
+    engine.reset()
+    elo_module.tournaments_seen = set()
+    frames = []
+    for t_idx, (t, matches) in enumerate(elo_module.rating_periods(df, segments)):
+        probs, reliability = engine.replay_period(matches, with_reliability=True)
+        if t_idx >= warmup:
+            frames.append(matches.assign(prob_team1=probs, reliability=reliability))
+    history = pd.concat(frames, ignore_index=True)
+    history['team1_won'] = history['team1_sets'] > history['team2_sets']
+    return history
+
+
+def load_odds_file(path):
+    """Bookmaker odds from a CSV or JSON file with the four player columns, odds1, odds2 and optionally date."""
+    return elo_module.load_slate(path)
+
+
+def attach_odds(history, odds):
+    """Keep only the matches the odds file prices, matched on players (and date when the file has one)."""
+    keys = PLAYER_COLS + (['date'] if 'date' in odds else [])
+    odds = odds.drop_duplicates(keys, keep='last')
+    return history.merge(odds[keys + ['odds1', 'odds2']], on=keys, how='inner')
+
+
+# ====== ODDS MODEL ======
+def market_odds(prob, margin=DEFAULT_MARGIN, noise=DEFAULT_NOISE, paths=DEFAULT_PATHS, seed=0, base=None):
+    """(odds1, odds2), each paths x matches.
+
+    Without base odds the market's probability is prob, moved by
+    Normal(0, noise) in logit space per path and match, priced with margin
+    overround. With base odds (from a file) the same logit noise is applied
+    to the implied probabilities, keeping each line's own overround. Prices
+    are floored at MIN_ODDS.
+    """
+    rng = np.random.default_rng(seed)
+    prob = np.asarray(prob, dtype=np.float64)
+    shock = rng.normal(0.0, noise, (paths, len(prob))) if noise > 0 else np.zeros((1, len(prob)))
+    if base is None:
+        implied1, overround = prob, 1 + margin
+    else:
+        odds1, odds2 = (np.asarray(o, dtype=np.float64) for o in base)
+        overround = 1 / odds1 + 1 / odds2
+        implied1 = (1 / odds1) / overround
+    implied1 = np.clip(implied1, 1e-6, 1 - 1e-6)
+    market = 1 / (1 + np.exp(-(np.log(implied1 / (1 - implied1)) + shock)))
+    return (np.maximum(1 / (market * overround), MIN_ODDS),
+            np.maximum(1 / ((1 - market) * overround), MIN_ODDS))
+
+
+# ====== STAKING ======
+def stakes(strategy, prob, reliability, odds1, odds2):
+    """(side, fraction): which team each path bets on (0 for none) and the stake per unit of bankroll."""
+    p1 = np.asarray(prob, dtype=np.float64)
+    p2 = 1 - p1
+    b1, b2 = odds1 - 1, odds2 - 1
+    kelly1 = np.maximum(0, (b1 * p1 - p2) / b1)
+    kelly2 = np.maximum(0, (b2 * p2 - p1) / b2)
+    side = np.where(kelly1 > kelly2, 1, np.where(kelly2 > 0, 2, 0))
+    kelly = np.maximum(kelly1, kelly2)
+    if strategy == 'kelly_reliability':
+        fraction = kelly * np.asarray(reliability, dtype=np.float64)
+    elif strategy == 'kelly':
+        fraction = kelly
+    elif strategy == 'half_kelly':
+        fraction = kelly / 2
+    elif strategy == 'flat':
+        fraction = np.where(side > 0, 0.01, 0.0)
+    else:
+        raise ValueError(f"Unknown strategy '{strategy}' (choose from {', '.join(STRATEGIES)})")
+    return side, fraction
+
+
+def simulate(strategy, history, odds1, odds2, bankroll=100.0):
+    """Bankroll paths (paths x matches+1) and the amount staked on each bet, all paths at once.
+
+    Kelly strategies stake a share of the current bankroll, so a path is the
+    running product of (1 + fraction * return); flat stakes a fixed amount
+    and a path is a running sum, held at zero once it goes broke.
+    """
+    side, fraction = stakes(strategy, history['prob_team1'].to_numpy(), history['reliability'].to_numpy(),
+                            odds1, odds2)
+    won1 = history['team1_won'].to_numpy()
+    ret = np.where(side == 1, np.where(won1, odds1 - 1, -1.0),
+                   np.where(side == 2, np.where(won1, -1.0, odds2 - 1), 0.0))
+    start = np.full((ret.shape[0], 1), float(bankroll))
+    if strategy == 'flat':
+        staked = np.broadcast_to(fraction * bankroll, ret.shape)
+        path = np.hstack([start, bankroll + np.cumsum(staked * ret, axis=1)])
+        broke = np.maximum.accumulate(path <= 0, axis=1)
+        path = np.where(broke, 0.0, path)
+        staked = np.where(broke[:, :-1], 0.0, staked)
+    else:
+        path = np.hstack([start, bankroll * np.cumprod(1 + fraction * ret, axis=1)])
+        staked = fraction * path[:, :-1]
+    return path, staked, side
+
+
+def summarize(path, staked, side, bankroll=100.0):
+    final = path[:, -1]
+    peak = np.maximum.accumulate(path, axis=1)
+    drawdown = (1 - path / np.where(peak > 0, peak, 1)).max(axis=1)
+    total_staked = staked.sum(axis=1)
+    roi = np.where(total_staked > 0, (final - bankroll) / np.where(total_staked > 0, total_staked, 1), 0.0)
+    return {
+        'bets': float(np.mean((side > 0).sum(axis=1))),
+        'final_median': float(np.median(final)),
+        'final_p5': float(np.percentile(final, 5)),
+        'final_p95': float(np.percentile(final, 95)),
+        'roi_median': float(np.median(roi)),
+        'max_drawdown_median': float(np.median(drawdown)),
+        'max_drawdown_p95': float(np.percentile(drawdown, 95)),
+        'ruin_probability': float(np.mean(path.min(axis=1) < bankroll * RUIN_LEVEL)),
+        'profit_probability': float(np.mean(final > bankroll)),
+    }
+
+
+def backtest(match_csv, scale=0.1, engine=None, strategies=None, bankroll=100.0, margin=DEFAULT_MARGIN,
+             noise=DEFAULT_NOISE, paths=DEFAULT_PATHS, seed=0, odds_file=None, market=None):
+    """Replay match_csv once, then run every strategy over the same Monte Carlo odds paths.
+
+    Modelled odds are centred on the betting model's own probabilities unless
+    market names another engine to price the book with. Centring on the model
+    is optimistic: the noise then only ever makes the market worse than the
+    model, so every disagreement is an edge.
+
+    Returns ({strategy: summary}, {strategy: quantile paths DataFrame}, number of matches).
+    """
+    history = replay_history(match_csv, scale, engine)
+    if market:
+        history['market_prob'] = replay_history(match_csv, scale, elo_module.get_engine(market, scale))['prob_team1']
+    else:
+        history['market_prob'] = history['prob_team1']
+    base = None
+    if odds_file:
+        history = attach_odds(history, load_odds_file(odds_file))
+        base = (history['odds1'].to_numpy(), history['odds2'].to_numpy())
+    odds1, odds2 = market_odds(history['market_prob'].to_numpy(), margin, noise, paths, seed, base)
+    results = {}
+    quantiles = {}
+    for strategy in strategies or list(STRATEGIES):
+        path, staked, side = simulate(strategy, history, odds1, odds2, bankroll)
+        results[strategy] = summarize(path, staked, side, bankroll)
+        q = np.percentile(path, [5, 50, 95], axis=0)
+        quantiles[strategy] = pd.DataFrame({'match': np.arange(path.shape[1]), 'p5': q[0], 'p50': q[1], 'p95': q[2]})
+    return results, quantiles, len(history)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backtest bet sizing strategies over the match history.')
+    parser.add_argument('--division', default='1', choices=list(elo_module.DIVISIONS))
+    parser.add_argument('--engine', default='elo', choices=list(elo_module.ENGINES))
+    parser.add_argument('--strategy', action='append', choices=list(STRATEGIES),
+                        help='strategy to run (repeatable; default all)')
+    parser.add_argument('--bankroll', type=float, default=100.0)
+    parser.add_argument('--margin', type=float, default=DEFAULT_MARGIN, help='bookmaker overround for modelled odds')
+    parser.add_argument('--noise', type=float, default=DEFAULT_NOISE,
+                        help='sd of market disagreement with the model, in logits (0 for a single path)')
+    parser.add_argument('--paths', type=int, default=DEFAULT_PATHS, help='Monte Carlo odds paths')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--market', choices=list(elo_module.ENGINES),
+                        help='price modelled odds from this engine instead of the betting model (less optimistic)')
+    parser.add_argument('--odds', help='CSV/JSON of real odds (player columns, odds1, odds2, optional date)')
+    parser.add_argument('--paths-out', help='write p5/p50/p95 bankroll paths per strategy to this CSV')
+    args = parser.parse_args()
+
+    cfg = elo_module.DIVISIONS[args.division]
+    engine = elo_module.get_engine(args.engine, cfg['scale'])
+    start = time.perf_counter()
+    results, quantiles, n = backtest(cfg['match_csv'], cfg['scale'], engine, args.strategy, args.bankroll,
+                                     args.margin, args.noise, args.paths, args.seed, args.odds, args.market)
+    elapsed = time.perf_counter() - start
+    print(f"\n{cfg['name']}: {n} post-warmup matches, {args.paths if args.noise > 0 else 1} odds paths, "
+          f"engine={args.engine} ({elapsed:.2f}s)\n")
+    print("{:<18} {:>6} {:>10} {:>10} {:>10} {:>8} {:>8} {:>8} {:>7}".format(
+        'Strategy', 'Bets', 'Median', 'P5', 'P95', 'ROI', 'MaxDD', 'Ruin', 'Profit'))
+    print('-' * 94)
+    for strategy, r in results.items():
+        print(f"{strategy:<18} {r['bets']:>6.0f} {r['final_median']:>10.2f} {r['final_p5']:>10.2f} "
+              f"{r['final_p95']:>10.2f} {r['roi_median']:>8.1%} {r['max_drawdown_median']:>8.1%} "
+              f"{r['ruin_probability']:>8.1%} {r['profit_probability']:>7.1%}")
+    if args.paths_out:
+        pd.concat([q.assign(strategy=s) for s, q in quantiles.items()]).to_csv(args.paths_out, index=False)
+        print(f"\nBankroll paths → {args.paths_out}")
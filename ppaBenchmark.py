@@ -0,0 +1,273 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+import subprocess
+import statistics
+
+import pandas as pd
+
+import ppaInput
+import ppaSynthetic
+import ppaPrediction as elo_module
+
+# ====== CONFIG ======
+HERE = os.path.dirname(os.path.abspath(__file__))
+MATCH_FILES = {'mens': 'mens_matches.csv', 'womens': 'womens_matches.csv'}
+RAW_FILE = 'ppa_raw.txt'
+DEFAULT_OUT = 'bench_results.json'
+DEFAULT_TOLERANCE = 0.25
+
+# Typo'd lookups for resolve_player, applied to real names from the division.
+def typos(names):
+    out = []
+    for i, name in enumerate(names):
+        if i % 3 == 0:
+            out.append(name)
+        elif i % 3 == 1:
+            out.append(name.rstrip('.'))
+        else:
+            out.append(name[:1] + name[2:])
+    return out
+
+
+# ====== SCALED INPUTS ======
+def scaled_match_csv(match_csv, factor, out_dir):
+    """Repeat a match history factor times back to back, shifting each copy past the previous one."""
+    df = pd.read_csv(match_csv)
+    if factor == 1:
+        return match_csv, len(df)
+    dates = pd.to_datetime(df['date'])
+    span = (dates.max() - dates.min()) + pd.Timedelta(days=7)
+    copies = []
+    for k in range(factor):
+        copy = df.copy()
+        copy['date'] = (dates + span * k).dt.strftime('%Y-%m-%d')
+        copy['tournament'] = copy['tournament'] + f' #{k}'
+        copies.append(copy)
+    path = os.path.join(out_dir, f'x{factor}_' + os.path.basename(match_csv))
+    pd.concat(copies, ignore_index=True).to_csv(path, index=False)
+    return path, len(df) * factor
+
+
+def scaled_raw_file(raw_file, factor, out_dir):
+    if factor == 1:
+        return raw_file
+    with open(raw_file, encoding='utf-8') as f:
+        text = f.read()
+    path = os.path.join(out_dir, f'x{factor}_' + os.path.basename(raw_file))
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(factor):
+            f.write(text)
+            f.write('\n')
+    return path
+
+
+def synthetic_inputs(factor, out_dir):
+    """A generated league about factor times the size of the bundled men's data, as CSV and raw text."""
+    matches, _ = ppaSynthetic.generate(players=500 * max(1, factor // 4),
+                                       tournaments=ppaSynthetic.DEFAULTS['tournaments'] * factor)
+    csv_path = os.path.join(out_dir, f'synthetic_x{factor}.csv')
+    raw_path = os.path.join(out_dir, f'synthetic_x{factor}.txt')
+    ppaSynthetic.write_matches_csv(matches, csv_path)
+    ppaSynthetic.write_raw_text(matches, raw_path)
+    return csv_path, len(matches), raw_path
+
+
+# ====== MEASUREMENT ======
+def measure(fn, repeat):
+    """Wall times over repeat runs, then one traced run for peak memory and net block count."""
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'wall_min_s': min(times),
+        'wall_median_s': statistics.median(times),
+        'peak_bytes': peak,
+        'allocated_blocks_net': sys.getallocatedblocks() - blocks_before,
+    }
+
+
+def build_cases(factor, out_dir, synthetic=False):
+    """(name, callable, matches processed per call) for every benchmark at the given scale."""
+    cases = []
+    if synthetic:
+        mens_path, mens_n, raw_path = synthetic_inputs(factor, out_dir)
+        inputs = {'synthetic': (mens_path, mens_n)}
+    else:
+        inputs = {div: scaled_match_csv(f, factor, out_dir) for div, f in MATCH_FILES.items()}
+        mens_path, mens_n = inputs['mens']
+        raw_path = scaled_raw_file(RAW_FILE, factor, out_dir)
+    for div, (path, n) in inputs.items():
+        scale = elo_module.DIVISIONS['2' if div == 'womens' else '1']['scale']
+        cases.append((f'train_elo[{div}]', lambda p=path: elo_module.train_elo(p), n))
+        cases.append((f'train_elo_vectorized[{div}]', lambda p=path: elo_module.train_elo(p, vectorized=True), n))
+        cases.append((f'compute_accuracy[{div}]', lambda p=path, s=scale: elo_module.compute_accuracy(p, s), n))
+        cases.append((f'glicko2_fit[{div}]', lambda p=path, s=scale: elo_module.get_engine('glicko2', s).fit(p), n))
+        cases.append((f'compute_accuracy_glicko2[{div}]',
+                      lambda p=path, s=scale: elo_module.compute_accuracy(p, s, elo_module.get_engine('glicko2', s)), n))
+    cases.append(('scale_sweep', lambda: elo_module.scale_sweep(mens_path), mens_n * 8))
+
+    elo_module.train_elo(mens_path)
+    names = typos(sorted(elo_module.player_elo)[:200])
+
+    def resolve_all():
+        elo_module._resolve_cache.clear()
+        for name in names:
+            elo_module.resolve_player(name)
+    cases.append(('resolve_player[200 names]', resolve_all, None))
+
+    players = sorted(elo_module.player_elo)
+    slate = pd.DataFrame([players[i:i + 4] + [1.6 + (i % 7) / 10, 2.4 - (i % 5) / 10] for i in range(0, 120, 4)],
+                         columns=elo_module.SLATE_COLS)
+    cases.append(('predict_slate[30 bets]', lambda: elo_module.predict_slate(slate, 100), None))
+    cases.append(('predict_slate[12 bets]', lambda: elo_module.predict_slate(slate.head(12), 100), None))
+    lines = pd.DataFrame([players[i:i + 4] + [1.5 + (i % 11) / 10, 2.5 - (i % 9) / 10] for i in range(200)],
+                         columns=elo_module.SLATE_COLS)
+    cases.append(('scan_edges[200 lines]', lambda: elo_module.scan_edges(elo_module.resolve_slate(lines)[0], 100), None))
+
+    def parse():
+        old = ppaInput.INPUT_FILE
+        ppaInput.INPUT_FILE = raw_path
+        try:
+            ppaInput.parse_file()
+        finally:
+            ppaInput.INPUT_FILE = old
+    cases.append(('ppaInput.parse_file', parse, None))
+
+    try:
+        import app as app_module
+    except ImportError:
+        print('  Flask not installed — skipping API benchmarks')
+        return cases
+    app_module.DIVISIONS['bench'] = dict(app_module.DIVISIONS['mens'], match_csv=mens_path)
+    client = app_module.app.test_client()
+    requests = {
+        '/api/predict': {'players': ['Johns C.', 'Johns B', 'Staksrud F.', 'Tellez P.']},
+        '/api/rankings': {},
+        '/api/teams': {},
+        '/api/player': {'name': 'Staksrud F'},
+    }
+    for endpoint, body in requests.items():
+        call = _api_call(client, endpoint, dict(body, division='bench'))
+        # One untimed call first: an endpoint that errors is skipped rather than timed.
+        try:
+            call()
+        except RuntimeError as e:
+            print(f'  {e} — skipping {endpoint}')
+            continue
+        cases.append((endpoint, call, mens_n))
+    return cases
+
+
+def _api_call(client, endpoint, payload):
+    def call():
+        response = client.post(endpoint, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f'{endpoint} returned HTTP {response.status_code}')
+    return call
+
+
+def run(factor=1, repeat=3, only=None, synthetic=False):
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        cases = build_cases(factor, out_dir, synthetic)
+        for name, fn, n_matches in cases:
+            if only and only not in name:
+                continue
+            stats = measure(fn, repeat)
+            if n_matches:
+                stats['matches'] = n_matches
+                stats['matches_per_s'] = n_matches / stats['wall_min_s']
+            results[name] = stats
+            print(f"  {name:<30} {stats['wall_min_s'] * 1000:>10.1f} ms  "
+                  f"{stats['peak_bytes'] / 1e6:>8.2f} MB peak"
+                  + (f"  {stats['matches_per_s']:>10.0f} matches/s" if n_matches else ''))
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=HERE).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__,
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+# ====== BASELINE COMPARISON ======
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Print a per-case diff against baseline; returns the names that regressed beyond tolerance."""
+    regressions = []
+    print("\n{:<30} {:>12} {:>12} {:>9} {:>9}".format('Case', 'Base ms', 'Now ms', 'Time', 'Peak mem'))
+    print('-' * 76)
+    for name, now in current.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<30} {'—':>12} {now['wall_min_s'] * 1000:>12.1f}     (new)")
+            continue
+        t_ratio = now['wall_min_s'] / base['wall_min_s'] - 1
+        m_ratio = now['peak_bytes'] / max(base['peak_bytes'], 1) - 1
+        flag = ''
+        if t_ratio > tolerance or m_ratio > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<30} {base['wall_min_s'] * 1000:>12.1f} {now['wall_min_s'] * 1000:>12.1f} "
+              f"{t_ratio:>+9.1%} {m_ratio:>+9.1%}{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the rating engine, parser and API.')
+    parser.add_argument('--scale', type=int, default=1, help='repeat the bundled data this many times')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case (min is reported)')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='use a generated league (ppaSynthetic) of about --scale times the real size')
+    parser.add_argument('--only', help='run only cases whose name contains this string')
+    parser.add_argument('--out', default=DEFAULT_OUT, help='where to write results JSON')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown / memory growth before a case counts as a regression')
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    print(f"\nRunning benchmarks (scale x{args.scale}, {args.repeat} repeats)\n")
+    results = run(args.scale, args.repeat, args.only, args.synthetic)
+    with open(args.out, 'w') as f:
+        json.dump({'env': environment(), 'scale': args.scale, 'synthetic': args.synthetic,
+                   'results': results}, f, indent=2)
+    print(f"\nSaved results to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != args.scale:
+            print(f"Warning: baseline was recorded at scale x{baseline.get('scale')}")
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print('\nNo regressions.')
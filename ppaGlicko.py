@@ -0,0 +1,219 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+import ppaInput
+
+# ====== CONFIG ======
+# Glicko-2 (Glickman, "Example of the Glicko-2 system") with one tournament as
+# the rating period. Internally ratings live on the Glicko-2 scale (mu, phi);
+# they are shown as CENTER + scale * mu so a rating difference means the same
+# win probability as an ELO difference at the same scale.
+CENTER = 6          # same origin as ppaPrediction.INITIAL_ELO
+PHI0 = 350 / 173.7178
+SIGMA0 = 0.06
+TAU = 0.5
+EPSILON = 1e-6
+
+PLAYER_COLS = ['team1_player1', 'team1_player2', 'team2_player1', 'team2_player2']
+
+
+def g(phi):
+    return 1 / np.sqrt(1 + 3 * phi ** 2 / math.pi ** 2)
+
+
+def team_phi(phi1, phi2):
+    return np.sqrt((phi1 ** 2 + phi2 ** 2) / 2)
+
+
+def new_volatility(phi, sigma, v, delta, tau):
+    """Step 5 of Glicko-2 (Illinois iteration) for arrays of players at once."""
+    a = np.log(sigma ** 2)
+
+    def f(x):
+        ex = np.exp(x)
+        return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau ** 2
+
+    A = a.copy()
+    big = delta ** 2 > phi ** 2 + v
+    B = np.where(big, np.log(np.where(big, delta ** 2 - phi ** 2 - v, 1.0)), a - tau)
+    k = np.ones_like(a)
+    low = ~big & (f(B) < 0)
+    while low.any():
+        k[low] += 1
+        B[low] = a[low] - k[low] * tau
+        low &= f(B) < 0
+    fA, fB = f(A), f(B)
+    active = np.abs(B - A) > EPSILON
+    for _ in range(100):
+        if not active.any():
+            break
+        C = A + (A - B) * fA / (fB - fA)
+        fC = f(C)
+        swap = active & (fC * fB <= 0)
+        halve = active & ~swap
+        A = np.where(swap, B, A)
+        fA = np.where(swap, fB, np.where(halve, fA / 2, fA))
+        B = np.where(active, C, B)
+        fB = np.where(active, fC, fB)
+        active &= np.abs(B - A) > EPSILON
+    return np.exp(A / 2)
+
+
+# ====== ENGINE ======
+class Glicko2Engine:
+    """Glicko-2 ratings for doubles, updated a whole tournament at a time.
+
+    Each player is rated against a composite opponent: the other team's mean
+    mu, offset by their own team's mean, with the other team's RMS deviation.
+    """
+    name = 'glicko2'
+    sweep_param = 'tau'
+    sweep_values = [0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0, 1.2]
+
+    def __init__(self, scale=0.15, tau=TAU):
+        self.scale = scale
+        self.tau = tau
+        self.reset()
+
+    def reset(self):
+        self.index = {}
+        self.mu = np.zeros(0)
+        self.phi = np.zeros(0)
+        self.sigma = np.zeros(0)
+
+    def _ids(self, names, add=True):
+        ids = np.empty(len(names), dtype=np.int64)
+        new = 0
+        for i, name in enumerate(names):
+            idx = self.index.get(name)
+            if idx is None:
+                if not add:
+                    ids[i] = -1
+                    continue
+                idx = self.index[name] = len(self.index)
+                new += 1
+            ids[i] = idx
+        if new:
+            self.mu = np.concatenate([self.mu, np.zeros(new)])
+            self.phi = np.concatenate([self.phi, np.full(new, PHI0)])
+            self.sigma = np.concatenate([self.sigma, np.full(new, SIGMA0)])
+        return ids
+
+    def _lookup(self, players):
+        ids = self._ids(players, add=False)
+        known = ids >= 0
+        mu = np.zeros(len(ids))
+        phi = np.full(len(ids), PHI0)
+        mu[known] = self.mu[ids[known]]
+        phi[known] = self.phi[ids[known]]
+        return mu, phi
+
+    # --- ratings ---
+    def rating(self, player):
+        mu, _ = self._lookup([player])
+        return CENTER + self.scale * float(mu[0])
+
+    def deviation(self, player):
+        """Rating deviation on the displayed scale."""
+        _, phi = self._lookup([player])
+        return self.scale * float(phi[0])
+
+    def reliability(self, player):
+        """0-100 like get_reliability_score: 0 for an unrated player, 100 at zero deviation."""
+        _, phi = self._lookup([player])
+        return round(100 * max(0.0, 1 - float(phi[0]) / PHI0), 2)
+
+    def predict(self, team1, team2):
+        mu, phi = self._lookup(list(team1) + list(team2))
+        spread = math.sqrt(team_phi(phi[0], phi[1]) ** 2 + team_phi(phi[2], phi[3]) ** 2)
+        diff = (mu[0] + mu[1]) / 2 - (mu[2] + mu[3]) / 2
+        return float(1 / (1 + math.exp(-g(spread) * diff)))
+
+    def predict_many(self, matches):
+        """Win probabilities for team 1 of every row, from the current ratings."""
+        n = len(matches)
+        if n == 0:
+            return np.zeros(0)
+        mu, phi = self._lookup(matches[PLAYER_COLS].to_numpy().ravel())
+        mu, phi = mu.reshape(n, 4), phi.reshape(n, 4)
+        spread = np.sqrt(team_phi(phi[:, 0], phi[:, 1]) ** 2 + team_phi(phi[:, 2], phi[:, 3]) ** 2)
+        diff = mu[:, :2].mean(axis=1) - mu[:, 2:].mean(axis=1)
+        return 1 / (1 + np.exp(-g(spread) * diff))
+
+    # --- updates ---
+    def update(self, matches):
+        """Apply one rating period (all of a tournament's matches) to every player at once."""
+        n = len(matches)
+        known = len(self.index)
+        ids = self._ids(matches[PLAYER_COLS].to_numpy().ravel()).reshape(n, 4)
+        mu, phi = self.mu[ids], self.phi[ids]
+        won = (matches['team1_sets'].to_numpy() > matches['team2_sets'].to_numpy()).astype(np.float64)
+        diff = mu[:, :2].mean(axis=1) - mu[:, 2:].mean(axis=1)
+        phi1 = team_phi(phi[:, 0], phi[:, 1])
+        phi2 = team_phi(phi[:, 2], phi[:, 3])
+        # One observation per (match, player): own advantage, opponent deviation, score.
+        players = ids.ravel()
+        advantage = np.column_stack([diff, diff, -diff, -diff]).ravel()
+        opp_g = g(np.column_stack([phi2, phi2, phi1, phi1]).ravel())
+        score = np.column_stack([won, won, 1 - won, 1 - won]).ravel()
+        expected = 1 / (1 + np.exp(-opp_g * advantage))
+        size = len(self.mu)
+        v_inv = np.bincount(players, weights=opp_g ** 2 * expected * (1 - expected), minlength=size)
+        gain = np.bincount(players, weights=opp_g * (score - expected), minlength=size)
+
+        played = v_inv > 0
+        p = np.flatnonzero(played)
+        v = 1 / v_inv[p]
+        sigma = new_volatility(self.phi[p], self.sigma[p], v, v * gain[p], self.tau)
+        phi_star = np.sqrt(self.phi[p] ** 2 + sigma ** 2)
+        new_phi = 1 / np.sqrt(1 / phi_star ** 2 + 1 / v)
+        self.mu[p] = self.mu[p] + new_phi ** 2 * gain[p]
+        self.phi[p] = new_phi
+        self.sigma[p] = sigma
+        # Players who sat the period out only grow less certain.
+        idle = ~played
+        idle[known:] = False
+        self.phi[idle] = np.minimum(np.sqrt(self.phi[idle] ** 2 + self.sigma[idle] ** 2), PHI0)
+
+    def replay_period(self, matches, with_reliability=False):
+        """Predict every match of the period from the ratings before it, then update; returns the probabilities
+        (and with_reliability, each match's average player reliability as a 0-1 factor)."""
+        probs = self.predict_many(matches)
+        if with_reliability:
+            reliability = [sum(self.reliability(p) for p in row) / 400
+                           for row in matches[PLAYER_COLS].itertuples(index=False)]
+        self.update(matches)
+        return (probs.tolist(), reliability) if with_reliability else probs.tolist()
+
+    def replay(self, df):
+        """replay_period over each tournament of a date-sorted frame; probabilities come back in row order."""
+        probs = np.empty(len(df))
+        for pos in df.groupby('tournament', sort=False).indices.values():
+            probs[pos] = self.replay_period(df.iloc[pos])
+        return probs.tolist()
+
+    def fit(self, csv_file):
+        df = pd.read_csv(csv_file)
+        if not ppaInput.is_sorted(csv_file):
+            df = ppaInput.canonical_order(df)
+        self.reset()
+        for _, matches in df.groupby('tournament', sort=False):
+            self.update(matches)
+
+    # --- state ---
+    def snapshot(self):
+        return {'index': dict(self.index), 'mu': self.mu.copy(), 'phi': self.phi.copy(),
+                'sigma': self.sigma.copy()}
+
+    def install(self, state):
+        self.index = dict(state['index'])
+        self.mu, self.phi, self.sigma = state['mu'].copy(), state['phi'].copy(), state['sigma'].copy()
+        return self
+
+    def top_players(self, k=10):
+        """(player, rating, deviation) for the k highest conservative ratings (mu - 2 phi)."""
+        names = list(self.index)
+        order = np.argsort(-(self.mu - 2 * self.phi), kind='stable')[:k]
+        return [(names[i], CENTER + self.scale * float(self.mu[i]), self.scale * float(self.phi[i])) for i in order]
@@ -1,149 +1,322 @@
-import re
-import csv
-from datetime import datetime
-
-INPUT_FILE = "ppa_raw.txt"
-
-OUTPUT_FILES = {
-    'mens':         'mens_matches.csv',
-    'womens':       'womens_matches.csv',
-    'mixed':        'mixed_matches.csv',
-    'mens_singles': 'mens_singles_matches.csv',
-    'womens_singles': 'womens_singles_matches.csv',
-}
-
-TOURNAMENT_KEYWORDS = ["PPA", "UPA", "MLP", "APP"]
-
-HEADERS = ["tournament", "round", "date", "team1_player1", "team1_player2",
-           "team2_player1", "team2_player2", "team1_sets", "team2_sets"]
-
-
-def parse_date(date_str):
-    return datetime.strptime(date_str.strip(), "%b %d, %Y").strftime("%Y-%m-%d")
-
-
-def is_tournament_header(line):
-    return any(keyword in line for keyword in TOURNAMENT_KEYWORDS)
-
-
-def get_division(round_line):
-    """Extract division from round line e.g. 'Finals • Mens Doubles • Nov 10, 2024'"""
-    line_lower = round_line.lower()
-    if 'mixed' in line_lower:
-        return 'mixed'
-    elif 'women' in line_lower:
-        if 'singles' in line_lower:
-            return 'womens_singles'
-        return 'womens'
-    elif 'men' in line_lower:
-        if 'singles' in line_lower:
-            return 'mens_singles'
-        return 'mens'
-    return None  # unknown - skip
-
-
-def clean_team(line):
-    line = re.sub(r"#\d+\s*", "", line)
-    if "/" not in line:
-        return None
-    parts = line.split("/")
-    if len(parts) != 2:
-        return None
-    return parts[0].strip(), parts[1].strip()
-
-
-def parse_file():
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        lines = [l.strip() for l in f if l.strip() and l.strip() not in ["Watch", "View"]]
-
-    matches = {'mens': [], 'womens': [], 'mixed': [], 'mens_singles': [], 'womens_singles': []}
-    skipped = 0
-    i = 0
-
-    while i < len(lines):
-        if is_tournament_header(lines[i]):
-            tournament = lines[i]
-
-            if i + 1 >= len(lines):
-                break
-            round_line = lines[i + 1]
-            round_name = round_line.split("•")[0].strip()
-            date_str = round_line.split("•")[-1].strip()
-
-            try:
-                date = parse_date(date_str)
-            except ValueError:
-                i += 1
-                continue
-
-            division = get_division(round_line)
-            if division is None:
-                skipped += 1
-                i += 2
-                continue  # truly unknown format
-
-            i += 2
-
-            while i < len(lines) and lines[i] in ["Medal", "Forfeit"]:
-                i += 1
-
-            if i >= len(lines):
-                break
-            team1 = clean_team(lines[i])
-            if not team1:
-                i += 1
-                continue
-            team1_p1, team1_p2 = team1
-            try:
-                team1_sets = int(lines[i + 1])
-            except:
-                team1_sets = 2
-
-            j = i + 2
-            while j < len(lines) and not clean_team(lines[j]):
-                j += 1
-            if j >= len(lines):
-                break
-
-            team2 = clean_team(lines[j])
-            if not team2:
-                i = j + 1
-                continue
-            team2_p1, team2_p2 = team2
-            try:
-                team2_sets = int(lines[j + 1])
-            except:
-                team2_sets = 0
-
-            matches[division].append([
-                tournament, round_name, date,
-                team1_p1, team1_p2,
-                team2_p1, team2_p2,
-                team1_sets, team2_sets
-            ])
-
-            i = j + 2
-        else:
-            i += 1
-
-    return matches, skipped
-
-
-def save_csvs(matches):
-    for division, rows in matches.items():
-        if not rows:
-            print(f"  No matches found for {division} — skipping")
-            continue
-        filepath = OUTPUT_FILES[division]
-        with open(filepath, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(HEADERS)
-            writer.writerows(rows)
-        print(f"  Saved {len(rows):>4} matches to {filepath}")
-
-
-if __name__ == "__main__":
-    matches, skipped = parse_file()
-    total = sum(len(v) for v in matches.values())
-    print(f"\nParsed {total} doubles matches ({skipped} singles/unknown skipped)\n")
+import re
+import csv
+import os
+import json
+import hashlib
+import unicodedata
+from datetime import datetime
+
+import ppaMetrics as metrics
+import ppaProfile
+
+INPUT_FILE = "ppa_raw.txt"
+
+OUTPUT_FILES = {
+    'mens':         'mens_matches.csv',
+    'womens':       'womens_matches.csv',
+    'mixed':        'mixed_matches.csv',
+    'mens_singles': 'mens_singles_matches.csv',
+    'womens_singles': 'womens_singles_matches.csv',
+}
+
+PLAYERS_FILE = "players.csv"         # player_id,name: every canonical player with a stable id
+ALIASES_FILE = "player_aliases.csv"  # alias,player: other spellings of a canonical name, maintained by hand
+
+TOURNAMENT_KEYWORDS = ["PPA", "UPA", "MLP", "APP"]
+
+HEADERS = ["tournament", "round", "date", "team1_player1", "team1_player2",
+           "team2_player1", "team2_player2", "team1_sets", "team2_sets"]
+
+# save_csvs writes every match file in canonical order: by date, then by
+# round_order within a date, then in the order the matches were parsed. A
+# sidecar next to the CSV (mens_matches.csv.meta.json) records that order with
+# a hash of the file, so loaders can trust the order and skip sorting for as
+# long as the file is unchanged.
+ID_HEADERS = ["team1_player1_id", "team1_player2_id", "team2_player1_id", "team2_player2_id"]
+
+SORT_ORDER = ["date", "round", "sequence"]
+SIDECAR_SUFFIX = ".meta.json"
+
+
+def parse_date(date_str):
+    return datetime.strptime(date_str.strip(), "%b %d, %Y").strftime("%Y-%m-%d")
+
+
+def is_tournament_header(line):
+    return any(keyword in line for keyword in TOURNAMENT_KEYWORDS)
+
+
+def get_division(round_line):
+    """Extract division from round line e.g. 'Finals • Mens Doubles • Nov 10, 2024'"""
+    line_lower = round_line.lower()
+    if 'mixed' in line_lower:
+        return 'mixed'
+    elif 'women' in line_lower:
+        if 'singles' in line_lower:
+            return 'womens_singles'
+        return 'womens'
+    elif 'men' in line_lower:
+        if 'singles' in line_lower:
+            return 'mens_singles'
+        return 'mens'
+    return None  # unknown - skip
+
+
+def round_order(round_name):
+    """Sort key putting rounds in the order they are played: play-ins, group stage,
+    then the draw from its largest round down, side brackets after the main draw
+    round of the same size and the final last. Unknown rounds sort after the final."""
+    name = round_name.lower()
+    m = re.search(r"play in (\d+)", name)
+    if m:
+        return (0, int(m.group(1)), 0)
+    if "group" in name:
+        return (1, 0, 0)
+    side = "consolation" in name or "losers" in name
+    m = re.search(r"round (\d+)", name)
+    if m:
+        size = int(m.group(1))
+    elif "quarter" in name:
+        size = 8
+    elif "semi" in name:
+        size = 4
+    elif "bronze" in name:
+        return (2, -2, 1)
+    elif "final" in name:
+        size = 2
+    else:
+        return (3, 0, 0)
+    if side:
+        return (2, -size, 1)
+    return (2, -size, 2 if size == 2 else 0)
+
+
+def sidecar_path(csv_path):
+    return csv_path + SIDECAR_SUFFIX
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def is_sorted(csv_path):
+    """True if csv_path is a match file save_csvs wrote in canonical order and nobody has changed since."""
+    try:
+        with open(sidecar_path(csv_path), encoding="utf-8") as f:
+            meta = json.load(f)
+        return meta.get("sorted") == SORT_ORDER and meta.get("sha1") == file_hash(csv_path)
+    except (OSError, ValueError):
+        return False
+
+
+def canonical_order(df):
+    """A match DataFrame in the order save_csvs writes: by date, then round_order; ties keep their order."""
+    if "round" not in df:
+        return df.sort_values(by="date", kind="stable")
+    keys = list(zip(df["date"], df["round"].astype(str).map(round_order)))
+    return df.iloc[sorted(range(len(df)), key=keys.__getitem__)]
+
+
+# ====== PLAYER IDS ======
+# Raw names vary in case, accents, punctuation and hyphenation. Every name is
+# reduced to name_key, and player_keys maps each key to a player id. A name
+# whose key is unknown becomes a new player with the next id. Aliases add
+# more keys for an existing player (nicknames, maiden names, typos). After
+# parsing, every match holds canonical names, and save_csvs writes their ids
+# as extra columns. players.csv keeps the ids stable across runs.
+player_names = []   # canonical name by id
+player_keys = {}    # name_key -> id, for canonical names and aliases
+
+
+def name_key(name):
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c)).lower()
+    name = re.sub(r"['\u2019`]", "", name)
+    name = re.sub(r"[-.]", " ", name)
+    return " ".join(name.split())
+
+
+def load_aliases(path=ALIASES_FILE):
+    """alias -> canonical name from the alias table, or {} without one."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["alias"].strip(): row["player"].strip() for row in csv.DictReader(f)}
+
+
+def load_players(players_file=PLAYERS_FILE, aliases_file=ALIASES_FILE):
+    """Load the id table; its ids must be exactly 0..n-1, since an id is a player's index in player_names."""
+    global player_names, player_keys
+    player_names = []
+    player_keys = {}
+    if os.path.exists(players_file):
+        names = {}
+        with open(players_file, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                pid = int(row["player_id"])
+                if pid in names:
+                    raise ValueError(f"{players_file}: player_id {pid} is used by both "
+                                     f"{names[pid]!r} and {row['name']!r}")
+                names[pid] = row["name"]
+        missing = sorted(set(range(len(names))) - set(names))
+        if missing:
+            raise ValueError(f"{players_file}: player ids must run 0..{len(names) - 1} without gaps; "
+                             f"missing {', '.join(map(str, missing[:10]))}")
+        player_names = [names[pid] for pid in range(len(names))]
+        for pid, name in enumerate(player_names):
+            player_keys.setdefault(name_key(name), pid)
+    for alias, player in load_aliases(aliases_file).items():
+        player_keys[name_key(alias)] = player_id(player)
+
+
+def save_players(players_file=PLAYERS_FILE):
+    with open(players_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["player_id", "name"])
+        writer.writerows(enumerate(player_names))
+
+
+def player_id(name):
+    """Id of the player a raw name refers to; a name not seen before gets the next id."""
+    key = name_key(name)
+    pid = player_keys.get(key)
+    if pid is None:
+        pid = player_keys[key] = len(player_names)
+        player_names.append(name.strip())
+    return pid
+
+
+def canonicalize(matches):
+    """Replace the raw player names of every parsed match with canonical names and append their ids."""
+    for rows in matches.values():
+        for row in rows:
+            ids = [player_id(name) for name in row[3:7]]
+            row[3:7] = [player_names[pid] for pid in ids]
+            row.extend(ids)
+    return matches
+
+
+def clean_team(line):
+    line = re.sub(r"#\d+\s*", "", line)
+    if "/" not in line:
+        return None
+    parts = line.split("/")
+    if len(parts) != 2:
+        return None
+    return parts[0].strip(), parts[1].strip()
+
+
+@ppaProfile.profiled('parse_file')
+@metrics.timed('ppa_function_seconds', function='parse_file')
+def parse_file():
+    with metrics.timer('ppa_stage_seconds', stage='read_raw'):
+        with open(INPUT_FILE, "r", encoding="utf-8") as f:
+            lines = [l.strip() for l in f if l.strip() and l.strip() not in ["Watch", "View"]]
+    with metrics.timer('ppa_stage_seconds', stage='parse_matches'):
+        matches, skipped = _parse_lines(lines)
+    with metrics.timer('ppa_stage_seconds', stage='canonicalize'):
+        load_players()
+        return canonicalize(matches), skipped
+
+
+def _parse_lines(lines):
+    matches = {'mens': [], 'womens': [], 'mixed': [], 'mens_singles': [], 'womens_singles': []}
+    skipped = 0
+    i = 0
+
+    while i < len(lines):
+        if is_tournament_header(lines[i]):
+            tournament = lines[i]
+
+            if i + 1 >= len(lines):
+                break
+            round_line = lines[i + 1]
+            round_name = round_line.split("•")[0].strip()
+            date_str = round_line.split("•")[-1].strip()
+
+            try:
+                date = parse_date(date_str)
+            except ValueError:
+                i += 1
+                continue
+
+            division = get_division(round_line)
+            if division is None:
+                skipped += 1
+                i += 2
+                continue  # truly unknown format
+
+            i += 2
+
+            while i < len(lines) and lines[i] in ["Medal", "Forfeit"]:
+                i += 1
+
+            if i >= len(lines):
+                break
+            team1 = clean_team(lines[i])
+            if not team1:
+                i += 1
+                continue
+            team1_p1, team1_p2 = team1
+            try:
+                team1_sets = int(lines[i + 1])
+            except:
+                team1_sets = 2
+
+            j = i + 2
+            while j < len(lines) and not clean_team(lines[j]):
+                j += 1
+            if j >= len(lines):
+                break
+
+            team2 = clean_team(lines[j])
+            if not team2:
+                i = j + 1
+                continue
+            team2_p1, team2_p2 = team2
+            try:
+                team2_sets = int(lines[j + 1])
+            except:
+                team2_sets = 0
+
+            matches[division].append([
+                tournament, round_name, date,
+                team1_p1, team1_p2,
+                team2_p1, team2_p2,
+                team1_sets, team2_sets
+            ])
+
+            i = j + 2
+        else:
+            i += 1
+
+    return matches, skipped
+
+
+@metrics.timed('ppa_function_seconds', function='save_csvs')
+def save_csvs(matches):
+    for division, rows in matches.items():
+        if not rows:
+            print(f"  No matches found for {division} — skipping")
+            continue
+        filepath = OUTPUT_FILES[division]
+        # sorted() is stable, so parse order breaks the remaining ties.
+        rows = sorted(rows, key=lambda r: (r[2], round_order(r[1])))
+        with open(filepath, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADERS + ID_HEADERS if len(rows[0]) > len(HEADERS) else HEADERS)
+            writer.writerows(rows)
+        with open(sidecar_path(filepath), "w", encoding="utf-8") as f:
+            json.dump({"sorted": SORT_ORDER, "rows": len(rows), "sha1": file_hash(filepath)}, f)
+        print(f"  Saved {len(rows):>4} matches to {filepath}")
+    save_players()
+    print(f"  Saved {len(player_names):>4} players to {PLAYERS_FILE}")
+
+
+if __name__ == "__main__":
+    ppaProfile.flag_enabled()
+    matches, skipped = parse_file()
+    total = sum(len(v) for v in matches.values())
+    print(f"\nParsed {total} doubles matches ({skipped} singles/unknown skipped)\n")
     save_csvs(matches)
\ No newline at end of file
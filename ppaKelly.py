@@ -0,0 +1,117 @@
+import numpy as np
+
+# ====== CONFIG ======
+# Slates up to EXACT_MAX bets are solved over every win/loss combination
+# (2^n scenarios); larger ones over SAMPLES simulated slates.
+EXACT_MAX = 14
+SAMPLES = 20000
+
+
+def single_kelly(prob, odds):
+    """Stake fraction for one bet on its own (decimal odds)."""
+    b = odds - 1
+    return max(0.0, (b * prob - (1 - prob)) / b)
+
+
+# ====== SCENARIOS ======
+def scenarios(probs, exact_max=EXACT_MAX, samples=SAMPLES, seed=0):
+    """(wins, weights): one row per scenario, True where that bet wins, and its probability.
+
+    Bets are treated as independent. A sampled set always carries the
+    every-bet-loses scenario at its exact probability, so the optimizer can
+    never see staking the whole bankroll as safe.
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    n = len(probs)
+    if n <= exact_max:
+        wins = ((np.arange(2 ** n)[:, None] >> np.arange(n)) & 1).astype(bool)
+        weights = np.prod(np.where(wins, probs, 1 - probs), axis=1)
+        return wins, weights
+    rng = np.random.default_rng(seed)
+    wins = np.vstack([np.zeros((1, n), dtype=bool), rng.random((samples, n)) < probs])
+    all_lose = float(np.prod(1 - probs))
+    weights = np.concatenate([[all_lose], np.full(samples, (1 - all_lose) / samples)])
+    return wins, weights
+
+
+# ====== OPTIMIZER ======
+def _project(f, cap):
+    """Closest point to f with every stake >= 0 and total stake <= cap."""
+    f = np.maximum(f, 0.0)
+    if f.sum() <= cap:
+        return f
+    u = np.sort(f)[::-1]
+    css = np.cumsum(u) - cap
+    rho = np.nonzero(u - css / np.arange(1, len(u) + 1) > 0)[0][-1]
+    return np.maximum(f - css[rho] / (rho + 1), 0.0)
+
+
+def log_growth(stakes, returns, weights):
+    wealth = 1 + returns @ stakes
+    if (wealth <= 0).any():
+        return -np.inf
+    return float(weights @ np.log(wealth))
+
+
+def optimize(returns, weights, cap=1.0, iters=100, tol=1e-12):
+    """Stakes maximising expected log wealth over the scenarios.
+
+    returns[s, i] is bet i's net return per unit staked in scenario s. Uses
+    projected Newton steps with a backtracking line search; the objective is
+    concave, so this converges to the simultaneous Kelly stakes.
+    """
+    n = returns.shape[1]
+    stakes = np.zeros(n)
+    value = 0.0
+    for _ in range(iters):
+        wealth = 1 + returns @ stakes
+        grad = returns.T @ (weights / wealth)
+        free = (stakes > 0) | (grad > 0)
+        if not free.any():
+            break
+        R = returns[:, free]
+        hess = (R * (weights / wealth ** 2)[:, None]).T @ R
+        step_dir = np.zeros(n)
+        try:
+            step_dir[free] = np.linalg.solve(hess + 1e-12 * np.eye(len(hess)), grad[free])
+        except np.linalg.LinAlgError:
+            step_dir[free] = grad[free]
+        if grad @ step_dir <= 0:
+            step_dir = np.where(free, grad, 0.0)
+        step = 1.0
+        while step > 1e-12:
+            candidate = _project(stakes + step * step_dir, cap)
+            new_value = log_growth(candidate, returns, weights)
+            if new_value >= value:
+                break
+            step /= 2
+        else:
+            break
+        done = new_value - value < tol and np.abs(candidate - stakes).max() < 1e-10
+        stakes, value = candidate, new_value
+        if done:
+            break
+    return stakes, value
+
+
+def slate_kelly(probs, odds, cap=1.0, exact_max=EXACT_MAX, samples=SAMPLES, seed=0):
+    """Simultaneous Kelly stakes for bets that all resolve before any winnings can be re-staked.
+
+    probs and odds are each bet's win probability and decimal odds. Returns a
+    dict with the stake fractions, the expected log growth, and the same for
+    the single-bet Kelly stakes evaluated on the same scenarios.
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    odds = np.asarray(odds, dtype=np.float64)
+    wins, weights = scenarios(probs, exact_max, samples, seed)
+    returns = np.where(wins, odds - 1, -1.0)
+    stakes, growth = optimize(returns, weights, cap)
+    independent = np.array([single_kelly(p, o) for p, o in zip(probs, odds)])
+    return {
+        'stakes': stakes,
+        'expected_log_growth': growth,
+        'independent_stakes': independent,
+        'independent_log_growth': log_growth(independent, returns, weights),
+        'method': 'exact' if len(probs) <= exact_max else 'sampled',
+        'scenarios': len(weights),
+    }
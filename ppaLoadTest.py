@@ -0,0 +1,378 @@
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import argparse
+import threading
+import http.client
+import multiprocessing
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+import ppaInput
+from ppaBenchmark import HERE, environment, typos
+
+# ====== CONFIG ======
+# A load run replays one fixed, seeded sequence of requests at a given
+# concurrency and records every request's latency. Given the same --seed,
+# --requests and --mix, every serving configuration (in-process app, app.py
+# behind a threaded server, ppaServe with N workers, ...) sees exactly the same
+# requests in the same order, so their results files can be compared directly.
+MATCH_FILES = {'mens': 'mens_matches.csv', 'womens': 'womens_matches.csv'}
+DEFAULT_OUT = 'load_results.json'
+DEFAULT_REQUESTS = 1000
+DEFAULT_CONCURRENCY = 8
+DEFAULT_SEED = 7
+STARTUP_SECONDS = 120
+DEFAULT_TOLERANCE = 0.25
+
+# Request mixes: endpoint -> relative weight. Only read-only endpoints, so a
+# run leaves the bet files and the model as it found them. ppaServe's snapshot
+# workers only answer predict, rankings and player.
+MIXES = {
+    'app': {'predict': 40, 'bet': 15, 'rankings': 15, 'player': 10, 'history': 10, 'accuracy': 5, 'h2h': 5},
+    'predict': {'predict': 1},
+    'snapshot': {'predict': 60, 'rankings': 25, 'player': 15},
+}
+# Share of requests sent to each division.
+DIVISION_WEIGHTS = {'mens': 3, 'womens': 1}
+
+
+# ====== REQUEST MIX ======
+def division_players(division):
+    df = pd.read_csv(MATCH_FILES[division], usecols=ppaInput.HEADERS[3:7])
+    return sorted(set(df.values.ravel()))
+
+
+def build_requests(n, mix='app', seed=DEFAULT_SEED):
+    """n (endpoint, method, path, json body) tuples drawn from the mix; the same arguments give the same list."""
+    rng = random.Random(seed)
+    weights = MIXES[mix]
+    endpoints = list(weights)
+    divisions = list(DIVISION_WEIGHTS)
+    # Real names, a third of them typo'd (dropped period, dropped letter) so resolve_player's fuzzy path is hit.
+    names = {d: typos(division_players(d)) for d in divisions}
+    out = []
+    for _ in range(n):
+        endpoint = rng.choices(endpoints, [weights[e] for e in endpoints])[0]
+        division = rng.choices(divisions, [DIVISION_WEIGHTS[d] for d in divisions])[0]
+        pool = names[division]
+        body = {'division': division}
+        if endpoint == 'predict':
+            body['players'] = rng.sample(pool, 4)
+        elif endpoint == 'bet':
+            odds1 = round(rng.uniform(1.3, 3.2), 2)
+            body.update(players=rng.sample(pool, 4), bankroll=1000, odds1=odds1,
+                        odds2=round(1 / max(0.05, 1.05 - 1 / odds1), 2))
+        elif endpoint == 'rankings':
+            body.update(offset=rng.choice([0, 0, 0, 10, 50]), limit=rng.choice([10, 25]))
+        elif endpoint == 'player':
+            body['name'] = rng.choice(pool)
+        elif endpoint == 'h2h':
+            body['players'] = rng.sample(pool, 2)
+        out.append((endpoint, 'POST', f'/api/{endpoint}', body))
+    return out
+
+
+# ====== CLIENTS ======
+class InProcessClient:
+    """Calls a Flask app through its test client, so the numbers leave out sockets and HTTP parsing."""
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self.local = threading.local()
+
+    def send(self, method, path, body):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    """One keep-alive HTTP connection per thread to a server at url, reopened whenever the server closes it."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def send(self, method, path, body):
+        payload = json.dumps(body).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        for attempt in range(2):
+            conn = getattr(self.local, 'conn', None)
+            if conn is None:
+                conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                conn.request(method, self.prefix + path, payload, headers)
+                response = conn.getresponse()
+                response.read()
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+                continue
+            if response.will_close:
+                conn.close()
+                self.local.conn = None
+            return response.status
+
+
+# ====== LOCAL SERVERS ======
+# A started server runs in its own process group, so stopping it also stops
+# the processes it spawned (app.py's training pool, ppaServe's workers).
+def _own_group():
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+
+
+def _serve_app(port):
+    _own_group()
+    # Exit normally on SIGTERM so app.py's training pool is shut down cleanly.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    os.chdir(HERE)
+    from werkzeug.serving import make_server
+    import app as app_module
+    import ppaServe
+    make_server('127.0.0.1', port, app_module.app, threaded=True,
+                request_handler=ppaServe.QuietHandler).serve_forever()
+
+
+def _serve_snapshots(port, workers):
+    _own_group()
+    os.chdir(HERE)
+    import ppaServe
+    ppaServe.serve('127.0.0.1', port, workers, poll_seconds=0)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, workers=None):
+    """Start app.py (threaded werkzeug server) or ppaServe in a child process; returns (process, url)."""
+    port = _free_port()
+    ctx = multiprocessing.get_context('spawn')
+    if kind == 'app':
+        proc = ctx.Process(target=_serve_app, args=(port,))
+    else:
+        proc = ctx.Process(target=_serve_snapshots, args=(port, workers))
+    proc.start()
+    deadline = time.monotonic() + STARTUP_SECONDS
+    while time.monotonic() < deadline:
+        if not proc.is_alive():
+            raise RuntimeError(f"{kind} server exited with code {proc.exitcode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return proc, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError(f"{kind} server did not start listening within {STARTUP_SECONDS}s")
+
+
+def _signal_group(proc, signum):
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(proc.pid, signum)
+        else:
+            proc.terminate()
+    except ProcessLookupError:
+        pass
+
+
+def stop_server(proc):
+    proc.terminate()
+    proc.join(30)
+    # Anything still alive in the group (including the server itself) is killed outright.
+    _signal_group(proc, getattr(signal, 'SIGKILL', signal.SIGTERM))
+    proc.join()
+
+
+# ====== RUN ======
+def percentile(sorted_values, q):
+    """Nearest-rank percentile q (0-100) of an ascending list."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, -(-len(sorted_values) * q // 100) - 1))
+    return sorted_values[int(k)]
+
+
+def summarize(samples, elapsed):
+    """Per-endpoint and overall count, errors, throughput and latency percentiles (ms) from (endpoint, seconds, ok)."""
+    groups = {}
+    for endpoint, seconds, ok in samples:
+        groups.setdefault(endpoint, []).append((seconds, ok))
+    groups['all'] = [(seconds, ok) for _, seconds, ok in samples]
+    out = {}
+    for endpoint, rows in groups.items():
+        times = sorted(s * 1000 for s, _ in rows)
+        out[endpoint] = {
+            'requests': len(rows),
+            'errors': sum(1 for _, ok in rows if not ok),
+            'throughput_rps': len(rows) / elapsed if elapsed else None,
+            'mean_ms': sum(times) / len(times),
+            'p50_ms': percentile(times, 50),
+            'p95_ms': percentile(times, 95),
+            'p99_ms': percentile(times, 99),
+            'max_ms': times[-1],
+        }
+    return out
+
+
+def warm_up(client, requests):
+    """Send one request per (endpoint, division) so model training and caches are not timed."""
+    seen = set()
+    for endpoint, method, path, body in requests:
+        key = (endpoint, body.get('division'))
+        if key not in seen:
+            seen.add(key)
+            client.send(method, path, body)
+
+
+def run(client, requests, concurrency=DEFAULT_CONCURRENCY, warmup=True):
+    """Replay requests over concurrency threads; returns (summary, elapsed seconds)."""
+    if warmup:
+        warm_up(client, requests)
+    samples = []
+    lock = threading.Lock()
+    cursor = iter(range(len(requests)))
+
+    def worker():
+        local = []
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                break
+            endpoint, method, path, body = requests[i]
+            start = time.perf_counter()
+            try:
+                ok = client.send(method, path, body) < 400
+            except OSError:
+                ok = False
+            local.append((endpoint, time.perf_counter() - start, ok))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, name=f'load-{i}') for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return summarize(samples, elapsed), elapsed
+
+
+def print_summary(summary):
+    print("\n{:<10} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+        'Endpoint', 'Requests', 'Errors', 'Req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'Max ms'))
+    print('-' * 78)
+    for endpoint in sorted(summary, key=lambda e: (e == 'all', e)):
+        s = summary[endpoint]
+        print(f"{endpoint:<10} {s['requests']:>8} {s['errors']:>7} {s['throughput_rps']:>9.1f} "
+              f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['max_ms']:>9.2f}")
+
+
+# ====== BASELINE COMPARISON ======
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Print throughput and p95 against baseline; returns the endpoints that got worse beyond tolerance."""
+    regressions = []
+    print("\n{:<10} {:>10} {:>10} {:>9} {:>10} {:>10} {:>9}".format(
+        'Endpoint', 'Base rps', 'Now rps', 'Rps', 'Base p95', 'Now p95', 'p95'))
+    print('-' * 74)
+    for endpoint, now in sorted(current.items(), key=lambda kv: (kv[0] == 'all', kv[0])):
+        base = baseline.get(endpoint)
+        if base is None:
+            print(f"{endpoint:<10} {'—':>10} {now['throughput_rps']:>10.1f}     (new)")
+            continue
+        rps = now['throughput_rps'] / base['throughput_rps'] - 1
+        p95 = now['p95_ms'] / base['p95_ms'] - 1
+        flag = ''
+        if rps < -tolerance or p95 > tolerance:
+            regressions.append(endpoint)
+            flag = '  REGRESSION'
+        print(f"{endpoint:<10} {base['throughput_rps']:>10.1f} {now['throughput_rps']:>10.1f} {rps:>+9.1%} "
+              f"{base['p95_ms']:>10.2f} {now['p95_ms']:>10.2f} {p95:>+9.1%}{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load-test the prediction API with a replayable request mix.')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='an already running server, e.g. http://127.0.0.1:5000')
+    target.add_argument('--start', choices=['app', 'snapshot'],
+                        help='start a local server first: app.py on a threaded server, or ppaServe')
+    parser.add_argument('--workers', type=int, help='ppaServe worker processes with --start snapshot')
+    parser.add_argument('--mix', choices=sorted(MIXES), help='request mix (default: snapshot for --start '
+                                                              'snapshot, otherwise app)')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='requests to replay')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='client threads')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='seed for the request sequence')
+    parser.add_argument('--no-warmup', action='store_true', help='also time the first (training) requests')
+    parser.add_argument('--label', help='name for this serving configuration in the results')
+    parser.add_argument('--out', default=DEFAULT_OUT, help='where to write results JSON')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed throughput drop / p95 growth before an endpoint counts as a regression')
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    mix = args.mix or ('snapshot' if args.start == 'snapshot' else 'app')
+    requests = build_requests(args.requests, mix, args.seed)
+    server = None
+    if args.start:
+        server, url = start_server(args.start, args.workers)
+        target_name = f'{args.start} server at {url}'
+        client = HttpClient(url)
+    elif args.url:
+        target_name = args.url
+        client = HttpClient(args.url)
+    else:
+        import app as app_module
+        target_name = 'in-process app'
+        client = InProcessClient(app_module.app)
+    label = args.label or (f'snapshot x{args.workers or os.cpu_count()}' if args.start == 'snapshot'
+                           else args.start or args.url or 'in-process')
+
+    print(f"\nLoad test: {len(requests)} '{mix}' requests, {args.concurrency} concurrent, against {target_name}")
+    try:
+        summary, elapsed = run(client, requests, args.concurrency, not args.no_warmup)
+    finally:
+        if server is not None:
+            stop_server(server)
+    print_summary(summary)
+    print(f"\n{len(requests)} requests in {elapsed:.2f}s")
+
+    with open(args.out, 'w') as f:
+        json.dump({'env': environment(), 'label': label, 'target': target_name, 'mix': mix,
+                   'requests': args.requests, 'concurrency': args.concurrency, 'seed': args.seed,
+                   'warmup': not args.no_warmup, 'elapsed_s': elapsed, 'results': summary}, f, indent=2)
+    print(f"Saved results to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline.get('mix'), baseline.get('requests'), baseline.get('seed')) != (mix, args.requests, args.seed):
+            print(f"Warning: baseline replayed a different request sequence "
+                  f"({baseline.get('mix')}, {baseline.get('requests')} requests, seed {baseline.get('seed')})")
+        print(f"\nBaseline: {baseline.get('label')} ({baseline.get('concurrency')} concurrent)   "
+              f"now: {label} ({args.concurrency} concurrent)")
+        regressions = compare(summary, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print('\nNo regressions.')
@@ -0,0 +1,161 @@
+import os
+import time
+import threading
+from functools import wraps
+from bisect import bisect_left
+
+# Metrics are off unless PPA_METRICS is set before ppaPrediction/ppaInput are
+# imported. When off, timed() hands back the undecorated function and timer()
+# returns a shared no-op context, so the hot path pays nothing.
+ENABLED = os.environ.get('PPA_METRICS', '') not in ('', '0')
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_help = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def describe(name, text):
+    _help[name] = text
+
+
+def inc(name, amount=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+        hist[0][bisect_left(LATENCY_BUCKETS, value)] += 1
+        hist[1] += value
+        hist[2] += 1
+
+
+class _Timer:
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name, **labels):
+    """Context manager recording its wall time into the latency histogram name."""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name, labels)
+
+
+def timed(name, **labels):
+    """Decorator recording each call's wall time; a no-op when metrics are disabled."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+    return decorate
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in items) + '}'
+
+
+def render():
+    """Current metrics in the Prometheus text exposition format."""
+    if not ENABLED:
+        return '# metrics disabled; start with PPA_METRICS=1 to collect them\n'
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {k: (list(v[0]), v[1], v[2]) for k, v in _histograms.items()}
+    lines = []
+    for kind, series in (('counter', counters), ('gauge', gauges), ('histogram', histograms)):
+        for name in sorted({name for name, _ in series}):
+            if name in _help:
+                lines.append(f'# HELP {name} {_help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (n, labels), value in sorted(series.items()):
+                if n != name:
+                    continue
+                if kind != 'histogram':
+                    lines.append(f'{name}{_fmt_labels(labels)} {value}')
+                    continue
+                buckets, total, count = value
+                cumulative = 0
+                for bound, c in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+                    cumulative += c
+                    lines.append(f'{name}_bucket{_fmt_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_fmt_labels(labels)} {total}')
+                lines.append(f'{name}_count{_fmt_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+describe('ppa_function_seconds', 'Wall time of instrumented rating engine and parser calls.')
+describe('ppa_stage_seconds', 'Wall time of individual load, sort, replay and parse stages.')
+describe('ppa_http_request_seconds', 'Flask request latency by endpoint.')
+describe('ppa_json_serialize_seconds', 'Time spent serializing JSON responses.')
+describe('ppa_matches_replayed_total', 'Matches replayed through update_elo by train_elo.')
+describe('ppa_replay_matches_per_second', 'Replay throughput of the most recent train_elo call.')
+describe('ppa_resolve_cache_total', 'resolve_player lookups by cache result.')
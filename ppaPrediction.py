@@ -1,29 +1,233 @@
 import pandas as pd
+import numpy as np
 import os
+import io
+import json
+import hashlib
+import contextlib
 import math
+import time
 import difflib
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from array import array
+import ppaMetrics as metrics
+import ppaKelly
+from ppaGlicko import Glicko2Engine
+import ppaSnapshot
+import ppaInput
+import ppaProfile
 
 # ====== CONFIG ======
 DIVISIONS = {
-    '1': {'name': "Men's Doubles",   'match_csv': 'mens_matches.csv',   'elo_csv': 'mens_elo.csv',   'pair_csv': 'mens_pair_elo.csv',   'bet_csv': 'mens_bets.csv',   'scale': 0.075},
-    '2': {'name': "Women's Doubles", 'match_csv': 'womens_matches.csv', 'elo_csv': 'womens_elo.csv', 'pair_csv': 'womens_pair_elo.csv', 'bet_csv': 'womens_bets.csv', 'scale': 0.075},
-    '3': {'name': "Mixed Doubles",   'match_csv': 'mixed_matches.csv',  'elo_csv': 'mixed_elo.csv',  'pair_csv': 'mixed_pair_elo.csv',  'bet_csv': 'mixed_bets.csv',  'scale': 0.15},
+    '1': {'name': "Men's Doubles",   'match_csv': 'mens_matches.csv',   'elo_csv': 'mens_elo.csv',   'pair_csv': 'mens_pair_elo.csv',   'bet_csv': 'mens_bets.csv',   'cal_csv': 'mens_calibration.csv',   'model_file': 'mens_model.snap',   'scale': 0.075},
+    '2': {'name': "Women's Doubles", 'match_csv': 'womens_matches.csv', 'elo_csv': 'womens_elo.csv', 'pair_csv': 'womens_pair_elo.csv', 'bet_csv': 'womens_bets.csv',   'cal_csv': 'womens_calibration.csv', 'model_file': 'womens_model.snap', 'scale': 0.075},
+    '3': {'name': "Mixed Doubles",   'match_csv': 'mixed_matches.csv',  'elo_csv': 'mixed_elo.csv',  'pair_csv': 'mixed_pair_elo.csv',  'bet_csv': 'mixed_bets.csv',   'cal_csv': 'mixed_calibration.csv',  'model_file': 'mixed_model.snap',  'scale': 0.15},
 }
 
 INITIAL_ELO = 6
 RECENT_MATCHES = 5
+# Inactivity decay half-life in days (None: ratings never decay); see INACTIVITY DECAY.
+DECAY_HALF_LIFE_DAYS = float(os.environ['PPA_DECAY_HALF_LIFE']) if os.environ.get('PPA_DECAY_HALF_LIFE') else None
 
 # ====== PLAYER ELO DICTIONARY ======
 player_elo = {}
 recent_elo = {}
 matches_played = {}
 tournaments_seen = set()
+last_played = {}
 
 # ====== PAIR ELO DICTIONARY ======
 pair_elo = {}
 pair_matches = {}
 PAIR_MIN_MATCHES = 10
 PAIR_WEIGHT = 0.3
+# Lower bound of each pair_matches tier and the pair ELO weight it earns.
+PAIR_TIERS = [0, PAIR_MIN_MATCHES, 30, 50, 100]
+PAIR_TIER_WEIGHTS = [0.0, 0.20, 0.30, 0.40, 0.50]
+
+# ====== INACTIVITY DECAY ======
+# With DECAY_HALF_LIFE_DAYS set (or PPA_DECAY_HALF_LIFE in the environment), an
+# idle player's rating drifts back toward INITIAL_ELO: its distance from
+# INITIAL_ELO halves every half-life since their last match. Nothing sweeps
+# the players. last_played holds each player's last match day; reads apply
+# the closed form up to decay_clock (today, or the match a replay is on). The
+# next update_elo folds the decay into the stored rating. Pair ratings do not
+# decay.
+decay_clock = None
+
+def day_number(date):
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+def set_decay_clock(date):
+    """Read and update ratings as of date (None: today). Replays move it along with the matches."""
+    global decay_clock
+    if DECAY_HALF_LIFE_DAYS is not None:
+        decay_clock = None if date is None else day_number(date)
+
+def _clock():
+    return decay_clock if decay_clock is not None else day_number(np.datetime64('today', 'D'))
+
+def decay_factor(player):
+    if DECAY_HALF_LIFE_DAYS is None:
+        return 1.0
+    last = last_played.get(player)
+    if last is None:
+        return 1.0
+    return 0.5 ** (max(0, _clock() - last) / DECAY_HALF_LIFE_DAYS)
+
+def decayed(player, value):
+    f = decay_factor(player)
+    return value if f == 1.0 else INITIAL_ELO + (value - INITIAL_ELO) * f
+
+def apply_decay(players):
+    """Fold the decay since each player's last match into their stored rating and recent form."""
+    day = _clock()
+    for p in players:
+        if p not in player_elo:
+            last_played[p] = day
+            continue
+        last = last_played.get(p)
+        if last is not None and day <= last:
+            continue
+        f = decay_factor(p)
+        elo = player_elo[p]
+        if f != 1.0:
+            recent_elo[p] = [INITIAL_ELO + (h - INITIAL_ELO) * f for h in recent_elo.get(p, [])]
+            elo = INITIAL_ELO + (elo - INITIAL_ELO) * f
+        set_player_elo(p, elo, day)
+
+# ====== RANKING INDEX ======
+# (key, player) tuples kept sorted as ratings change, so leaderboards and
+# rank lookups never have to sort player_elo. The key is -elo. With decay,
+# every idle rating shrinks toward INITIAL_ELO by the same factor per day, so
+# the order of decayed ratings never changes while players sit out. The key
+# is then a time-free equivalent, log2 of the distance plus last_played /
+# half-life, with players above INITIAL_ELO first.
+rank_index = []
+
+def _rank_key(player, elo):
+    if DECAY_HALF_LIFE_DAYS is None:
+        return -elo
+    d = elo - INITIAL_ELO
+    if d == 0:
+        return (1, 0.0)
+    k = math.log2(abs(d)) + last_played.get(player, 0) / DECAY_HALF_LIFE_DAYS
+    return (0, -k) if d > 0 else (2, k)
+
+def set_player_elo(player, elo, played_on=None):
+    old = player_elo.get(player)
+    if old is not None:
+        del rank_index[bisect_left(rank_index, (_rank_key(player, old), player))]
+    else:
+        _resolve_cache.clear()
+        _name_keys.clear()
+    player_elo[player] = elo
+    if played_on is not None:
+        last_played[player] = played_on
+    insort(rank_index, (_rank_key(player, elo), player))
+
+def rebuild_rank_index():
+    rank_index[:] = sorted((_rank_key(p, elo), p) for p, elo in player_elo.items())
+    _resolve_cache.clear()
+    _name_keys.clear()
+
+def top_players(k=10, offset=0):
+    return [(p, get_elo(p)) for _, p in rank_index[offset:offset + k]]
+
+def player_rank(player):
+    """1-based leaderboard position of player, or None if unrated."""
+    if player not in player_elo:
+        return None
+    return bisect_left(rank_index, (_rank_key(player, player_elo[player]), player)) + 1
+
+def iter_leaderboard(offset=0, limit=None):
+    """Yield leaderboard rows in rank order, computing the reliability median once."""
+    median = reliability_median()
+    end = len(rank_index) if limit is None else offset + limit
+    for rank, (_, player) in enumerate(rank_index[offset:end], start=offset + 1):
+        yield {
+            'rank': rank,
+            'player': player,
+            'elo': get_elo(player),
+            'matches_played': matches_played.get(player, 0),
+            'reliability_score': get_reliability_score(player, median),
+        }
+
+# ====== PAIR INDEX ======
+# Pairs that have actually played, bucketed by PAIR_TIERS and kept sorted by
+# (-pair_elo, key) within each bucket. Pairs that only exist because
+# get_pair_elo was asked about them are never indexed.
+pair_buckets = [[] for _ in PAIR_TIERS]
+player_pairs = {}
+
+def pair_tier(matches):
+    return bisect_right(PAIR_TIERS, matches) - 1
+
+def set_pair_rating(key, elo, matches):
+    old = pair_matches.get(key)
+    if old is not None:
+        bucket = pair_buckets[pair_tier(old)]
+        del bucket[bisect_left(bucket, (-pair_elo[key], key))]
+    else:
+        for p in key:
+            player_pairs.setdefault(p, set()).add(key)
+    pair_elo[key] = elo
+    pair_matches[key] = matches
+    insort(pair_buckets[pair_tier(matches)], (-elo, key))
+
+def rebuild_pair_index():
+    for bucket in pair_buckets:
+        bucket.clear()
+    player_pairs.clear()
+    for key, matches in pair_matches.items():
+        pair_buckets[pair_tier(matches)].append((-pair_elo[key], key))
+        for p in key:
+            player_pairs.setdefault(p, set()).add(key)
+    for bucket in pair_buckets:
+        bucket.sort()
+
+def top_pairs(k=10, offset=0, min_matches=0, player=None):
+    """Best pairs by pair ELO with at least min_matches together, optionally only pairs containing player.
+
+    Returns (rows, total) where rows are (key, pair_elo, matches) tuples.
+    """
+    if player is not None:
+        ranked = sorted((-pair_elo[key], key) for key in player_pairs.get(player, ())
+                        if pair_matches[key] >= min_matches)
+        total = len(ranked)
+        ranked = ranked[offset:offset + k]
+    else:
+        first = pair_tier(min_matches)
+        total = sum(len(b) for b in pair_buckets[first + 1:])
+        total += sum(1 for _, key in pair_buckets[first] if pair_matches[key] >= min_matches)
+        merged = heapq.merge(*pair_buckets[first:])
+        if min_matches > PAIR_TIERS[first]:
+            merged = (e for e in merged if pair_matches[e[1]] >= min_matches)
+        ranked = islice(merged, offset, offset + k)
+    return [(key, -neg, pair_matches[key]) for neg, key in ranked], total
+
+def reset_ratings():
+    global player_elo, recent_elo, matches_played, last_played, pair_elo, pair_matches
+    global rank_index, pair_buckets, player_pairs, _resolve_cache, match_rows, h2h_teams, h2h_players, player_rows
+    global checkpoints, _name_keys
+    player_elo = {}
+    recent_elo = {}
+    matches_played = {}
+    last_played = {}
+    pair_elo = {}
+    pair_matches = {}
+    rank_index = []
+    pair_buckets = [[] for _ in PAIR_TIERS]
+    player_pairs = {}
+    _resolve_cache = {}
+    _name_keys = {}
+    match_rows = []
+    h2h_teams = {}
+    h2h_players = {}
+    player_rows = {}
+    checkpoints = None
 
 def pair_key(p1, p2):
     return tuple(sorted([p1, p2]))
@@ -44,17 +248,45 @@ def dynamic_k(team1_elo, team2_elo):
     return max(0.02, min(0.12, k))
 
 def get_elo(player):
-    return player_elo.get(player, INITIAL_ELO)
+    return decayed(player, player_elo.get(player, INITIAL_ELO))
+
+# name -> resolved name, valid until a new player is rated
+_resolve_cache = {}
+# ppaInput.name_key -> rated player, for every rated name and every alias of
+# one; built on the first lookup after the set of players changes
+_name_keys = {}
 
+def _player_keys():
+    if not _name_keys:
+        for p in player_elo:
+            _name_keys.setdefault(ppaInput.name_key(p), p)
+        for alias, p in ppaInput.load_aliases().items():
+            canonical = _name_keys.get(ppaInput.name_key(p))
+            if canonical is not None:
+                _name_keys.setdefault(ppaInput.name_key(alias), canonical)
+    return _name_keys
+
+@metrics.timed('ppa_function_seconds', function='resolve_player')
 def resolve_player(name):
-    known = list(player_elo.keys())
-    if not known:
+    if not player_elo:
         return name
-    matches = difflib.get_close_matches(name, known, n=1, cutoff=0.6)
-    if matches and matches[0] != name:
-        print(f"  [Auto-corrected] '{name}' → '{matches[0]}'")
-        return matches[0]
-    return name
+    resolved = _resolve_cache.get(name)
+    if resolved is None:
+        metrics.inc('ppa_resolve_cache_total', result='miss')
+        if name in player_elo:
+            resolved = name
+        else:
+            # Spelling variants and aliases resolve exactly; only unknown names are fuzzy matched.
+            resolved = _player_keys().get(ppaInput.name_key(name))
+        if resolved is None:
+            matches = difflib.get_close_matches(name, list(player_elo), n=1, cutoff=0.6)
+            resolved = matches[0] if matches else name
+        _resolve_cache[name] = resolved
+    else:
+        metrics.inc('ppa_resolve_cache_total', result='hit')
+    if resolved != name:
+        print(f"  [Auto-corrected] '{name}' → '{resolved}'")
+    return resolved
 
 def get_recent_elo(player):
     history = recent_elo.get(player, [])
@@ -66,20 +298,10 @@ def get_recent_elo(player):
 def get_effective_elo(player):
     base = player_elo.get(player, INITIAL_ELO)
     recent = get_recent_elo(player)
-    return 0.7 * recent + 0.3 * base
+    return decayed(player, 0.7 * recent + 0.3 * base)
 
 def get_dynamic_pair_weight(p1, p2):
-    m = get_pair_matches(p1, p2)
-    if m < PAIR_MIN_MATCHES:
-        return 0.0
-    elif m < 30:
-        return 0.20
-    elif m < 50:
-        return 0.30
-    elif m < 100:
-        return 0.40
-    else:
-        return 0.50
+    return PAIR_TIER_WEIGHTS[pair_tier(get_pair_matches(p1, p2))]
 
 def team_strength(team):
     p1 = get_effective_elo(team[0])
@@ -91,19 +313,23 @@ def team_strength(team):
         return (1 - weight) * individual_strength + weight * pair
     return individual_strength
 
-def get_reliability_score(player):
-    played = matches_played.get(player, 0)
-    if played == 0:
-        return 0.0
+def reliability_median():
     num_tournaments = max(1, len(tournaments_seen))
     threshold = min(30, max(2, num_tournaments // 2))
     all_played = [v for v in matches_played.values() if v >= threshold]
     if not all_played:
-        return 0.0
+        return 0
     all_played.sort()
     n = len(all_played)
-    median = (all_played[n // 2] if n % 2 != 0
-              else (all_played[n // 2 - 1] + all_played[n // 2]) / 2)
+    return (all_played[n // 2] if n % 2 != 0
+            else (all_played[n // 2 - 1] + all_played[n // 2]) / 2)
+
+def get_reliability_score(player, median=None):
+    played = matches_played.get(player, 0)
+    if played == 0:
+        return 0.0
+    if median is None:
+        median = reliability_median()
     if median == 0:
         return 0.0
     score = 5 * (played / median)
@@ -120,7 +346,10 @@ def update_recent_form(team1, team2, base_elo_change):
         recent_elo[p].append(player_elo[p])
         recent_elo[p] = recent_elo[p][-RECENT_MATCHES:]
 
+@metrics.timed('ppa_function_seconds', function='update_elo')
 def update_elo(team1, team2, team1_sets, team2_sets, scale=0.1):
+    if DECAY_HALF_LIFE_DAYS is not None:
+        apply_decay(team1 + team2)
     team1_elos = [get_effective_elo(p) for p in team1]
     team2_elos = [get_effective_elo(p) for p in team2]
     team1_strength = 0.6 * max(team1_elos) + 0.4 * min(team1_elos)
@@ -134,51 +363,648 @@ def update_elo(team1, team2, team1_sets, team2_sets, scale=0.1):
     for p in team1:
         rel = get_reliability_score(p) / 100
         k_scale = 0.5 + 0.5 * (1 - rel)
-        player_elo[p] = player_elo.get(p, INITIAL_ELO) + base_elo_change * k_scale
+        set_player_elo(p, player_elo.get(p, INITIAL_ELO) + base_elo_change * k_scale)
         matches_played[p] = matches_played.get(p, 0) + 1
     for p in team2:
         rel = get_reliability_score(p) / 100
         k_scale = 0.5 + 0.5 * (1 - rel)
-        player_elo[p] = player_elo.get(p, INITIAL_ELO) - base_elo_change * k_scale
+        set_player_elo(p, player_elo.get(p, INITIAL_ELO) - base_elo_change * k_scale)
         matches_played[p] = matches_played.get(p, 0) + 1
     key1 = pair_key(team1[0], team1[1])
     key2 = pair_key(team2[0], team2[1])
-    pair_elo[key1] = pair_elo.get(key1, (player_elo.get(team1[0], INITIAL_ELO) + player_elo.get(team1[1], INITIAL_ELO)) / 2) + base_elo_change
-    pair_elo[key2] = pair_elo.get(key2, (player_elo.get(team2[0], INITIAL_ELO) + player_elo.get(team2[1], INITIAL_ELO)) / 2) - base_elo_change
-    pair_matches[key1] = pair_matches.get(key1, 0) + 1
-    pair_matches[key2] = pair_matches.get(key2, 0) + 1
+    set_pair_rating(key1, pair_elo.get(key1, (player_elo.get(team1[0], INITIAL_ELO) + player_elo.get(team1[1], INITIAL_ELO)) / 2) + base_elo_change,
+                    pair_matches.get(key1, 0) + 1)
+    set_pair_rating(key2, pair_elo.get(key2, (player_elo.get(team2[0], INITIAL_ELO) + player_elo.get(team2[1], INITIAL_ELO)) / 2) - base_elo_change,
+                    pair_matches.get(key2, 0) + 1)
     update_recent_form(team1, team2, base_elo_change)
 
-# ====== TRAIN ELO ======
-def train_elo(csv_file):
-    global player_elo, recent_elo, matches_played, tournaments_seen, pair_elo, pair_matches
-    player_elo = {}
-    recent_elo = {}
-    matches_played = {}
-    tournaments_seen = set()
-    pair_elo.clear()
-    pair_matches.clear()
-    df = pd.read_csv(csv_file)
-    df = df.sort_values(by="date")
+# ====== RATING TIMELINE ======
+# Optional rating history recorded by train_elo(record_timeline=True): every
+# player's rating after each of their matches. Recording appends to flat typed
+# arrays; freeze_timeline() groups entries by player id, stores ratings as
+# float32 and match indexes as deltas, with an absolute anchor every
+# TIMELINE_BLOCK entries. An as-of lookup binary-searches the anchors and then
+# decodes a single block. Match dates are stored once per match, not per entry.
+TIMELINE_BLOCK = 32
+timeline = None
+_tl_recording = None
+
+def start_timeline():
+    global _tl_recording
+    _tl_recording = {'ids': {}, 'player': array('I'), 'match': array('I'), 'elo': array('f')}
+
+def _timeline_append(match_idx, players):
+    rec = _tl_recording
+    ids = rec['ids']
+    for p in dict.fromkeys(players):
+        rec['player'].append(ids.setdefault(p, len(ids)))
+        rec['match'].append(match_idx)
+        rec['elo'].append(player_elo[p])
+
+def _to_days(dates):
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int32)
+
+def freeze_timeline(dates):
+    """Compact the recording into a timeline; dates holds one entry per replayed match."""
+    global _tl_recording
+    rec = _tl_recording
+    _tl_recording = None
+    ids = rec['ids']
+    player = np.frombuffer(rec['player'], dtype=np.uint32)
+    match = np.frombuffer(rec['match'], dtype=np.uint32).astype(np.int64)
+    order = np.argsort(player, kind='stable')
+    player, match = player[order], match[order]
+    elo = np.frombuffer(rec['elo'], dtype=np.float32)[order]
+    counts = np.bincount(player, minlength=len(ids))
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    block_start = (np.arange(len(player)) - offsets[player]) % TIMELINE_BLOCK == 0
+    delta = np.diff(match, prepend=0)
+    delta[block_start] = 0
+    block_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(-(-counts // TIMELINE_BLOCK), out=block_offsets[1:])
+    return {
+        'ids': ids,
+        'names': list(ids),
+        'dates': _to_days(dates),
+        'offsets': offsets,
+        'block_offsets': block_offsets,
+        'anchors': match[block_start].astype(np.uint32),
+        'delta': delta.astype(np.uint16 if delta.max(initial=0) < 2 ** 16 else np.uint32),
+        'elo': elo,
+    }
+
+def timeline_nbytes(tl):
+    return sum(tl[k].nbytes for k in ('dates', 'offsets', 'block_offsets', 'anchors', 'delta', 'elo'))
+
+def _timeline_entry(tl, pid, match_idx):
+    """Position of the player's last entry at or before match_idx, or None."""
+    b0, b1 = tl['block_offsets'][pid], tl['block_offsets'][pid + 1]
+    b = np.searchsorted(tl['anchors'][b0:b1], match_idx, side='right') - 1
+    if b < 0:
+        return None
+    start = tl['offsets'][pid] + b * TIMELINE_BLOCK
+    end = min(start + TIMELINE_BLOCK, tl['offsets'][pid + 1])
+    decoded = int(tl['anchors'][b0 + b]) + np.cumsum(tl['delta'][start:end], dtype=np.int64)
+    return start + np.searchsorted(decoded, match_idx, side='right') - 1
+
+def rating_as_of(tl, player, date):
+    """Rating the player carried into date, i.e. after all matches on earlier dates."""
+    pid = tl['ids'].get(player)
+    n_before = int(np.searchsorted(tl['dates'], _to_days([date])[0], side='left'))
+    if pid is None or n_before == 0:
+        return INITIAL_ELO
+    pos = _timeline_entry(tl, pid, n_before - 1)
+    return INITIAL_ELO if pos is None else float(tl['elo'][pos])
+
+def _lttb(x, y, points):
+    """Largest-triangle-three-buckets downsampling; returns the kept indexes."""
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    keep = [0]
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        ax, ay = x[keep[-1]], y[keep[-1]]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        keep.append(lo + int(np.argmax(area)))
+    keep.append(n - 1)
+    return np.asarray(keep)
+
+def player_history(tl, player, points=None):
+    """Rating after each of the player's matches as (dates, match indexes, elos), optionally downsampled."""
+    pid = tl['ids'].get(player)
+    if pid is None:
+        return [], np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    start, end = tl['offsets'][pid], tl['offsets'][pid + 1]
+    b0, b1 = tl['block_offsets'][pid], tl['block_offsets'][pid + 1]
+    pos = np.arange(end - start)
+    running = np.cumsum(tl['delta'][start:end], dtype=np.int64)
+    block_base = running[pos - pos % TIMELINE_BLOCK]
+    match = tl['anchors'][b0:b1].astype(np.int64)[pos // TIMELINE_BLOCK] + running - block_base
+    elo = tl['elo'][start:end]
+    if points:
+        keep = _lttb(match.astype(np.float64), elo.astype(np.float64), points)
+        match, elo = match[keep], elo[keep]
+    dates = tl['dates'][match].astype('datetime64[D]').astype(str).tolist()
+    return dates, match, elo
+
+# ====== HEAD-TO-HEAD INDEX ======
+# Every trained match in replay order: its row id is its position, the same
+# match index the timeline uses. h2h_teams maps the two teams' pair_keys to
+# the row ids of their meetings, and h2h_players does the same for each pair
+# of opposing players. Both keys are sorted, so either side can ask.
+# player_rows is the inverted index from each player to their own row ids, in
+# replay order. A lookup only touches the rows it returns.
+H2H_COLS = ['date', 'tournament', 'round', 'team1_player1', 'team1_player2', 'team2_player1', 'team2_player2',
+            'team1_sets', 'team2_sets']
+match_rows = []
+h2h_teams = {}
+h2h_players = {}
+player_rows = {}
+
+def _meeting_key(a, b):
+    return (a, b) if a <= b else (b, a)
+
+def _index_rows(rows):
+    # _meeting_key and pair_key inlined: this runs for every match on every train and load.
+    teams, players, own = h2h_teams, h2h_players, player_rows
+    for row_id, (date, tournament, rnd, a1, a2, b1, b2, s1, s2) in enumerate(rows, start=len(match_rows)):
+        match_rows.append((date, tournament, rnd, (a1, a2), (b1, b2), int(s1), int(s2)))
+        k1 = (a1, a2) if a1 <= a2 else (a2, a1)
+        k2 = (b1, b2) if b1 <= b2 else (b2, b1)
+        key = (k1, k2) if k1 <= k2 else (k2, k1)
+        if key in teams:
+            teams[key].append(row_id)
+        else:
+            teams[key] = [row_id]
+        for p in (a1, a2):
+            for q in (b1, b2):
+                key = (p, q) if p <= q else (q, p)
+                if key in players:
+                    players[key].append(row_id)
+                else:
+                    players[key] = [row_id]
+        for p in (a1, a2, b1, b2):
+            if p in own:
+                own[p].append(row_id)
+            else:
+                own[p] = [row_id]
+
+def index_matches(df):
+    """Append df's matches, in order, to match_rows and the head-to-head index."""
+    _index_rows(zip(*(df[c].tolist() if c in df else [''] * len(df) for c in H2H_COLS)))
+
+def _meetings(ids, on_side1, limit=None):
+    """Record and most-recent-first meetings for row ids, seen from the side on_side1(row) picks out."""
+    record = {'played': len(ids), 'wins': 0, 'losses': 0, 'sets_won': 0, 'sets_lost': 0}
+    meetings = []
+    for row_id in reversed(ids):
+        date, tournament, rnd, team1, team2, s1, s2 = match_rows[row_id]
+        if not on_side1(team1):
+            team1, team2, s1, s2 = team2, team1, s2, s1
+        record['wins' if s1 > s2 else 'losses'] += 1
+        record['sets_won'] += s1
+        record['sets_lost'] += s2
+        if limit is None or len(meetings) < limit:
+            meetings.append({'row': row_id, 'date': date, 'tournament': tournament, 'round': rnd,
+                             'team1': list(team1), 'team2': list(team2), 'sets': f'{s1}-{s2}', 'won': s1 > s2})
+    return dict(record, meetings=meetings)
+
+def head_to_head(team1, team2, limit=None):
+    """Prior meetings of two teams, with team1's record and set scores."""
+    k1 = pair_key(*team1)
+    ids = h2h_teams.get(_meeting_key(k1, pair_key(*team2)), [])
+    return _meetings(ids, lambda team: pair_key(*team) == k1, limit)
+
+def player_head_to_head(player1, player2, limit=None):
+    """Every match player1 and player2 played on opposite sides, with player1's record."""
+    ids = h2h_players.get(_meeting_key(player1, player2), [])
+    return _meetings(ids, lambda team: player1 in team, limit)
+
+def player_profile(player, recent=10):
+    """Record, last recent matches, partners and form of one player, from their own rows only."""
+    ids = player_rows.get(player, [])
+    record = {'played': len(ids), 'wins': 0, 'losses': 0, 'sets_won': 0, 'sets_lost': 0}
+    partners = {}
+    matches = []
+    for row_id in reversed(ids):
+        date, tournament, rnd, team1, team2, s1, s2 = match_rows[row_id]
+        if player not in team1:
+            team1, team2, s1, s2 = team2, team1, s2, s1
+        won = s1 > s2
+        record['wins' if won else 'losses'] += 1
+        record['sets_won'] += s1
+        record['sets_lost'] += s2
+        partner = team1[1] if team1[0] == player else team1[0]
+        stats = partners.setdefault(partner, [0, 0])
+        stats[0] += 1
+        stats[1] += won
+        if len(matches) < recent:
+            matches.append({'row': row_id, 'date': date, 'tournament': tournament, 'round': rnd,
+                            'partner': partner, 'opponents': list(team2), 'sets': f'{s1}-{s2}', 'won': won})
+    record['win_rate'] = record['wins'] / record['played'] if ids else None
+    partners = [{'partner': p, 'played': n, 'wins': w, 'win_rate': w / n,
+                 'pair_elo': pair_elo.get(pair_key(player, p))}
+                for p, (n, w) in sorted(partners.items(), key=lambda e: (-e[1][0], -e[1][1], e[0]))]
+    form = {'results': ''.join('W' if m['won'] else 'L' for m in reversed(matches)), 'elo_trend': None}
+    pid = timeline['ids'].get(player) if timeline is not None else None
+    if pid is not None:
+        end = int(timeline['offsets'][pid + 1])
+        start = max(int(timeline['offsets'][pid]), end - recent)
+        form['elo_trend'] = [round(float(e), 3) for e in timeline['elo'][start:end]]
+    return dict(record, recent_matches=matches, partners=partners, form=form)
+
+def ingest_matches(df):
+    """Apply matches played after the trained history to the ratings and extend the head-to-head index.
+
+    Matches are applied in canonical order, as training would replay them. The
+    rating timeline is not extended and the calibration is not refitted. The
+    checkpoints are dropped, since they no longer lead to these ratings, so
+    what_if and state_before raise until the next train_elo(record_checkpoints=True).
+    """
+    global checkpoints
+    checkpoints = None
+    df = ppaInput.canonical_order(df)
     for _, row in df.iterrows():
-        team1 = [row['team1_player1'], row['team1_player2']]
-        team2 = [row['team2_player1'], row['team2_player2']]
         if 'tournament' in row:
             tournaments_seen.add(row['tournament'])
-        update_elo(team1, team2, row['team1_sets'], row['team2_sets'])
+        set_decay_clock(row['date'])
+        update_elo([row['team1_player1'], row['team1_player2']], [row['team2_player1'], row['team2_player2']],
+                   row['team1_sets'], row['team2_sets'])
+    set_decay_clock(None)
+    index_matches(df)
+
+# ====== MODEL STATE ======
+# Everything a trained model consists of. reset_ratings() and train_elo()
+# rebind these names rather than clearing them, so a snapshot taken after
+# training stays intact while the module goes on to train something else.
+STATE_KEYS = ('player_elo', 'recent_elo', 'matches_played', 'last_played', 'tournaments_seen', 'pair_elo', 'pair_matches',
+              'rank_index', 'pair_buckets', 'player_pairs', 'timeline', '_resolve_cache', '_name_keys', 'calibration',
+              'match_rows', 'h2h_teams', 'h2h_players', 'player_rows', 'checkpoints')
+
+def snapshot_state():
+    return {k: globals()[k] for k in STATE_KEYS}
+
+def install_state(state):
+    globals().update((k, state[k]) for k in STATE_KEYS)
+
+def train_snapshot(csv_file, record_timeline=False, vectorized=False, calibration_scale=None):
+    """Train from csv_file and return the resulting state; used to train in a worker process.
+
+    With calibration_scale, a calibration for predictions at that scale is fitted first.
+    """
+    global calibration
+    calibration = None
+    if calibration_scale is not None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            calibration, _ = calibrate(csv_file, calibration_scale)
+    train_elo(csv_file, record_timeline=record_timeline, vectorized=vectorized)
+    return snapshot_state()
+
+def train_checkpoints(csv_file):
+    """Record what-if checkpoints for csv_file and return them; used in a worker process.
+
+    This is a separate row-by-row pass, so the model itself can still be trained with the wave replay.
+    """
+    train_elo(csv_file, record_checkpoints=True)
+    return checkpoints
+
+# ====== WAVE REPLAY ======
+# Vectorized equivalent of calling update_elo on every row of a date-sorted
+# frame. Consecutive matches with no player in common form a wave: their
+# updates only read and write their own players and pairs, so each wave is
+# applied as a handful of NumPy operations over index arrays. The one thing
+# that couples them is the reliability median over everyone's match count, so
+# k_scale is still worked out player by player in row order, against a sorted
+# list of counts (a bisect per player instead of a full sort). Matches that
+# list the same player twice are replayed one at a time with the same
+# arithmetic as update_elo.
+_RECENT_WSUM = [sum([0.5 ** i for i in range(n)]) for n in range(RECENT_MATCHES + 1)]
+
+def _counts_reliability(played, counts, threshold):
+    """get_reliability_score for a player with `played` matches, given all match counts sorted."""
+    if played == 0:
+        return 0.0
+    start = bisect_left(counts, threshold)
+    n = len(counts) - start
+    if n == 0:
+        return 0.0
+    median = (counts[start + n // 2] if n % 2 != 0
+              else (counts[start + n // 2 - 1] + counts[start + n // 2]) / 2)
+    if median == 0:
+        return 0.0
+    score = 5 * (played / median)
+    score = min(20.0, max(0.0, score))
+    return round(score * 5, 2)
+
+def _counts_bump(counts, played):
+    """Move one player's count from played to played + 1, keeping counts sorted."""
+    if played == 0:
+        counts.insert(0, 1)
+    else:
+        counts[bisect_right(counts, played) - 1] = played + 1
+
+def _waves(ids, dup):
+    """Split rows into maximal runs of player-disjoint matches; rows in dup are returned alone."""
+    waves = []
+    start = 0
+    seen = set()
+    for i, row in enumerate(ids.tolist()):
+        if dup[i] or not seen.isdisjoint(row):
+            if i > start:
+                waves.append((start, i))
+            start, seen = i, set(row)
+            if dup[i]:
+                waves.append((i, i + 1))
+                start, seen = i + 1, set()
+        else:
+            seen.update(row)
+    if start < len(ids):
+        waves.append((start, len(ids)))
+    return waves
+
+def replay_waves(df, scale=0.1, record_timeline=False):
+    """Replay a date-sorted match frame from scratch; same result as update_elo row by row."""
+    global player_elo, recent_elo, matches_played, pair_elo, pair_matches, tournaments_seen
+    reset_ratings()
+    n = len(df)
+    codes, names = pd.factorize(df[['team1_player1', 'team1_player2', 'team2_player1', 'team2_player2']].to_numpy().ravel())
+    names = list(names)
+    ids = codes.reshape(n, 4)
+    n_players = len(names)
+    sets1 = df['team1_sets'].to_numpy()
+    sets2 = df['team2_sets'].to_numpy()
+    actual = (sets1 > sets2).astype(np.float64)
+    margin_multiplier = 1 + 0.5 * np.abs(sets1 - sets2)
+    if 'tournament' in df:
+        n_tournaments = np.maximum.accumulate(pd.factorize(df['tournament'])[0]) + 1
+    else:
+        n_tournaments = np.zeros(n, dtype=np.int64)
+    thresholds = np.minimum(30, np.maximum(2, np.maximum(1, n_tournaments) // 2)).tolist()
+    lo = np.minimum(ids[:, [0, 2]], ids[:, [1, 3]])
+    hi = np.maximum(ids[:, [0, 2]], ids[:, [1, 3]])
+    pair_codes, pair_uniques = pd.factorize((lo * n_players + hi).ravel())
+    pids = pair_codes.reshape(n, 2)
+    dup = (ids[:, :, None] == ids[:, None, :]).sum(axis=(1, 2)) > 4
+
+    elo = np.full(n_players, float(INITIAL_ELO))
+    hist = np.zeros((n_players, RECENT_MATCHES))
+    hlen = np.zeros(n_players, dtype=np.int64)
+    played = [0] * n_players
+    counts = []
+    pelo = np.zeros(len(pair_uniques))
+    pset = np.zeros(len(pair_uniques), dtype=bool)
+    pmatches = np.zeros(len(pair_uniques), dtype=np.int64)
+    weights = [0.5 ** i for i in range(RECENT_MATCHES)]
+    wsum = np.array([1.0] + _RECENT_WSUM[1:])
+    signs = np.array([1.0, 1.0, -1.0, -1.0])
+    rec = _tl_recording if record_timeline else None
+    if rec is not None:
+        rec['ids'].update(zip(names, range(n_players)))
+
+    def push_recent(players):
+        v = elo[players]
+        length = hlen[players]
+        full = players[length == RECENT_MATCHES]
+        hist[full, :-1] = hist[full, 1:]
+        hist[players, np.minimum(length, RECENT_MATCHES - 1)] = v
+        hlen[players] = np.minimum(length + 1, RECENT_MATCHES)
+
+    for s, e in _waves(ids, dup):
+        if dup[s]:
+            _replay_single(s, ids[s].tolist(), pids[s].tolist(), elo, hist, hlen, played, counts,
+                           pelo, pset, pmatches, sets1[s], sets2[s], thresholds[s], weights, scale)
+            if rec is not None:
+                for p in dict.fromkeys(ids[s].tolist()):
+                    rec['player'].append(p)
+                    rec['match'].append(s)
+                    rec['elo'].append(float(elo[p]))
+            continue
+        flat = ids[s:e].ravel()
+        length = hlen[flat]
+        acc = np.zeros(len(flat))
+        for i in range(RECENT_MATCHES):
+            acc = acc + np.where(length > i, hist[flat, i] * weights[i], 0.0)
+        recent = np.where(length == 0, float(INITIAL_ELO), acc / wsum[length])
+        eff = (0.7 * recent + 0.3 * elo[flat]).reshape(-1, 4)
+        strength1 = 0.6 * np.maximum(eff[:, 0], eff[:, 1]) + 0.4 * np.minimum(eff[:, 0], eff[:, 1])
+        strength2 = 0.6 * np.maximum(eff[:, 2], eff[:, 3]) + 0.4 * np.minimum(eff[:, 2], eff[:, 3])
+        expected = 1 / (1 + np.exp(-(strength1 - strength2) / scale))
+        k = np.clip(0.04 * (1 + 2 * np.abs(strength1 - strength2)), 0.02, 0.12)
+        change = k * margin_multiplier[s:e] * (actual[s:e] - expected)
+
+        k_scale = np.empty(len(flat))
+        for j, p in enumerate(flat.tolist()):
+            rel = _counts_reliability(played[p], counts, thresholds[s + j // 4]) / 100
+            k_scale[j] = 0.5 + 0.5 * (1 - rel)
+            _counts_bump(counts, played[p])
+            played[p] += 1
+        elo[flat] = elo[flat] + signs[np.arange(len(flat)) % 4] * (np.repeat(change, 4) * k_scale)
+
+        for side, a, b, sign in ((0, 0, 1, 1.0), (1, 2, 3, -1.0)):
+            key = pids[s:e, side]
+            init = (elo[ids[s:e, a]] + elo[ids[s:e, b]]) / 2
+            pelo[key] = np.where(pset[key], pelo[key], init) + sign * change
+            pset[key] = True
+            pmatches[key] += 1
+        push_recent(flat)
+        if rec is not None:
+            rec['player'].extend(flat.astype(np.uint32).tolist())
+            rec['match'].extend(np.repeat(np.arange(s, e), 4).tolist())
+            rec['elo'].extend(elo[flat].astype(np.float32).tolist())
+
+    player_elo = dict(zip(names, elo.tolist()))
+    matches_played = dict(zip(names, played))
+    recent_elo = {name: hist[i, :hlen[i]].tolist() for i, name in enumerate(names)}
+    keys = [pair_key(names[u // n_players], names[u % n_players]) for u in pair_uniques.tolist()]
+    pair_elo = dict(zip(keys, pelo.tolist()))
+    pair_matches = dict(zip(keys, pmatches.tolist()))
+    tournaments_seen = set(df['tournament']) if 'tournament' in df else set()
+    rebuild_rank_index()
+    rebuild_pair_index()
+
+def _replay_single(i, row, pair_row, elo, hist, hlen, played, counts, pelo, pset, pmatches,
+                   team1_sets, team2_sets, threshold, weights, scale):
+    """update_elo for one match on the wave replay arrays, for rows that repeat a player."""
+    def effective(p):
+        history = hist[p, :hlen[p]].tolist()
+        recent = (sum(h * w for h, w in zip(history, weights)) / _RECENT_WSUM[len(history)]
+                  if history else INITIAL_ELO)
+        return 0.7 * recent + 0.3 * float(elo[p])
+    effs = [effective(p) for p in row]
+    team1_strength = 0.6 * max(effs[:2]) + 0.4 * min(effs[:2])
+    team2_strength = 0.6 * max(effs[2:]) + 0.4 * min(effs[2:])
+    expected = 1 / (1 + math.exp(-(team1_strength - team2_strength) / scale))
+    actual = 1 if team1_sets > team2_sets else 0
+    k = dynamic_k(team1_strength, team2_strength)
+    change = k * (1 + 0.5 * abs(team1_sets - team2_sets)) * (actual - expected)
+    for j, p in enumerate(row):
+        rel = _counts_reliability(played[p], counts, threshold) / 100
+        k_scale = 0.5 + 0.5 * (1 - rel)
+        elo[p] = elo[p] + change * k_scale if j < 2 else elo[p] - change * k_scale
+        _counts_bump(counts, played[p])
+        played[p] += 1
+    for key, a, b, delta in ((pair_row[0], row[0], row[1], change), (pair_row[1], row[2], row[3], -change)):
+        base = pelo[key] if pset[key] else (elo[a] + elo[b]) / 2
+        pelo[key] = base + delta
+        pset[key] = True
+    for key in pair_row:
+        pmatches[key] += 1
+    for p in row:
+        length = hlen[p]
+        if length == RECENT_MATCHES:
+            hist[p, :-1] = hist[p, 1:].copy()
+        hist[p, min(length, RECENT_MATCHES - 1)] = elo[p]
+        hlen[p] = min(length + 1, RECENT_MATCHES)
+
+# ====== TRAIN ELO ======
+@metrics.timed('ppa_function_seconds', function='train_elo')
+def train_elo(csv_file, record_timeline=False, vectorized=False, record_checkpoints=False):
+    global tournaments_seen, timeline, checkpoints
+    reset_ratings()
+    tournaments_seen = set()
+    timeline = None
+    with metrics.timer('ppa_stage_seconds', stage='load_csv'):
+        df = pd.read_csv(csv_file)
+    with metrics.timer('ppa_stage_seconds', stage='sort'):
+        if not ppaInput.is_sorted(csv_file):
+            df = ppaInput.canonical_order(df)
+    if record_timeline:
+        start_timeline()
+    store = {'positions': [], 'labels': [], 'states': [], 'tournaments': 'tournament' in df} if record_checkpoints else None
+    replay_start = time.perf_counter()
+    with metrics.timer('ppa_stage_seconds', stage='replay'):
+        # Decay depends on match dates, which the wave replay does not track,
+        # and checkpoints need the state between tournaments.
+        if vectorized and DECAY_HALF_LIFE_DAYS is None and store is None:
+            replay_waves(df, record_timeline=record_timeline)
+        else:
+            for match_idx, (_, row) in enumerate(df.iterrows()):
+                team1 = [row['team1_player1'], row['team1_player2']]
+                team2 = [row['team2_player1'], row['team2_player2']]
+                if store is not None and (match_idx == 0 or (store['tournaments'] and
+                                                             row['tournament'] != store['labels'][-1])):
+                    store['positions'].append(match_idx)
+                    store['labels'].append(row['tournament'] if store['tournaments'] else None)
+                    store['states'].append(_checkpoint())
+                if 'tournament' in row:
+                    tournaments_seen.add(row['tournament'])
+                set_decay_clock(row['date'])
+                update_elo(team1, team2, row['team1_sets'], row['team2_sets'])
+                if record_timeline:
+                    _timeline_append(match_idx, team1 + team2)
+            set_decay_clock(None)
+    if metrics.ENABLED:
+        metrics.inc('ppa_matches_replayed_total', len(df))
+        metrics.set_gauge('ppa_replay_matches_per_second', len(df) / max(time.perf_counter() - replay_start, 1e-9))
+    if record_timeline:
+        timeline = freeze_timeline(df['date'].values)
+    index_matches(df)
+    if store is not None:
+        store['rows'] = match_rows
+        checkpoints = store
+
+# ====== CHECKPOINTS ======
+# train_elo(record_checkpoints=True) copies the rating state at every
+# tournament boundary of the replay: before the first match of each run of
+# rows from one tournament. A what-if restores the last checkpoint before the
+# earliest changed match and replays only the matches from there on, taken
+# from match_rows. Changes are keyed by row id, the same id head-to-head
+# meetings and player profiles report. Checkpoints hold plain copies of the
+# rating dicts; the ranking and pair indexes are rebuilt on restore.
+checkpoints = None
+
+def _checkpoint():
+    """A copy of the rating state that later updates leave alone."""
+    return {
+        'player_elo': dict(player_elo),
+        'recent_elo': {p: tuple(r) for p, r in recent_elo.items()},
+        'matches_played': dict(matches_played),
+        'last_played': dict(last_played),
+        'pair_elo': dict(pair_elo),
+        'pair_matches': dict(pair_matches),
+        'tournaments_seen': frozenset(tournaments_seen),
+    }
+
+def _restore(cp):
+    global player_elo, recent_elo, matches_played, last_played, tournaments_seen, pair_elo, pair_matches
+    global rank_index, pair_buckets, player_pairs, timeline, _resolve_cache, _name_keys
+    global match_rows, h2h_teams, h2h_players, player_rows
+    player_elo = dict(cp['player_elo'])
+    recent_elo = {p: list(r) for p, r in cp['recent_elo'].items()}
+    matches_played = dict(cp['matches_played'])
+    last_played = dict(cp['last_played'])
+    pair_elo = dict(cp['pair_elo'])
+    pair_matches = dict(cp['pair_matches'])
+    tournaments_seen = set(cp['tournaments_seen'])
+    rank_index = []
+    _resolve_cache = {}
+    _name_keys = {}
+    rebuild_rank_index()
+    pair_buckets = [[] for _ in PAIR_TIERS]
+    player_pairs = {}
+    rebuild_pair_index()
+    timeline = None
+    match_rows = []
+    h2h_teams = {}
+    h2h_players = {}
+    player_rows = {}
+
+def _replay_from(store, i, changes):
+    """Restore checkpoint i and replay every later match with changes applied; returns the number replayed."""
+    _restore(store['states'][i])
+    rows = store['rows']
+    for row_id in range(store['positions'][i], len(rows)):
+        date, tournament, rnd, team1, team2, s1, s2 = rows[row_id]
+        if row_id in changes:
+            if changes[row_id] is None:
+                continue
+            s1, s2 = changes[row_id]
+        if store['tournaments']:
+            tournaments_seen.add(tournament)
+        set_decay_clock(date)
+        update_elo(list(team1), list(team2), s1, s2)
+    set_decay_clock(None)
+    return len(rows) - store['positions'][i]
+
+def _store(store):
+    store = store if store is not None else checkpoints
+    if store is None:
+        raise ValueError("No checkpoints recorded; train with train_elo(..., record_checkpoints=True)")
+    return store
+
+def what_if(changes, store=None):
+    """The model as it would be with changes, {row id: (team1_sets, team2_sets), or None to drop the match}.
+
+    Returns (state, info); the current model is left installed. info names the
+    checkpoint the replay started from and how many matches it replayed.
+    """
+    store = _store(store)
+    changes = dict(changes)
+    for row_id in changes:
+        if not 0 <= row_id < len(store['rows']):
+            raise ValueError(f"No match with row id {row_id}")
+    original = snapshot_state()
+    try:
+        i = bisect_right(store['positions'], min(changes, default=len(store['rows']))) - 1
+        replayed = _replay_from(store, i, changes)
+        state = snapshot_state()
+    finally:
+        install_state(original)
+    return state, {'checkpoint': store['labels'][i], 'checkpoint_row': store['positions'][i], 'replayed': replayed}
+
+def state_before(tournament, store=None):
+    """The model as it stood before the first match of tournament."""
+    store = _store(store)
+    if tournament not in store['labels']:
+        raise ValueError(f"No checkpoint for tournament '{tournament}'")
+    original = snapshot_state()
+    try:
+        _restore(store['states'][store['labels'].index(tournament)])
+        return snapshot_state()
+    finally:
+        install_state(original)
+
+def compare_states(base, other, k=10):
+    """The top k of state other next to each player's rating and rank in state base."""
+    original = snapshot_state()
+    try:
+        install_state(other)
+        top = [(rank, p, get_elo(p)) for rank, (_, p) in enumerate(rank_index[:k], start=1)]
+        install_state(base)
+        return [{'rank': rank, 'player': p, 'elo': elo, 'base_rank': player_rank(p),
+                 'base_elo': get_elo(p) if p in player_elo else None} for rank, p, elo in top]
+    finally:
+        install_state(original)
 
 # ====== SAVE ELO ======
 def save_elo(csv_file):
-    rows = []
-    for player, elo in player_elo.items():
-        rows.append({
-            'player': player,
-            'elo': elo,
-            'matches_played': matches_played.get(player, 0),
-            'reliability_score': get_reliability_score(player)
-        })
-    df = pd.DataFrame(rows)
-    df = df.sort_values(by='elo', ascending=False)
+    df = pd.DataFrame(list(iter_leaderboard()),
+                      columns=['player', 'elo', 'matches_played', 'reliability_score', 'rank'])
     df.to_csv(csv_file, index=False)
     print(f"Saved Elo ratings to {csv_file}")
 
@@ -197,32 +1023,186 @@ def save_pair_elo(csv_file):
     df.to_csv(csv_file, index=False)
     print(f'Saved pair Elo ratings to {csv_file}')
 
-# ====== LOAD PAIR ELO ======
-def load_pair_elo(csv_file):
-    if os.path.exists(csv_file):
-        df = pd.read_csv(csv_file)
-        for _, row in df.iterrows():
-            key = pair_key(row['player1'], row['player2'])
-            pair_elo[key] = row['pair_elo']
-            pair_matches[key] = int(row['matches_together'])
-        print(f'Loaded pair Elo ratings from {csv_file}')
-    else:
-        print('No pair Elo CSV found. Will compute from match history.')
+# ====== MODEL SNAPSHOT ======
+# The complete trained model in one binary file (format in ppaSnapshot.py):
+# every player's rating, match count and recent-form window, the pair table,
+# tournaments_seen, the timeline and the calibration, plus precomputed
+# effective ratings and reliability scores for serving. Players are stored in
+# leaderboard order (id = rank - 1) with their original insertion order
+# alongside, so load_model rebuilds dicts, indexes and timeline exactly as
+# train_elo left them. The header records the model parameters and a hash of
+# the match CSV it was trained on.
+def source_version(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
 
-# ====== LOAD ELO ======
-def load_elo(csv_file):
-    if os.path.exists(csv_file):
-        df = pd.read_csv(csv_file)
-        for _, row in df.iterrows():
-            player_elo[row['player']] = row['elo']
-            if 'matches_played' in df.columns:
-                matches_played[row['player']] = int(row['matches_played'])
-        print(f"Loaded Elo ratings from {csv_file}")
-    else:
-        print("No Elo CSV found. Will compute from match history.")
+def model_arrays():
+    names = [p for _, p in rank_index]
+    ids = {p: i for i, p in enumerate(names)}
+    median = reliability_median()
+    width = max((len(h) for h in recent_elo.values()), default=0)
+    recent = np.full((len(names), width), np.nan)
+    recent_len = np.zeros(len(names), dtype=np.int16)
+    for i, p in enumerate(names):
+        window = recent_elo.get(p, [])
+        recent[i, :len(window)] = window
+        recent_len[i] = len(window)
+    keys = sorted((min(ids[key[0]], ids[key[1]]), max(ids[key[0]], ids[key[1]]), key) for key in pair_matches)
+    row = {key: r for r, (_, _, key) in enumerate(keys)}
+    blob, offsets = ppaSnapshot.encode_names(names)
+    t_blob, t_offsets = ppaSnapshot.encode_names(sorted(tournaments_seen))
+    arrays = {
+        'name_blob': blob,
+        'name_offsets': offsets,
+        'name_order': np.array(sorted(range(len(names)), key=lambda i: names[i].encode('utf-8')), dtype=np.int32),
+        'player_insertion': np.array([ids[p] for p in player_elo], dtype=np.int32),
+        'elo': np.array([player_elo[p] for p in names], dtype=np.float64),
+        'effective': np.array([0.7 * get_recent_elo(p) + 0.3 * player_elo[p] for p in names], dtype=np.float64),
+        'reliability': np.array([get_reliability_score(p, median) for p in names], dtype=np.float64),
+        'matches_played': np.array([matches_played.get(p, 0) for p in names], dtype=np.int64),
+        'last_played': np.array([last_played.get(p, -1) for p in names], dtype=np.int64),
+        'last_played_insertion': np.array([ids[p] for p in last_played], dtype=np.int32),
+        'recent': recent,
+        'recent_len': recent_len,
+        'pair_key': np.array([a * len(names) + b for a, b, _ in keys], dtype=np.int64),
+        'pair_swap': np.array([ids[key[0]] > ids[key[1]] for _, _, key in keys], dtype=bool),
+        'pair_insertion': np.array([row[key] for key in pair_matches], dtype=np.int32),
+        'pair_elo': np.array([pair_elo[key] for _, _, key in keys], dtype=np.float64),
+        'pair_matches': np.array([pair_matches[key] for _, _, key in keys], dtype=np.int64),
+        'tournament_blob': t_blob,
+        'tournament_offsets': t_offsets,
+    }
+    if calibration is not None:
+        arrays['calibration'] = np.asarray(calibration, dtype=np.float64)
+    if match_rows:
+        date, tournament, rnd, team1, team2, s1, s2 = zip(*match_rows)
+        for k, values in (('date', date), ('tournament', tournament), ('round', rnd)):
+            labels = list(dict.fromkeys(values))
+            code = {v: i for i, v in enumerate(labels)}
+            arrays[f'match_{k}_blob'], arrays[f'match_{k}_offsets'] = ppaSnapshot.encode_names(labels)
+            arrays[f'match_{k}'] = np.array([code[v] for v in values], dtype=np.int32)
+        arrays['match_players'] = np.array([[ids[p] for p in t1 + t2] for t1, t2 in zip(team1, team2)], dtype=np.int32)
+        arrays['match_sets'] = np.array([s1, s2], dtype=np.int64).T
+    if timeline is not None:
+        arrays['tl_name_blob'], arrays['tl_name_offsets'] = ppaSnapshot.encode_names(timeline['names'])
+        for k in ('dates', 'offsets', 'block_offsets', 'anchors', 'delta', 'elo'):
+            arrays['tl_' + k] = timeline[k]
+    return arrays, median
+
+def save_model(path, scale=0.15, source=None):
+    """Write the current model to path for predictions at scale; source is the match CSV it was trained on."""
+    arrays, median = model_arrays()
+    header = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'source': source_version(source) if source else None,
+        'source_file': os.path.basename(source) if source else None,
+        'params': {
+            'scale': scale,
+            'initial_elo': INITIAL_ELO,
+            'recent_matches': RECENT_MATCHES,
+            'decay_half_life_days': DECAY_HALF_LIFE_DAYS,
+            'pair_tiers': PAIR_TIERS,
+            'pair_tier_weights': PAIR_TIER_WEIGHTS,
+        },
+        'players': len(arrays['elo']),
+        'pairs': len(arrays['pair_key']),
+        'tournaments': len(tournaments_seen),
+        'reliability_median': median,
+    }
+    ppaSnapshot.write_arrays(path, header, arrays)
+    return header
+
+def load_model(path, source=None):
+    """Install the model saved at path; returns its header.
+
+    With source (a match CSV), returns None and leaves the current model alone
+    unless the snapshot was trained on exactly that file.
+    """
+    global player_elo, recent_elo, matches_played, last_played, tournaments_seen, pair_elo, pair_matches
+    global rank_index, pair_buckets, player_pairs, timeline, calibration, _resolve_cache, _name_keys
+    global match_rows, h2h_teams, h2h_players, player_rows, checkpoints
+    header, views, buf = ppaSnapshot.read_arrays(path)
+    try:
+        if 'player_insertion' not in views:
+            raise ValueError(f'{path} is a serving-only snapshot without the full model state')
+        if source is not None and header['source'] != source_version(source):
+            return None
+        a = {k: v.copy() for k, v in views.items()}
+    finally:
+        del views
+        buf.close()
+    names = ppaSnapshot.decode_names(a['name_blob'], a['name_offsets'])
+    order = a['player_insertion'].tolist()
+    elo = a['elo'].tolist()
+    played = a['matches_played'].tolist()
+    recent = a['recent']
+    recent_len = a['recent_len'].tolist()
+    player_elo = {names[i]: elo[i] for i in order}
+    matches_played = {names[i]: played[i] for i in order}
+    recent_elo = {names[i]: recent[i, :recent_len[i]].tolist() for i in order}
+    last = a['last_played'].tolist()
+    last_played = {names[i]: last[i] for i in a['last_played_insertion'].tolist()}
+    rank_index = sorted((_rank_key(p, e), p) for e, p in zip(elo, names))
+    n = len(names)
+    keys = []
+    for key, swap in zip(a['pair_key'].tolist(), a['pair_swap'].tolist()):
+        p1, p2 = names[key // n], names[key % n]
+        keys.append((p2, p1) if swap else (p1, p2))
+    values = a['pair_elo'].tolist()
+    counts = a['pair_matches'].tolist()
+    rows = a['pair_insertion'].tolist()
+    pair_elo = {keys[r]: values[r] for r in rows}
+    pair_matches = {keys[r]: counts[r] for r in rows}
+    pair_buckets = [[] for _ in PAIR_TIERS]
+    player_pairs = {}
+    rebuild_pair_index()
+    tournaments_seen = set(ppaSnapshot.decode_names(a['tournament_blob'], a['tournament_offsets']))
+    calibration = a.get('calibration')
+    timeline = None
+    if 'tl_elo' in a:
+        tl_names = ppaSnapshot.decode_names(a['tl_name_blob'], a['tl_name_offsets'])
+        timeline = {'ids': {p: i for i, p in enumerate(tl_names)}, 'names': tl_names}
+        for k in ('dates', 'offsets', 'block_offsets', 'anchors', 'delta', 'elo'):
+            timeline[k] = a['tl_' + k]
+    match_rows = []
+    h2h_teams = {}
+    h2h_players = {}
+    player_rows = {}
+    checkpoints = None
+    if 'match_players' in a:
+        labels = {k: ppaSnapshot.decode_names(a[f'match_{k}_blob'], a[f'match_{k}_offsets'])
+                  for k in ('date', 'tournament', 'round')}
+        columns = [[labels[k][i] for i in a[f'match_{k}'].tolist()] for k in ('date', 'tournament', 'round')]
+        columns += [[names[i] for i in col] for col in a['match_players'].T.tolist()]
+        columns += a['match_sets'].T.tolist()
+        _index_rows(zip(*columns))
+    _resolve_cache = {}
+    _name_keys = {}
+    return header
+
+def update_model(path, csv_file, scale=0.15):
+    """Bring the model saved at path up to date with csv_file by ingesting only the matches added since.
+
+    This works when csv_file, in canonical order, is the trained history followed by new matches. The updated
+    model is installed and saved back to path, and its header is returned. Otherwise it returns None, leaving
+    an undefined model installed; retrain then.
+    """
+    load_model(path)
+    df = read_matches(csv_file)
+    n = len(match_rows)
+    if not n or len(df) <= n:
+        return None
+    head = df.iloc[:n]
+    trained = [(date, tournament, rnd, (a1, a2), (b1, b2), int(s1), int(s2)) for date, tournament, rnd, a1, a2, b1, b2, s1, s2
+               in zip(*(head[c].tolist() if c in head else [''] * n for c in H2H_COLS))]
+    if trained != match_rows:
+        return None
+    ingest_matches(df.iloc[n:])
+    return save_model(path, scale, csv_file)
 
 # ====== PREDICT MATCH ======
-def predict(team1_players, team2_players, scale=0.15):
+@metrics.timed('ppa_function_seconds', function='predict')
+def predict(team1_players, team2_players, scale=0.15, calibrated=True):
     team1_elo = team_strength(team1_players)
     team2_elo = team_strength(team2_players)
     diff = team1_elo - team2_elo
@@ -231,40 +1211,288 @@ def predict(team1_players, team2_players, scale=0.15):
     avg_reliability = sum(get_reliability_score(p) for p in all_players) / 400
     uncertainty = 1 - avg_reliability
     prob_team1_win = prob_team1_win * (1 - uncertainty) + 0.5 * uncertainty
+    if calibrated and calibration is not None:
+        prob_team1_win = apply_calibration(prob_team1_win, calibration)
     return prob_team1_win
 
-def tournament_accuracy(match_csv, scale=0.15):
+# ====== CALIBRATION ======
+# A calibration maps predict's raw probability to the win rate that
+# probability actually had in the backtest. It is stored as a table of
+# CALIBRATION_POINTS values on an even grid over [0, 1], so applying it is
+# a single linear interpolation. None means predict is used as is.
+# Backtests always replay with calibrated=False: they are what the table
+# is fitted from.
+CALIBRATION_POINTS = 101
+calibration = None
+
+def apply_calibration(prob, table):
+    x = prob * (len(table) - 1)
+    i = min(max(int(x), 0), len(table) - 2)
+    t = x - i
+    return table[i] + t * (table[i + 1] - table[i])
+
+def _isotonic(probs, outcomes):
+    """Pool-adjacent-violators fit; returns (x, y) breakpoints of the non-decreasing fit."""
+    order = np.argsort(probs, kind='stable')
+    x, y = probs[order], outcomes[order].astype(np.float64)
+    blocks = []  # [sum_y, count, sum_x]
+    for xi, yi in zip(x.tolist(), y.tolist()):
+        blocks.append([yi, 1, xi])
+        while len(blocks) > 1 and blocks[-2][0] / blocks[-2][1] >= blocks[-1][0] / blocks[-1][1]:
+            s, c, sx = blocks.pop()
+            blocks[-1][0] += s
+            blocks[-1][1] += c
+            blocks[-1][2] += sx
+    return (np.array([b[2] / b[1] for b in blocks]), np.array([b[0] / b[1] for b in blocks]))
+
+def _platt(probs, outcomes, iters=50):
+    """Logistic regression of the outcome on logit(prob) by Newton's method; returns (a, b)."""
+    p = np.clip(probs, 1e-6, 1 - 1e-6)
+    X = np.column_stack([np.log(p / (1 - p)), np.ones(len(p))])
+    w = np.array([1.0, 0.0])
+    for _ in range(iters):
+        q = 1 / (1 + np.exp(-X @ w))
+        grad = X.T @ (outcomes - q)
+        hess = (X * (q * (1 - q))[:, None]).T @ X
+        step = np.linalg.solve(hess + 1e-9 * np.eye(2), grad)
+        w = w + step
+        if np.abs(step).max() < 1e-10:
+            break
+    return w
+
+def fit_calibration(probs, outcomes, method='platt', points=CALIBRATION_POINTS):
+    """Calibration table from backtest predictions for team 1 and whether team 1 won.
+
+    Each match is also counted from team 2's side, so the fit treats both
+    teams alike: calibrating 1 - p gives 1 - (calibrated p).
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    outcomes = np.asarray(outcomes, dtype=np.float64)
+    probs, outcomes = np.concatenate([probs, 1 - probs]), np.concatenate([outcomes, 1 - outcomes])
+    grid = np.linspace(0, 1, points)
+    if method == 'isotonic':
+        x, y = _isotonic(probs, outcomes)
+        table = np.interp(grid, x, y)
+    elif method == 'platt':
+        a, b = _platt(probs, outcomes)
+        g = np.clip(grid, 1e-6, 1 - 1e-6)
+        table = 1 / (1 + np.exp(-(a * np.log(g / (1 - g)) + b)))
+    else:
+        raise ValueError(f"Unknown calibration method '{method}' (choose isotonic or platt)")
+    return np.clip((table + 1 - table[::-1]) / 2, 1e-4, 1 - 1e-4)
+
+def reliability_diagram(probs, outcomes, bins=10):
+    """Per probability bin: matches, mean predicted and observed win rate (NaN for empty bins)."""
+    probs = np.asarray(probs, dtype=np.float64)
+    outcomes = np.asarray(outcomes, dtype=np.float64)
+    idx = np.minimum((probs * bins).astype(int), bins - 1)
+    count = np.bincount(idx, minlength=bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        predicted = np.bincount(idx, weights=probs, minlength=bins) / count
+        observed = np.bincount(idx, weights=outcomes, minlength=bins) / count
+    return pd.DataFrame({'bin': [f"{i / bins:.1f}-{(i + 1) / bins:.1f}" for i in range(bins)],
+                         'matches': count, 'predicted': predicted, 'observed': observed})
+
+def brier(probs, outcomes):
+    return float(np.mean((np.asarray(probs) - np.asarray(outcomes)) ** 2))
+
+def calibrate(match_csv, scale=0.1, method='platt', warmup=11):
+    """Fit a calibration from a rolling backtest of match_csv and report how much it helps.
+
+    The before/after report uses a time split: fitted on the first half of the
+    post-warmup matches and scored on the second half. The table returned is
+    then refitted on all of them.
+    """
+    global tournaments_seen
+    df, segments = load_matches(match_csv)
+    engine = EloEngine(scale)
+    engine.reset()
+    tournaments_seen = set()
+    probs, outcomes = [], []
+    for t_idx, (t, t_matches) in enumerate(rating_periods(df, segments)):
+        p = engine.replay_period(t_matches)
+        if t_idx >= warmup:
+            probs.extend(p)
+            outcomes.extend((t_matches['team1_sets'] > t_matches['team2_sets']).astype(int))
+    probs, outcomes = np.array(probs), np.array(outcomes)
+    half = len(probs) // 2
+    holdout = fit_calibration(probs[:half], outcomes[:half], method)
+    after = np.array([apply_calibration(p, holdout) for p in probs[half:]])
+    before_diagram = reliability_diagram(probs[half:], outcomes[half:])
+    after_diagram = reliability_diagram(after, outcomes[half:])
+    print(f"\nCalibration ({method}) fitted on {half} matches, scored on the next {len(probs) - half}:")
+    print("{:<9} {:>8} {:>10} {:>10} {:>8} {:>10} {:>10}".format(
+        'Bin', 'Before N', 'Predicted', 'Observed', 'After N', 'Predicted', 'Observed'))
+    for b, a in zip(before_diagram.itertuples(), after_diagram.itertuples()):
+        print(f"{b.bin:<9} {b.matches:>8} {b.predicted:>10.3f} {b.observed:>10.3f} {a.matches:>8} {a.predicted:>10.3f} {a.observed:>10.3f}")
+    report = {'brier_before': brier(probs[half:], outcomes[half:]), 'brier_after': brier(after, outcomes[half:]),
+              'before': before_diagram, 'after': after_diagram}
+    print(f"Brier score: {report['brier_before']:.4f} → {report['brier_after']:.4f}")
+    return fit_calibration(probs, outcomes, method), report
+
+def save_calibration(csv_file, table):
+    pd.DataFrame({'prob': np.linspace(0, 1, len(table)), 'calibrated': table}).to_csv(csv_file, index=False)
+
+def load_calibration(csv_file):
+    global calibration
+    calibration = pd.read_csv(csv_file)['calibrated'].to_numpy(dtype=np.float64)
+    return calibration
+
+# ====== TOURNAMENT SEGMENTS ======
+# read_matches returns a match CSV in date order. Files that ppaInput.save_csvs
+# wrote in canonical order (date, round, parse order) and that are unchanged
+# since are used as they are; anything else is sorted by date.
+# Rating periods are tournaments. load_matches sorts a match CSV by date and
+# then lays every tournament out as one contiguous run of rows, tournaments in
+# order of first appearance and rows in date order within each. A segment is
+# that run's [start, end) offsets plus its date range and match count, so
+# iterating tournaments is a slice per tournament instead of a boolean mask
+# over the whole frame per tournament.
+def tournament_segments(df):
+    """(stream, segments): df with each tournament's rows contiguous, and one segment dict per tournament."""
+    codes, names = pd.factorize(df['tournament'], use_na_sentinel=False)
+    if len(codes) and (np.diff(codes) < 0).any():
+        df = df.iloc[np.argsort(codes, kind='stable')]
+        codes = np.sort(codes, kind='stable')
+    counts = np.bincount(codes, minlength=len(names)).tolist()
+    dates = df['date'].tolist() if 'date' in df else [None] * len(df)
+    segments = []
+    start = 0
+    for t, n in zip(names.tolist(), counts):
+        segments.append({'tournament': t, 'start': start, 'end': start + n,
+                         'first_date': dates[start], 'last_date': dates[start + n - 1], 'matches': n})
+        start += n
+    return df, segments
+
+def read_matches(match_csv):
+    """The match CSV in canonical order (see ppaInput.canonical_order), the order every replay uses."""
     df = pd.read_csv(match_csv)
-    df = df.sort_values(by="date").reset_index(drop=True)
-    tournaments = df['tournament'].unique()
+    if not ppaInput.is_sorted(match_csv):
+        df = ppaInput.canonical_order(df)
+    return df
+
+def load_matches(match_csv):
+    """The match CSV as a date-sorted stream with contiguous tournaments, and its segments."""
+    df = read_matches(match_csv).reset_index(drop=True)
+    return tournament_segments(df)
+
+def match_segments(match_csv):
+    """Just the tournament segments of match_csv; used in a worker process."""
+    return load_matches(match_csv)[1]
+
+# ====== RATING ENGINES ======
+# An engine owns a set of ratings, predicts a match from them and updates them
+# one rating period (a tournament's matches, in date order) at a time. The
+# backtests, scale_sweep, the CLI and the web app go through this interface;
+# EloEngine drives the module-level ELO state above, other engines keep their
+# own (see ppaGlicko.py).
+class EloEngine:
+    name = 'elo'
+    sweep_param = 'scale'
+    sweep_values = [0.025, 0.05, 0.075, 0.1, 0.125, 0.15, 0.175, 0.2]
+
+    def __init__(self, scale=0.1):
+        self.scale = scale
+
+    def reset(self):
+        reset_ratings()
+
+    def rating(self, player):
+        return get_elo(player)
+
+    def reliability(self, player):
+        return get_reliability_score(player)
+
+    def predict(self, team1, team2):
+        return predict(team1, team2, self.scale)
+
+    def predict_many(self, matches):
+        """Win probabilities for team 1 of every row, from the current ratings."""
+        return np.array([predict([r.team1_player1, r.team1_player2], [r.team2_player1, r.team2_player2], self.scale)
+                         for r in matches.itertuples(index=False)])
+
+    def update(self, matches):
+        for _, row in matches.iterrows():
+            team1 = [row['team1_player1'], row['team1_player2']]
+            team2 = [row['team2_player1'], row['team2_player2']]
+            set_decay_clock(row['date'])
+            update_elo(team1, team2, row['team1_sets'], row['team2_sets'], scale=self.scale)
+        set_decay_clock(None)
+
+    def replay_period(self, matches, with_reliability=False):
+        """Predict each match from the ratings just before it, then apply it; returns the probabilities
+        (and with_reliability, each match's average player reliability as a 0-1 factor, as predict_match uses it)."""
+        probs = []
+        reliability = []
+        for _, row in matches.iterrows():
+            team1 = [row['team1_player1'], row['team1_player2']]
+            team2 = [row['team2_player1'], row['team2_player2']]
+            if with_reliability:
+                reliability.append(sum(get_reliability_score(p) for p in team1 + team2) / 400)
+            set_decay_clock(row['date'])
+            probs.append(predict(team1, team2, self.scale, calibrated=False))
+            update_elo(team1, team2, row['team1_sets'], row['team2_sets'], scale=self.scale)
+        set_decay_clock(None)
+        return (probs, reliability) if with_reliability else probs
+
+    def replay(self, df):
+        # ELO updates match by match, so the whole history is one period.
+        return self.replay_period(df)
+
+    def fit(self, csv_file):
+        train_elo(csv_file, vectorized=True)
+
+    def snapshot(self):
+        return snapshot_state()
+
+    def install(self, state):
+        install_state(state)
+        return self
+
+ENGINES = {'elo': EloEngine, 'glicko2': Glicko2Engine}
+
+def get_engine(name='elo', scale=0.1, **params):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown rating engine '{name}' (choose from {', '.join(ENGINES)})")
+    return ENGINES[name](scale=scale, **params)
+
+def rating_periods(df, segments=None):
+    """(tournament, matches) for each tournament of a date-sorted frame, in order of first appearance.
+
+    Pass the segments load_matches returned with df to skip regrouping it.
+    """
+    if segments is None:
+        df, segments = tournament_segments(df)
+    return [(seg['tournament'], df.iloc[seg['start']:seg['end']]) for seg in segments]
+
+def train_engine_snapshot(csv_file, name, scale=0.1):
+    """Fit a non-ELO engine from csv_file and return its state; used to train in a worker process."""
+    engine = get_engine(name, scale)
+    engine.fit(csv_file)
+    return engine.snapshot()
+
+def tournament_accuracy(match_csv, scale=0.15, engine=None):
+    engine = engine or EloEngine(scale)
+    df, segments = load_matches(match_csv)
     results = []
-    global player_elo, recent_elo, matches_played
-    player_elo = {}
-    recent_elo = {}
-    pair_elo.clear()
-    pair_matches.clear()
-    matches_played = {}
+    engine.reset()
     WARMUP_TOURNAMENTS = 11
     cum_correct = 0
     cum_total = 0
     cum_log_loss = 0
-    for t_idx, t in enumerate(tournaments):
-        t_matches = df[df['tournament'] == t]
+    for t_idx, (t, t_matches) in enumerate(rating_periods(df, segments)):
         is_warmup = t_idx < WARMUP_TOURNAMENTS
         correct = 0
         total = 0
         log_loss = 0
-        for _, row in t_matches.iterrows():
-            team1 = [row['team1_player1'], row['team1_player2']]
-            team2 = [row['team2_player1'], row['team2_player2']]
-            prob = predict(team1, team2, scale)
-            actual = 1 if row['team1_sets'] > row['team2_sets'] else 0
+        probs = engine.replay_period(t_matches)
+        for prob, won in zip(probs, t_matches['team1_sets'] > t_matches['team2_sets']):
+            actual = 1 if won else 0
             predicted = 1 if prob > 0.5 else 0
             if predicted == actual:
                 correct += 1
             log_loss += -(actual * math.log(prob + 1e-9) + (1 - actual) * math.log(1 - prob + 1e-9))
             total += 1
-            update_elo(team1, team2, row['team1_sets'], row['team2_sets'], scale=scale)
         accuracy = correct / total
         avg_log_loss = log_loss / total
         results.append((t, accuracy, avg_log_loss))
@@ -284,31 +1512,63 @@ def tournament_accuracy(match_csv, scale=0.15):
         print(f"=== Final Post-Warmup Log Loss: {cum_log_loss / cum_total:.4f} ===")
     return results
 
+def accuracy_report(match_csv, scale=0.15, name='elo', warmup=11):
+    """Per-tournament and cumulative post-warmup accuracy and log loss of the named engine, as plain data.
+
+    Used to backtest in a worker process; it replays into this module's globals.
+    """
+    global tournaments_seen
+    df, segments = load_matches(match_csv)
+    engine = get_engine(name, scale)
+    engine.reset()
+    tournaments_seen = set()
+    cum_correct = cum_total = 0
+    cum_log_loss = 0.0
+    results = []
+    for t_idx, (t, t_matches) in enumerate(rating_periods(df, segments)):
+        is_warmup = t_idx < warmup
+        correct = total = 0
+        log_loss = 0.0
+        probs = engine.replay_period(t_matches)
+        for prob, won in zip(probs, t_matches['team1_sets'] > t_matches['team2_sets']):
+            actual = 1 if won else 0
+            if (1 if prob > 0.5 else 0) == actual:
+                correct += 1
+            log_loss += -(math.log(prob + 1e-9) if actual else math.log(1 - prob + 1e-9))
+            total += 1
+        entry = {'tournament': t, 'accuracy': correct / total, 'log_loss': log_loss / total, 'warmup': is_warmup}
+        if not is_warmup:
+            cum_correct += correct
+            cum_total += total
+            cum_log_loss += log_loss
+            entry['cum_accuracy'] = cum_correct / cum_total
+            entry['cum_log_loss'] = cum_log_loss / cum_total
+        else:
+            entry['cum_accuracy'] = 0
+            entry['cum_log_loss'] = 0
+        results.append(entry)
+    return {'results': results,
+            'final_accuracy': cum_correct / cum_total if cum_total > 0 else 0,
+            'final_log_loss': cum_log_loss / cum_total if cum_total > 0 else 0,
+            'engine': name}
+
 # ====== ROLLING EVALUATION ======
-def compute_accuracy(match_csv, scale=0.1):
-    global player_elo, recent_elo, matches_played, tournaments_seen, pair_elo, pair_matches
-    df = pd.read_csv(match_csv)
-    df = df.sort_values(by="date")
-    player_elo = {}
-    recent_elo = {}
-    matches_played = {}
+def compute_accuracy(match_csv, scale=0.1, engine=None):
+    global tournaments_seen
+    engine = engine or EloEngine(scale)
+    df = read_matches(match_csv)
+    engine.reset()
     tournaments_seen = set()
-    pair_elo.clear()
-    pair_matches.clear()
     correct = 0
     total = 0
     log_loss = 0
-    for _, row in df.iterrows():
-        team1 = [row['team1_player1'], row['team1_player2']]
-        team2 = [row['team2_player1'], row['team2_player2']]
-        prob = predict(team1, team2, scale)
-        actual = 1 if row['team1_sets'] > row['team2_sets'] else 0
+    for prob, won in zip(engine.replay(df), df['team1_sets'] > df['team2_sets']):
+        actual = 1 if won else 0
         predicted = 1 if prob > 0.5 else 0
         if predicted == actual:
             correct += 1
         log_loss += -(actual * math.log(prob + 1e-9) + (1 - actual) * math.log(1 - prob + 1e-9))
         total += 1
-        update_elo(team1, team2, row['team1_sets'], row['team2_sets'], scale=scale)
     accuracy = correct / total
     avg_log_loss = log_loss / total
     print(f"Rolling Accuracy: {accuracy:.2%}")
@@ -316,15 +1576,12 @@ def compute_accuracy(match_csv, scale=0.1):
     return accuracy, avg_log_loss
 
 # ====== PREDICT MATCH WITH KELLY ======
-def predict_match(team1_players, team2_players, bankroll=100, odds_team1=1.8, odds_team2=1.8, scale=0.15, return_kelly=False):
-    team1_elo = team_strength(team1_players)
-    team2_elo = team_strength(team2_players)
-    diff = team1_elo - team2_elo
-    prob_team1_win = 1 / (1 + math.exp(-diff / scale))
+@metrics.timed('ppa_function_seconds', function='predict_match')
+def predict_match(team1_players, team2_players, bankroll=100, odds_team1=1.8, odds_team2=1.8, scale=0.15, return_kelly=False, engine=None):
+    engine = engine or EloEngine(scale)
+    prob_team1_win = engine.predict(team1_players, team2_players)
     all_players = team1_players + team2_players
-    avg_reliability = sum(get_reliability_score(p) for p in all_players) / 400
-    uncertainty = 1 - avg_reliability
-    prob_team1_win = prob_team1_win * (1 - uncertainty) + 0.5 * uncertainty
+    avg_reliability = sum(engine.reliability(p) for p in all_players) / 400
     prob_team2_win = 1 - prob_team1_win
     result = {"probability_team1": prob_team1_win, "probability_team2": prob_team2_win}
     if return_kelly:
@@ -340,6 +1597,140 @@ def predict_match(team1_players, team2_players, bankroll=100, odds_team1=1.8, od
         })
     return result
 
+# ====== SLATE KELLY ======
+SLATE_COLS = ['team1_player1', 'team1_player2', 'team2_player1', 'team2_player2', 'odds1', 'odds2']
+
+def slate_frame(rows):
+    """DataFrame from dicts holding either the four player columns or "players", plus odds1 and odds2."""
+    records = []
+    for r in rows:
+        record = {k: v for k, v in r.items() if k != 'players'}
+        if 'players' in r:
+            record.update(zip(SLATE_COLS[:4], r['players']))
+        records.append(record)
+    slate = pd.DataFrame(records)
+    missing = [c for c in SLATE_COLS if c not in slate]
+    if missing:
+        raise ValueError(f"Slate is missing columns: {', '.join(missing)}")
+    slate[['odds1', 'odds2']] = slate[['odds1', 'odds2']].astype(float)
+    return slate
+
+def load_slate(path):
+    """A slate of matchups with odds from a local CSV, or JSON (a list of rows or {"lines": [...]})."""
+    if path.lower().endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return slate_frame(data['lines'] if isinstance(data, dict) else data)
+    return slate_frame(pd.read_csv(path).to_dict('records'))
+
+def resolve_many(names):
+    """resolve_player over a list, looking each distinct name up once; returns (resolved, {name: correction})."""
+    lookup = {name: resolve_player(name) for name in dict.fromkeys(names)}
+    return [lookup[n] for n in names], {n: r for n, r in lookup.items() if r != n}
+
+def resolve_slate(slate):
+    """Resolve every player column of a slate in one pass; returns (slate, corrections)."""
+    players = slate[SLATE_COLS[:4]].to_numpy().ravel().tolist()
+    resolved, corrections = resolve_many(players)
+    slate = slate.copy()
+    slate[SLATE_COLS[:4]] = np.array(resolved, dtype=object).reshape(-1, 4)
+    return slate, corrections
+
+def predict_slate(slate, bankroll=100, scale=0.15, engine=None, fraction=1.0, max_fraction=1.0):
+    """Size a slate of concurrent bets together instead of one predict_match at a time.
+
+    slate is a DataFrame with SLATE_COLS. Each match is bet on the side with the
+    better edge (or skipped if neither has one), then ppaKelly solves for the
+    stakes maximising expected log growth across all of them at once. fraction
+    scales the result (fractional Kelly); max_fraction caps the total stake.
+    """
+    engine = engine or EloEngine(scale)
+    slate = slate.reset_index(drop=True)
+    prob1 = np.asarray(engine.predict_many(slate), dtype=np.float64)
+    odds1 = slate['odds1'].to_numpy(dtype=np.float64)
+    odds2 = slate['odds2'].to_numpy(dtype=np.float64)
+    edge1 = prob1 * odds1 - 1
+    edge2 = (1 - prob1) * odds2 - 1
+    side = np.where(edge1 >= edge2, 1, 2)
+    bet_prob = np.where(side == 1, prob1, 1 - prob1)
+    bet_odds = np.where(side == 1, odds1, odds2)
+    chosen = np.flatnonzero(np.maximum(edge1, edge2) > 0)
+    result = ppaKelly.slate_kelly(bet_prob[chosen], bet_odds[chosen], cap=max_fraction)
+    stakes = np.zeros(len(slate))
+    independent = np.zeros(len(slate))
+    stakes[chosen] = result['stakes'] * fraction
+    independent[chosen] = result['independent_stakes']
+    bets = []
+    for i, row in slate.iterrows():
+        bets.append({
+            "team1": [row['team1_player1'], row['team1_player2']],
+            "team2": [row['team2_player1'], row['team2_player2']],
+            "probability_team1": float(prob1[i]),
+            "odds1": float(odds1[i]),
+            "odds2": float(odds2[i]),
+            "bet_team": int(side[i]) if stakes[i] > 0 else None,
+            "edge": float(max(edge1[i], edge2[i])),
+            "stake": round(float(bankroll * stakes[i]), 2),
+            "independent_kelly": round(float(bankroll * independent[i]), 2),
+        })
+    return {
+        "bets": bets,
+        "total_stake": round(float(bankroll * stakes.sum()), 2),
+        "independent_total": round(float(bankroll * independent.sum()), 2),
+        "expected_log_growth": result['expected_log_growth'],
+        "independent_log_growth": result['independent_log_growth'],
+        "method": result['method'],
+        "scenarios": result['scenarios'],
+    }
+
+# ====== EDGE SCANNER ======
+# Prices in a line's odds ladder, as multiples of the offered price.
+LADDER_STEPS = [0.90, 0.95, 1.0, 1.05, 1.10, 1.20]
+
+def scan_edges(slate, bankroll=100, scale=0.15, engine=None, ladder=LADDER_STEPS):
+    """Expected value and Kelly x reliability stake (as predict_match sizes them) for every line of a slate.
+
+    All probabilities come from one engine.predict_many call. Each line reports
+    both sides' EV, the better side's stake, its fair price and a ladder of the
+    stake at prices around the offered one. Lines come back sorted by edge.
+    """
+    engine = engine or EloEngine(scale)
+    slate = slate.reset_index(drop=True)
+    prob1 = np.asarray(engine.predict_many(slate), dtype=np.float64)
+    player_rel = {p: engine.reliability(p) for p in pd.unique(slate[SLATE_COLS[:4]].to_numpy().ravel())}
+    reliability = np.array([sum(player_rel[p] for p in row) / 400
+                            for row in slate[SLATE_COLS[:4]].itertuples(index=False)])
+    probs = np.column_stack([prob1, 1 - prob1])
+    odds = slate[['odds1', 'odds2']].to_numpy(dtype=np.float64)
+    ev = probs * odds - 1
+    best = ev.argmax(axis=1)
+    rows = np.arange(len(slate))
+    p, o = probs[rows, best], odds[rows, best]
+    kelly = np.maximum(0, ((o - 1) * p - (1 - p)) / (o - 1))
+    prices = o[:, None] * np.asarray(ladder)
+    ladder_stakes = bankroll * reliability[:, None] * np.maximum(0, ((prices - 1) * p[:, None] - (1 - p[:, None])) / (prices - 1))
+    lines = []
+    for i, row in slate.iterrows():
+        lines.append({
+            "team1": [row['team1_player1'], row['team1_player2']],
+            "team2": [row['team2_player1'], row['team2_player2']],
+            "probability_team1": float(prob1[i]),
+            "odds1": float(odds[i, 0]),
+            "odds2": float(odds[i, 1]),
+            "ev_team1": float(ev[i, 0]),
+            "ev_team2": float(ev[i, 1]),
+            "bet_team": int(best[i]) + 1 if ev[i, best[i]] > 0 else None,
+            "edge": float(ev[i, best[i]]),
+            "fair_odds": float(1 / p[i]),
+            "kelly": float(kelly[i]),
+            "reliability_factor": float(reliability[i]),
+            "stake": round(float(bankroll * kelly[i] * reliability[i]), 2),
+            "ladder": [{"price": round(float(pr), 3), "stake": round(float(st), 2)}
+                       for pr, st in zip(prices[i], ladder_stakes[i])],
+        })
+    lines.sort(key=lambda line: line['edge'], reverse=True)
+    return lines
+
 # ====== BET HISTORY ======
 def save_bet(csv_file, team1, team2, odds1, odds2, bet_team, bet_amount, prob_team1, prob_team2, reliability_factor, tournament):
     import datetime
@@ -414,66 +1805,102 @@ def settle_bet(csv_file):
     print(f'Bet settled: {result} | P&L: ${pnl}')
 
 # ====== SCALE SWEEP ======
-def scale_sweep(match_csv):
-    """Test multiple scale values and report accuracy + log loss for each."""
-    scales = [0.025, 0.05, 0.075, 0.1, 0.125, 0.15, 0.175, 0.2]
-    df_info = pd.read_csv(match_csv)
-    total_matches = len(df_info)
-    total_tournaments = len(df_info['tournament'].unique())
-    print(f"\nDivision data: {total_matches} matches | {total_tournaments} tournaments")
-    global player_elo, recent_elo, matches_played, tournaments_seen, pair_elo, pair_matches
+def scale_sweep(match_csv, engine='elo', scale=0.1):
+    """Test multiple values of the engine's tuning parameter (the scale, for ELO) and report accuracy + log loss for each."""
+    engine_cls = ENGINES[engine]
+    param = engine_cls.sweep_param
+    df, segments = load_matches(match_csv)
+    print(f"\nDivision data: {len(df)} matches | {len(segments)} tournaments")
+    global tournaments_seen
 
-    df = pd.read_csv(match_csv)
-    df = df.sort_values(by="date").reset_index(drop=True)
-    tournaments = df['tournament'].unique()
+    periods = rating_periods(df, segments)
     WARMUP = 11
 
-    print("\n{:<8} {:<12} {:<12}".format("Scale", "Accuracy", "Log Loss"))
+    print("\n{:<8} {:<12} {:<12}".format(param.capitalize(), "Accuracy", "Log Loss"))
     print("-" * 34)
 
     best_acc = (0, None)
     best_ll = (float('inf'), None)
 
-    for scale in scales:
-        player_elo = {}
-        recent_elo = {}
-        matches_played = {}
+    for value in engine_cls.sweep_values:
+        model = get_engine(engine, **dict({'scale': scale}, **{param: value}))
+        model.reset()
         tournaments_seen = set()
-        pair_elo.clear()
-        pair_matches.clear()
 
         cum_correct = cum_total = 0
         cum_log_loss = 0.0
 
-        for t_idx, t in enumerate(tournaments):
-            t_matches = df[df['tournament'] == t]
+        for t_idx, (t, t_matches) in enumerate(periods):
             is_warmup = t_idx < WARMUP
-            for _, row in t_matches.iterrows():
-                team1 = [row['team1_player1'], row['team1_player2']]
-                team2 = [row['team2_player1'], row['team2_player2']]
-                prob = predict(team1, team2, scale)
-                actual = 1 if row['team1_sets'] > row['team2_sets'] else 0
-                if not is_warmup:
-                    if (1 if prob > 0.5 else 0) == actual:
-                        cum_correct += 1
-                    cum_log_loss += -(actual * math.log(prob + 1e-9) + (1 - actual) * math.log(1 - prob + 1e-9))
-                    cum_total += 1
-                update_elo(team1, team2, row['team1_sets'], row['team2_sets'], scale=scale)
+            probs = model.replay_period(t_matches)
+            if is_warmup:
+                continue
+            for prob, won in zip(probs, t_matches['team1_sets'] > t_matches['team2_sets']):
+                actual = 1 if won else 0
+                if (1 if prob > 0.5 else 0) == actual:
+                    cum_correct += 1
+                cum_log_loss += -(actual * math.log(prob + 1e-9) + (1 - actual) * math.log(1 - prob + 1e-9))
+                cum_total += 1
 
         acc = cum_correct / cum_total if cum_total > 0 else 0
         ll = cum_log_loss / cum_total if cum_total > 0 else 0
-        print(f"{scale:<8} {acc:.4f}      {ll:.4f}")
+        print(f"{value:<8} {acc:.4f}      {ll:.4f}")
 
         if acc > best_acc[0]:
-            best_acc = (acc, scale)
+            best_acc = (acc, value)
         if ll < best_ll[0]:
-            best_ll = (ll, scale)
+            best_ll = (ll, value)
+
+    print(f"\n=== Best Accuracy:  {param}={best_acc[1]} ({best_acc[0]:.4f}) ===")
+    print(f"=== Best Log Loss:  {param}={best_ll[1]} ({best_ll[0]:.4f}) ===")
 
-    print(f"\n=== Best Accuracy:  scale={best_acc[1]} ({best_acc[0]:.4f}) ===")
-    print(f"=== Best Log Loss:  scale={best_ll[1]} ({best_ll[0]:.4f}) ===")
+# ====== ENGINE COMPARISON ======
+def compare_engines(match_csv, scale=0.1, engines=None, warmup=11):
+    """Backtest each engine over the same tournaments and report accuracy, log loss and Brier score,
+    overall and by the engine's own reliability (lowest, middle and highest third of matches).
+
+    Reliability is the mean over the four players at the start of each tournament, so this shows
+    whether an engine's confidence (get_reliability_score for ELO, rating deviation for Glicko-2)
+    actually tracks how good its predictions are.
+    """
+    global tournaments_seen
+    df, segments = load_matches(match_csv)
+    periods = rating_periods(df, segments)
+    cols = ['team1_player1', 'team1_player2', 'team2_player1', 'team2_player2']
+    print("\n{:<10} {:<8} {:>7} {:>10} {:>10} {:>8}".format("Engine", "Band", "Matches", "Accuracy", "Log Loss", "Brier"))
+    print("-" * 58)
+    summary = {}
+    for name in engines or list(ENGINES):
+        engine = get_engine(name, scale)
+        engine.reset()
+        tournaments_seen = set()
+        probs, actual, reliability = [], [], []
+        for t_idx, (t, t_matches) in enumerate(periods):
+            rel = [sum(engine.reliability(p) for p in row) / 4 for row in t_matches[cols].itertuples(index=False)]
+            p = engine.replay_period(t_matches)
+            if t_idx >= warmup:
+                probs.extend(p)
+                reliability.extend(rel)
+                actual.extend((t_matches['team1_sets'] > t_matches['team2_sets']).astype(int))
+        probs, actual = np.clip(np.array(probs), 1e-9, 1 - 1e-9), np.array(actual)
+        order = np.argsort(reliability, kind='stable')
+        bands = [('all', np.arange(len(probs)))] + list(zip(['low', 'mid', 'high'], np.array_split(order, 3)))
+        summary[name] = {}
+        for band, idx in bands:
+            p, a = probs[idx], actual[idx]
+            row = {
+                'matches': len(idx),
+                'accuracy': float(np.mean((p > 0.5) == a)),
+                'log_loss': float(-np.mean(a * np.log(p) + (1 - a) * np.log(1 - p))),
+                'brier': float(np.mean((p - a) ** 2)),
+            }
+            summary[name][band] = row
+            print(f"{name:<10} {band:<8} {row['matches']:>7} {row['accuracy']:>10.2%} {row['log_loss']:>10.4f} {row['brier']:>8.4f}")
+    return summary
 
 # ====== MAIN ======
 if __name__ == '__main__':
+    ppaProfile.flag_enabled()
     print("Select division:")
     for k, v in DIVISIONS.items():
         print(f"  {k}. {v['name']}")
@@ -487,96 +1914,182 @@ if __name__ == '__main__':
     PAIR_ELO_CSV = cfg['pair_csv']
     BET_HISTORY_CSV = cfg['bet_csv']
     SCALE        = cfg['scale']
-    print(f"\nLoaded: {cfg['name']} (scale={SCALE})\n")
+    ENGINE_NAME = input(f"Rating engine ({'/'.join(ENGINES)}, default elo): ").strip() or 'elo'
+    if ENGINE_NAME not in ENGINES:
+        print("Unknown engine, defaulting to elo")
+        ENGINE_NAME = 'elo'
+    ENGINE = get_engine(ENGINE_NAME, SCALE)
+    if os.path.exists(cfg['cal_csv']):
+        load_calibration(cfg['cal_csv'])
+    print(f"\nLoaded: {cfg['name']} (scale={SCALE}, engine={ENGINE_NAME}"
+          f"{', calibrated' if calibration is not None else ''})\n")
+
+    def train_ratings(csv_file):
+        # Reuse the saved model while it was trained on this exact file, or ingest just the matches appended
+        # since; keep the calibration loaded above.
+        global calibration
+        table = calibration
+        if not (os.path.exists(cfg['model_file']) and (load_model(cfg['model_file'], source=csv_file)
+                                                       or update_model(cfg['model_file'], csv_file, SCALE))):
+            train_elo(csv_file)
+            save_model(cfg['model_file'], SCALE, csv_file)
+        calibration = table
+
+    def train(csv_file):
+        # Player names are always resolved against the ELO ratings.
+        train_ratings(csv_file)
+        if ENGINE_NAME != 'elo':
+            ENGINE.fit(csv_file)
 
     while True:
-        decision = input("Options: scale sweep(0), test accuracy(1), accuracy by tournament(2), bet suggestions(3), match predictions(4), Top 10(5), player rating(6), save bet(7), view bet history(8), settle bet(9)\n")
-        if decision == '0':
-            scale_sweep(MATCH_CSV)
-        elif decision == '1':
-            compute_accuracy(MATCH_CSV, SCALE)
-        elif decision == '2':
-            tournament_accuracy(MATCH_CSV, SCALE)
-        elif decision == '3':
-            train_elo(MATCH_CSV)
-            players = []
-            for i in range(4):
-                players.append(resolve_player(input(f"player {i+1}: ")))
-            bankroll = float(input("What is our bankroll? "))
-            odds1 = float(input("What is the odds for team 1? "))
-            odds2 = float(input("What is the odds for team 2? "))
-            results = predict_match(
-                [players[0], players[1]],
-                [players[2], players[3]],
-                bankroll, odds1, odds2, scale=SCALE, return_kelly=True
-            )
-            print(results)
-        elif decision == '4':
-            players = []
-            for i in range(4):
-                players.append(resolve_player(input(f"player {i+1}: ")))
-            train_elo(MATCH_CSV)
-            prob = predict([players[0], players[1]], [players[2], players[3]], SCALE)
-            print(f"\nTeam 1 Win Probability: {prob:.2%}")
-            print(f"Team 2 Win Probability: {(1-prob):.2%}\n")
-            print(prob)
-        elif decision == '5':
-            train_elo(MATCH_CSV)
-            save_elo(ELO_CSV)
-            save_pair_elo(PAIR_ELO_CSV)
-            if not player_elo:
-                print("Elo ratings not computed yet. Run accuracy test or process matches first.")
-            else:
-                top_players = sorted(player_elo.items(), key=lambda x: x[1], reverse=True)[:10]
-                print("\n=== Top 10 Players by Elo ===")
-                for rank, (player, elo) in enumerate(top_players, start=1):
-                    played = matches_played.get(player, 0)
-                    reliability = get_reliability_score(player)
-                    print(f"{rank}. {player}: {elo:.2f} | Matches: {played} | Reliability: {reliability}%")
-                print()
-        elif decision == '6':
-            train_elo(MATCH_CSV)
-            player = input("Who's Rating are you looking for?\n")
-            played = matches_played.get(player, 0)
-            reliability = get_reliability_score(player)
-            print(f"{player}: ELO={get_elo(player):.2f} | Matches Played={played} | Reliability={reliability}%")
-        elif decision == '7':
-            train_elo(MATCH_CSV)
-            players = []
-            for i in range(4):
-                players.append(resolve_player(input(f'player {i+1}: ')))
-            tournament = input('Tournament name: ')
-            bankroll = float(input('What is our bankroll? '))
-            odds1 = float(input('What is the odds for team 1? '))
-            odds2 = float(input('What is the odds for team 2? '))
-            results = predict_match(
-                [players[0], players[1]],
-                [players[2], players[3]],
-                bankroll, odds1, odds2, scale=SCALE, return_kelly=True
-            )
-            print(results)
-            bet_team_input = input('Which team did you bet on? (1/2/none): ').strip()
-            if bet_team_input in ['1', '2']:
-                if bet_team_input == '1':
-                    bet_team = players[0] + ' / ' + players[1]
-                    bet_amount = float(results['suggested_bet_team1'].replace('$', ''))
+        decision = input("Options: scale sweep(0), test accuracy(1), accuracy by tournament(2), bet suggestions(3), match predictions(4), top players(5), player rating(6), save bet(7), view bet history(8), settle bet(9), compare engines(10), bet slate(11), scan odds file(12), calibrate(13), head to head(14)\n")
+        # --profile (or PPA_PROFILE) profiles each chosen option into its own report.
+        with ppaProfile.session(f"option{decision}"):
+            if decision == '0':
+                scale_sweep(MATCH_CSV, ENGINE_NAME, SCALE)
+            elif decision == '1':
+                compute_accuracy(MATCH_CSV, SCALE, ENGINE)
+            elif decision == '2':
+                tournament_accuracy(MATCH_CSV, SCALE, ENGINE)
+            elif decision == '3':
+                train(MATCH_CSV)
+                players = []
+                for i in range(4):
+                    players.append(resolve_player(input(f"player {i+1}: ")))
+                bankroll = float(input("What is our bankroll? "))
+                odds1 = float(input("What is the odds for team 1? "))
+                odds2 = float(input("What is the odds for team 2? "))
+                results = predict_match(
+                    [players[0], players[1]],
+                    [players[2], players[3]],
+                    bankroll, odds1, odds2, scale=SCALE, return_kelly=True, engine=ENGINE
+                )
+                print(results)
+            elif decision == '4':
+                players = []
+                for i in range(4):
+                    players.append(resolve_player(input(f"player {i+1}: ")))
+                train(MATCH_CSV)
+                prob = ENGINE.predict([players[0], players[1]], [players[2], players[3]])
+                print(f"\nTeam 1 Win Probability: {prob:.2%}")
+                print(f"Team 2 Win Probability: {(1-prob):.2%}\n")
+                print(prob)
+            elif decision == '5':
+                train_ratings(MATCH_CSV)
+                save_elo(ELO_CSV)
+                save_pair_elo(PAIR_ELO_CSV)
+                if not player_elo:
+                    print("Elo ratings not computed yet. Run accuracy test or process matches first.")
                 else:
-                    bet_team = players[2] + ' / ' + players[3]
-                    bet_amount = float(results['suggested_bet_team2'].replace('$', ''))
-                confirm = input(f'Save bet of ${bet_amount} on {bet_team}? (y/n): ').strip()
-                if confirm == 'y':
-                    save_bet(BET_HISTORY_CSV, [players[0], players[1]], [players[2], players[3]],
-                             odds1, odds2, bet_team, bet_amount,
-                             results['probability_team1'], results['probability_team2'],
-                             results['reliability_factor'], tournament)
-        elif decision == '8':
-            view_bet_history(BET_HISTORY_CSV)
-        elif decision == '9':
-            settle_bet(BET_HISTORY_CSV)
-        else:
-            while True:
-                leave = input("Do you want to Quit: y/n \n")
-                if leave == 'y' or leave == 'n':
+                    k = input("How many players? (default 10) ").strip()
+                    k = int(k) if k.isdigit() else 10
+                    print(f"\n=== Top {k} Players by Elo ===")
+                    for row in iter_leaderboard(limit=k):
+                        print(f"{row['rank']}. {row['player']}: {row['elo']:.2f} | Matches: {row['matches_played']} | Reliability: {row['reliability_score']}%")
+                    print()
+            elif decision == '6':
+                train_ratings(MATCH_CSV)
+                player = input("Who's Rating are you looking for?\n")
+                played = matches_played.get(player, 0)
+                reliability = get_reliability_score(player)
+                rank = player_rank(player)
+                rank_str = f"{rank} of {len(rank_index)}" if rank else "unranked"
+                print(f"{player}: ELO={get_elo(player):.2f} | Rank={rank_str} | Matches Played={played} | Reliability={reliability}%")
+            elif decision == '7':
+                train(MATCH_CSV)
+                players = []
+                for i in range(4):
+                    players.append(resolve_player(input(f'player {i+1}: ')))
+                tournament = input('Tournament name: ')
+                bankroll = float(input('What is our bankroll? '))
+                odds1 = float(input('What is the odds for team 1? '))
+                odds2 = float(input('What is the odds for team 2? '))
+                results = predict_match(
+                    [players[0], players[1]],
+                    [players[2], players[3]],
+                    bankroll, odds1, odds2, scale=SCALE, return_kelly=True, engine=ENGINE
+                )
+                print(results)
+                bet_team_input = input('Which team did you bet on? (1/2/none): ').strip()
+                if bet_team_input in ['1', '2']:
+                    if bet_team_input == '1':
+                        bet_team = players[0] + ' / ' + players[1]
+                        bet_amount = float(results['suggested_bet_team1'].replace('$', ''))
+                    else:
+                        bet_team = players[2] + ' / ' + players[3]
+                        bet_amount = float(results['suggested_bet_team2'].replace('$', ''))
+                    confirm = input(f'Save bet of ${bet_amount} on {bet_team}? (y/n): ').strip()
+                    if confirm == 'y':
+                        save_bet(BET_HISTORY_CSV, [players[0], players[1]], [players[2], players[3]],
+                                 odds1, odds2, bet_team, bet_amount,
+                                 results['probability_team1'], results['probability_team2'],
+                                 results['reliability_factor'], tournament)
+            elif decision == '8':
+                view_bet_history(BET_HISTORY_CSV)
+            elif decision == '9':
+                settle_bet(BET_HISTORY_CSV)
+            elif decision == '10':
+                compare_engines(MATCH_CSV, SCALE)
+            elif decision == '11':
+                train(MATCH_CSV)
+                path = input(f"Slate CSV/JSON ({', '.join(SLATE_COLS)}): ").strip()
+                slate, _ = resolve_slate(load_slate(path))
+                bankroll = float(input('What is our bankroll? '))
+                result = predict_slate(slate, bankroll, SCALE, ENGINE)
+                print(f"\n{'Match':<52} {'P(T1)':>6} {'Bet':>4} {'Stake':>9} {'Alone':>9}")
+                for b in result['bets']:
+                    match = f"{' / '.join(b['team1'])} vs {' / '.join(b['team2'])}"
+                    print(f"{match[:52]:<52} {b['probability_team1']:>6.1%} {b['bet_team'] or '-':>4} "
+                          f"{'$' + format(b['stake'], '.2f'):>9} {'$' + format(b['independent_kelly'], '.2f'):>9}")
+                print(f"\nTotal stake: ${result['total_stake']:.2f} (bet one at a time: ${result['independent_total']:.2f})")
+                print(f"Expected log growth: {result['expected_log_growth']:.4f} (one at a time: {result['independent_log_growth']:.4f})"
+                      f" [{result['method']}, {result['scenarios']} scenarios]\n")
+            elif decision == '12':
+                train(MATCH_CSV)
+                path = input(f"Odds file CSV/JSON ({', '.join(SLATE_COLS)}): ").strip()
+                slate, _ = resolve_slate(load_slate(path))
+                bankroll = float(input('What is our bankroll? '))
+                lines = scan_edges(slate, bankroll, SCALE, ENGINE)
+                print(f"\n{'Match':<46} {'Bet':>3} {'Prob':>6} {'Odds':>6} {'Fair':>6} {'EV':>7} {'Stake':>9}  Ladder (price:stake)")
+                for line in lines:
+                    match = f"{' / '.join(line['team1'])} vs {' / '.join(line['team2'])}"
+                    side = line['bet_team'] or (1 if line['ev_team1'] >= line['ev_team2'] else 2)
+                    prob = line['probability_team1'] if side == 1 else 1 - line['probability_team1']
+                    ladder = ' '.join(f"{step['price']:.2f}:{step['stake']:.2f}" for step in line['ladder'])
+                    print(f"{match[:46]:<46} {line['bet_team'] or '-':>3} {prob:>6.1%} {line['odds' + str(side)]:>6.2f} "
+                          f"{line['fair_odds']:>6.2f} {line['edge']:>+7.1%} {'$' + format(line['stake'], '.2f'):>9}  {ladder}")
+                print(f"\n{sum(1 for line in lines if line['bet_team'])} of {len(lines)} lines have an edge\n")
+            elif decision == '13':
+                method = input("Method (platt/isotonic, default platt): ").strip() or 'platt'
+                table, _ = calibrate(MATCH_CSV, SCALE, method)
+                save_calibration(cfg['cal_csv'], table)
+                calibration = table
+                print(f"Saved calibration to {cfg['cal_csv']}; predictions now use it\n")
+            elif decision == '14':
+                train_ratings(MATCH_CSV)
+                players = []
+                for i in range(4):
+                    name = input(f"player {i+1}{' (blank for player vs player)' if i == 1 else ''}: ").strip()
+                    if i == 1 and not name:
+                        break
+                    players.append(resolve_player(name))
+                if len(players) == 4:
+                    h2h = head_to_head(players[:2], players[2:], limit=20)
+                    side1, side2 = ' / '.join(players[:2]), ' / '.join(players[2:])
+                else:
+                    players.append(resolve_player(input("opponent: ").strip()))
+                    h2h = player_head_to_head(players[0], players[1], limit=20)
+                    side1, side2 = players
+                print(f"\n{side1} vs {side2}: {h2h['wins']}-{h2h['losses']} in {h2h['played']} meetings, "
+                      f"sets {h2h['sets_won']}-{h2h['sets_lost']}")
+                for meeting in h2h['meetings']:
+                    print(f"  {meeting['date']}  {meeting['tournament']:<40} {meeting['round']:<24} {meeting['sets']}  "
+                          f"{' / '.join(meeting['team1'])} vs {' / '.join(meeting['team2'])}")
+                print()
+            else:
+                while True:
+                    leave = input("Do you want to Quit: y/n \n")
+                    if leave == 'y' or leave == 'n':
+                        break
+                if leave == 'y':
                     break
-            if leave == 'y':
-                break
@@ -0,0 +1,218 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from functools import wraps
+
+# Profiling is off unless PPA_PROFILE is set (to 1, or to the directory the
+# reports go to) or enable() is called, e.g. by a --profile flag. Each
+# profiled operation writes three files named after it:
+#   <label>.txt        hotspot tables (by cumulative and own CPU time) and a
+#                      peak-memory report with the top allocating lines
+#   <label>.pstats     the raw cProfile data, for snakeviz / pstats
+#   <label>.collapsed  sampled call stacks in the collapsed format that
+#                      flamegraph.pl, inferno and speedscope read
+# Times are CPU time, so an option waiting on input() does not bury the work.
+# When off, session() returns a shared no-op context and profiled() calls
+# straight through.
+DEFAULT_DIR = 'profiles'
+TOP = 30
+SAMPLE_INTERVAL = 0.001
+MEMORY_TOP = 15
+
+_env = os.environ.get('PPA_PROFILE', '')
+ENABLED = _env not in ('', '0')
+OUT_DIR = _env if ENABLED and _env != '1' else DEFAULT_DIR
+_count = 0
+_count_lock = threading.Lock()
+# cProfile cannot run two profiles at once, so a second concurrent session
+# (a nested call, or another Flask request thread) runs unprofiled.
+_busy = threading.Lock()
+
+
+def enable(out_dir=None):
+    global ENABLED, OUT_DIR
+    ENABLED = True
+    if out_dir:
+        OUT_DIR = out_dir
+
+
+def flag_enabled(argv=None):
+    """True if argv asks for --profile[=DIR]; enables profiling (into DIR if given)."""
+    for arg in argv if argv is not None else sys.argv[1:]:
+        if arg == '--profile' or arg.startswith('--profile='):
+            enable(arg.partition('=')[2] or None)
+            return True
+    return False
+
+
+# ====== STACK SAMPLER ======
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler(threading.Thread):
+    """Samples one thread's Python stack every SAMPLE_INTERVAL, weighting each sample by the CPU time it
+    used since the last one (where the OS can say), so time blocked on I/O or input() is left out."""
+
+    def __init__(self, ident):
+        super().__init__(name='ppa-profile-sampler', daemon=True)
+        self.target = ident
+        self.stacks = {}
+        self.stopped = threading.Event()
+        try:
+            self.clock = time.pthread_getcpuclockid(ident)
+        except (AttributeError, OSError):
+            self.clock = None
+
+    def _cpu_us(self):
+        return int(time.clock_gettime(self.clock) * 1e6) if self.clock is not None else None
+
+    def run(self):
+        last = self._cpu_us()
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.target)
+            if frame is None:
+                continue
+            now = self._cpu_us()
+            weight = 1 if now is None else now - last
+            last = now
+            if weight <= 0:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            key = ';'.join(reversed(names))
+            self.stacks[key] = self.stacks.get(key, 0) + weight
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+# ====== PROFILER ======
+class Profiler:
+    """cProfile, tracemalloc and the stack sampler around one operation, started and stopped explicitly."""
+
+    def __init__(self, label, out_dir=None):
+        self.label = label
+        self.out_dir = out_dir or OUT_DIR
+        self.paths = None
+
+    def start(self):
+        self.active = _busy.acquire(blocking=False)
+        if not self.active:
+            return self
+        self._tracing = tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+        self._sampler = _Sampler(threading.get_ident())
+        self._sampler.start()
+        self._profile = cProfile.Profile(time.process_time)
+        self._wall = time.perf_counter()
+        self._profile.enable()
+        return self
+
+    def stop(self):
+        """Stop profiling and write the reports; returns their paths, or None if another session was running."""
+        if not self.active:
+            return None
+        self._profile.disable()
+        wall = time.perf_counter() - self._wall
+        self._sampler.stop()
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        if not self._tracing:
+            tracemalloc.stop()
+        try:
+            self.paths = self.write(wall, current, peak, snapshot)
+        finally:
+            _busy.release()
+        return self.paths
+
+    def write(self, wall, current, peak, snapshot):
+        global _count
+        os.makedirs(self.out_dir, exist_ok=True)
+        with _count_lock:
+            _count += 1
+            n = _count
+        base = os.path.join(self.out_dir, f"{self.label}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{n}")
+        paths = {'report': base + '.txt', 'pstats': base + '.pstats', 'collapsed': base + '.collapsed'}
+        self._profile.dump_stats(paths['pstats'])
+        with open(paths['report'], 'w', encoding='utf-8') as f:
+            f.write(f"{self.label}: {wall:.3f}s wall\n\n")
+            stats = pstats.Stats(self._profile, stream=f).strip_dirs()
+            f.write(f"=== Hotspots by cumulative CPU time (top {TOP}) ===\n")
+            stats.sort_stats('cumulative').print_stats(TOP)
+            f.write(f"=== Hotspots by own CPU time (top {TOP}) ===\n")
+            stats.sort_stats('tottime').print_stats(TOP)
+            f.write("=== Memory (tracemalloc) ===\n")
+            f.write(f"Peak traced: {peak / 1e6:.2f} MB   still allocated at the end: {current / 1e6:.2f} MB\n\n")
+            f.write(f"Top {MEMORY_TOP} lines by memory still allocated at the end:\n")
+            snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                               tracemalloc.Filter(False, __file__)])
+            for stat in snapshot.statistics('lineno')[:MEMORY_TOP]:
+                frame = stat.traceback[0]
+                f.write(f"  {stat.size / 1e3:>10.1f} KB {stat.count:>8} blocks  "
+                        f"{os.path.basename(frame.filename)}:{frame.lineno}\n")
+        with open(paths['collapsed'], 'w', encoding='utf-8') as f:
+            for stack, weight in sorted(self._sampler.stacks.items()):
+                f.write(f"{stack} {weight}\n")
+        return paths
+
+
+class _NullSession:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SESSION = _NullSession()
+
+
+class _Session:
+    def __init__(self, label, out_dir):
+        self.profiler = Profiler(label, out_dir)
+
+    def __enter__(self):
+        return self.profiler.start()
+
+    def __exit__(self, *exc):
+        paths = self.profiler.stop()
+        if paths is None:
+            print(f"\n[profile] {self.profiler.label} not profiled: another profile was running")
+        else:
+            print(f"\n[profile] {self.profiler.label} → {paths['report']}, {paths['collapsed']}")
+        return False
+
+
+def session(label, out_dir=None):
+    """Context manager profiling its body as label; a no-op while profiling is off."""
+    if not ENABLED:
+        return _NULL_SESSION
+    return _Session(label, out_dir)
+
+
+def profiled(label=None):
+    """Decorator profiling each call while profiling is on (checked per call, so --profile works after import)."""
+    def decorate(fn):
+        name = label or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _Session(name, None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,307 @@
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+import ppaPrediction as elo_module
+import ppaSnapshot
+
+# ====== CONFIG ======
+# Production serving: the master process trains each division once and writes
+# an immutable snapshot per division; pre-forked workers memory-map the
+# snapshots read-only and answer from them without ever training. Workers
+# share the listening socket (the kernel spreads connections across them) and
+# the snapshot pages. When a match CSV changes the master writes a new
+# snapshot over the old one (atomic rename); workers notice on their next
+# check and map the new file.
+DIVISIONS = {'mens': '1', 'womens': '2', 'mixed': '3'}  # app.py name -> ppaPrediction.DIVISIONS key
+SNAPSHOT_DIR = 'snapshots'
+DEFAULT_PORT = 8000
+RELOAD_CHECK_SECONDS = 1.0
+DEFAULT_POLL_SECONDS = 5.0
+
+
+def snapshot_path(snapshot_dir, division):
+    return os.path.join(snapshot_dir, f'{division}.snap')
+
+
+# ====== BUILD ======
+def build_snapshot(division, snapshot_dir=SNAPSHOT_DIR):
+    """Train division and write its snapshot; returns the snapshot header, or None without a match CSV."""
+    cfg = elo_module.DIVISIONS[DIVISIONS[division]]
+    if not os.path.exists(cfg['match_csv']):
+        return None
+    os.makedirs(snapshot_dir, exist_ok=True)
+    elo_module.train_snapshot(cfg['match_csv'], vectorized=True, calibration_scale=cfg['scale'])
+    header = ppaSnapshot.write_snapshot(snapshot_path(snapshot_dir, division), cfg['scale'], cfg['match_csv'])
+    elo_module.reset_ratings()
+    return header
+
+
+def build_all(snapshot_dir=SNAPSHOT_DIR):
+    """Build every division's snapshot; returns {division: match CSV mtime} for the ones built."""
+    built = {}
+    for division in DIVISIONS:
+        match_csv = elo_module.DIVISIONS[DIVISIONS[division]]['match_csv']
+        start = time.perf_counter()
+        header = build_snapshot(division, snapshot_dir)
+        if header is None:
+            print(f"  {division:<7} no {match_csv}, skipped")
+            continue
+        built[division] = os.stat(match_csv).st_mtime_ns
+        print(f"  {division:<7} {header['players']} players, {header['pairs']} pairs, "
+              f"version {header['source']} ({time.perf_counter() - start:.2f}s)")
+    return built
+
+
+# ====== WORKER ======
+class Snapshots:
+    """The division snapshots this process has mapped, remapped when the file on disk is replaced.
+
+    A replaced model is closed straight away only with close_replaced, which is
+    safe in a single-threaded worker. Otherwise another request thread may
+    still be reading it, so the reference is just dropped. Its array views keep
+    the mapping alive until the last reader is done, and then it is unmapped.
+    """
+
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR, close_replaced=False):
+        self.snapshot_dir = snapshot_dir
+        self.close_replaced = close_replaced
+        self.models = {}  # division -> (model, (inode, mtime), last checked)
+
+    def get(self, division):
+        entry = self.models.get(division)
+        now = time.monotonic()
+        if entry is not None and now - entry[2] < RELOAD_CHECK_SECONDS:
+            return entry[0]
+        path = snapshot_path(self.snapshot_dir, division)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"No model snapshot for {division}: {path}")
+        key = (st.st_ino, st.st_mtime_ns)
+        if entry is not None and entry[1] == key:
+            self.models[division] = (entry[0], key, now)
+            return entry[0]
+        model = ppaSnapshot.open_snapshot(path)
+        if entry is not None and self.close_replaced:
+            entry[0].close()
+        self.models[division] = (model, key, now)
+        return model
+
+
+app = Flask(__name__)
+snapshots = Snapshots()
+
+
+def request_params():
+    if request.method == 'GET':
+        return request.args.to_dict()
+    return request.get_json(silent=True) or {}
+
+
+def _division(division):
+    return division if division in DIVISIONS else 'mens'
+
+
+def model_info(model):
+    return {
+        'model_version': model.header['source'],
+        'model_trained_at': model.header['created'],
+        'calibrated': model.calibration is not None,
+    }
+
+
+@app.route('/api/predict', methods=['POST'])
+def api_predict():
+    d = request.json
+    if d.get('engine', 'elo') != 'elo':
+        return jsonify({'error': 'Snapshot serving only has the elo engine'}), 400
+    try:
+        model = snapshots.get(_division(d.get('division', 'mens')))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    corrected = []
+    players = []
+    for p in d['players']:
+        r = model.resolve(p)
+        if r != p:
+            corrected.append(f"'{p}' → '{r}'")
+        players.append(r)
+    prob = model.predict([players[0], players[1]], [players[2], players[3]])
+    return jsonify({
+        'prob_team1': prob,
+        'prob_team2': 1 - prob,
+        'team1': [players[0], players[1]],
+        'team2': [players[2], players[3]],
+        'corrected': corrected if corrected else None,
+        'engine': 'elo',
+        **model_info(model)
+    })
+
+
+@app.route('/api/rankings', methods=['GET', 'POST'])
+def api_rankings():
+    d = request_params()
+    try:
+        model = snapshots.get(_division(d.get('division', 'mens')))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    offset = max(0, int(d.get('offset', 0)))
+    limit = max(1, int(d.get('limit', 10)))
+    players = [{'rank': row['rank'], 'name': row['player'], 'elo': round(row['elo'], 3),
+                'matches': row['matches_played'], 'reliability': row['reliability_score']}
+               for row in model.leaderboard(offset, limit)]
+    return jsonify({'players': players, 'offset': offset, 'total': model.n, **model_info(model)})
+
+
+@app.route('/api/player', methods=['GET', 'POST'])
+def api_player():
+    d = request_params()
+    try:
+        model = snapshots.get(_division(d.get('division', 'mens')))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    name = d['name']
+    resolved = model.resolve(name)
+    pid = model.player_id(resolved)
+    if pid < 0:
+        return jsonify({'error': f'Player "{name}" not found.'})
+    return jsonify({
+        'name': resolved,
+        'original': name,
+        'corrected': resolved != name,
+        'elo': round(model.elo_of(pid), 3),
+        'rank': pid + 1,
+        'total': model.n,
+        'matches': int(model.matches_played[pid]),
+        'reliability': float(model.reliability[pid]),
+        **model_info(model)
+    })
+
+
+@app.route('/api/health')
+def api_health():
+    divisions = {}
+    for division in DIVISIONS:
+        try:
+            divisions[division] = snapshots.get(division).header['source']
+        except FileNotFoundError:
+            divisions[division] = None
+    return jsonify({'pid': os.getpid(), 'divisions': divisions})
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def run_worker(listener, snapshot_dir):
+    """Serve requests on the shared listening socket until terminated."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    snapshots.snapshot_dir = snapshot_dir
+    # Forked workers serve one request at a time, so nothing else can be reading a replaced model.
+    snapshots.close_replaced = True
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app, request_handler=QuietHandler, fd=listener.fileno())
+    server.serve_forever()
+
+
+# ====== MASTER ======
+def serve(host='127.0.0.1', port=DEFAULT_PORT, workers=None, snapshot_dir=SNAPSHOT_DIR,
+          poll_seconds=DEFAULT_POLL_SECONDS, build=True):
+    """Build snapshots, pre-fork workers onto one listening socket and keep them running.
+
+    Dead workers are replaced; with poll_seconds, changed match CSVs are
+    retrained and their snapshots rewritten while the workers keep serving.
+    """
+    workers = workers or os.cpu_count() or 1
+    sources = build_all(snapshot_dir) if build else {}
+    listener = socket.create_server((host, port), backlog=128)
+    listener.set_inheritable(True)
+    print(f"Serving snapshots from {snapshot_dir} at http://{host}:{port}")
+
+    if not hasattr(os, 'fork'):
+        # No fork (Windows): one threaded process over the same snapshots.
+        print("  os.fork is unavailable; serving from a single threaded process")
+        snapshots.snapshot_dir = snapshot_dir
+        make_server(host, port, app, threaded=True, request_handler=QuietHandler, fd=listener.fileno()).serve_forever()
+        return
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(listener, snapshot_dir)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    print(f"  {workers} workers: {', '.join(str(p) for p in sorted(children))}")
+
+    next_poll = time.monotonic() + (poll_seconds or 0)
+    while not stopping:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid:
+            children.discard(pid)
+            if not stopping:
+                print(f"  worker {pid} exited; starting a replacement")
+                spawn()
+            continue
+        if poll_seconds and time.monotonic() >= next_poll:
+            for division in DIVISIONS:
+                match_csv = elo_module.DIVISIONS[DIVISIONS[division]]['match_csv']
+                if os.path.exists(match_csv) and os.stat(match_csv).st_mtime_ns != sources.get(division):
+                    print(f"  {match_csv} changed; rebuilding {division}")
+                    build_snapshot(division, snapshot_dir)
+                    sources[division] = os.stat(match_csv).st_mtime_ns
+            next_poll = time.monotonic() + poll_seconds
+        time.sleep(0.2)
+
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    listener.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve predictions from memory-mapped model snapshots '
+                                                 'with pre-forked worker processes.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--snapshots', default=SNAPSHOT_DIR, help='directory for the model snapshots')
+    parser.add_argument('--poll', type=float, default=DEFAULT_POLL_SECONDS,
+                        help='seconds between match CSV checks (0 to never rebuild)')
+    parser.add_argument('--no-build', action='store_true', help='serve the existing snapshots without training')
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    serve(args.host, args.port, args.workers, args.snapshots, args.poll, not args.no_build)
+    sys.exit(0)
@@ -0,0 +1,236 @@
+import os
+import json
+import math
+import mmap
+import time
+import struct
+import difflib
+import bisect
+
+import numpy as np
+
+import ppaInput
+import ppaPrediction as elo_module
+
+# ====== FORMAT ======
+# One file per trained model: MAGIC, a little-endian uint32 format version and
+# uint64 header length, a JSON header, then raw little-endian arrays, each
+# starting on an ALIGN-byte boundary. The header lists every array as
+# [dtype, shape, offset], so a reader maps the file once and takes zero-copy
+# NumPy views of it. Files are written to a temporary name and renamed into
+# place, so a reader never sees a half-written snapshot. The arrays themselves
+# are written by ppaPrediction.save_model.
+MAGIC = b'PPASNAP\0'
+FORMAT_VERSION = 2
+ALIGN = 64
+_PREAMBLE = struct.Struct('<8sIQ')
+
+
+def _aligned(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+def write_arrays(path, header, arrays):
+    """Write arrays (name -> ndarray) and the header dict to path atomically."""
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    table = {}
+    offset = 0
+    for name, a in arrays.items():
+        table[name] = [a.dtype.newbyteorder('<').str, list(a.shape), offset]
+        offset = _aligned(offset + a.nbytes)
+    header = dict(header, format_version=FORMAT_VERSION, arrays=table)
+    blob = json.dumps(header).encode('utf-8')
+    data_start = _aligned(_PREAMBLE.size + len(blob))
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(blob)))
+        f.write(blob)
+        for name, a in arrays.items():
+            f.seek(data_start + table[name][2])
+            f.write(a.astype(table[name][0], copy=False).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+
+
+def read_arrays(path):
+    """(header, arrays, mmap): read-only views of every array in the snapshot at path."""
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, header_len = _PREAMBLE.unpack_from(buf, 0)
+    if magic != MAGIC:
+        buf.close()
+        raise ValueError(f'{path} is not a model snapshot')
+    if version > FORMAT_VERSION:
+        buf.close()
+        raise ValueError(f'{path} is snapshot format {version}; this version reads up to {FORMAT_VERSION}')
+    header = json.loads(buf[_PREAMBLE.size:_PREAMBLE.size + header_len].decode('utf-8'))
+    data_start = _aligned(_PREAMBLE.size + header_len)
+    arrays = {}
+    for name, (dtype, shape, offset) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(buf, dtype=dtype, count=count, offset=data_start + offset).reshape(shape)
+    return header, arrays, buf
+
+
+def encode_names(names):
+    """(utf-8 blob, offsets) for a list of strings; string i is blob[offsets[i]:offsets[i + 1]]."""
+    encoded = [n.encode('utf-8') for n in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def decode_names(blob, offsets):
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+# ====== WRITE ======
+def write_snapshot(path, scale=0.15, source=None):
+    """Write ppaPrediction's current model to path for predict at scale; source is the match CSV it was trained on."""
+    return elo_module.save_model(path, scale, source)
+
+
+# ====== READ ======
+class SnapshotModel:
+    """A trained model served straight from a memory-mapped snapshot.
+
+    Nothing is copied out of the file: every process that opens the same
+    snapshot shares its pages. Predictions match ppaPrediction.predict on the
+    model the snapshot was written from.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header, self.arrays, self._buf = read_arrays(path)
+        for name, a in self.arrays.items():
+            setattr(self, name, a)
+        params = self.header['params']
+        self.scale = params['scale']
+        self.initial_elo = params['initial_elo']
+        self.half_life = params.get('decay_half_life_days')
+        self.pair_tiers = params['pair_tiers']
+        self.pair_tier_weights = params['pair_tier_weights']
+        self.calibration = self.arrays.get('calibration')
+        self.n = len(self.elo)
+        # get_effective_elo of a player with no rating or recent form
+        self.unrated_effective = 0.7 * self.initial_elo + 0.3 * self.initial_elo
+        self._names = None
+        self._keys = None
+        self._resolve_cache = {}
+
+    def close(self):
+        """Drop the array views and unmap the file (left to the GC if a view is still referenced elsewhere)."""
+        for name in self.header['arrays']:
+            delattr(self, name)
+        self.arrays = self.calibration = None
+        try:
+            self._buf.close()
+        except BufferError:
+            pass
+
+    # --- names ---
+    def name(self, pid):
+        return self.name_blob[self.name_offsets[pid]:self.name_offsets[pid + 1]].tobytes().decode('utf-8')
+
+    def _name_bytes(self, pid):
+        return self.name_blob[self.name_offsets[pid]:self.name_offsets[pid + 1]].tobytes()
+
+    def player_id(self, name):
+        """Id (rank - 1) of the player with exactly this name, or -1."""
+        key = name.encode('utf-8')
+        i = bisect.bisect_left(range(self.n), key, key=lambda j: self._name_bytes(self.name_order[j]))
+        if i < self.n and self._name_bytes(self.name_order[i]) == key:
+            return int(self.name_order[i])
+        return -1
+
+    def resolve(self, name):
+        """Same resolution as ppaPrediction.resolve_player, without printing the correction."""
+        if self.n == 0:
+            return name
+        resolved = self._resolve_cache.get(name)
+        if resolved is None:
+            if self.player_id(name) >= 0:
+                resolved = name
+            else:
+                if self._names is None:
+                    self._names = [self.name(i) for i in range(self.n)]
+                    self._keys = {}
+                    for p in self._names:
+                        self._keys.setdefault(ppaInput.name_key(p), p)
+                    for alias, p in ppaInput.load_aliases().items():
+                        canonical = self._keys.get(ppaInput.name_key(p))
+                        if canonical is not None:
+                            self._keys.setdefault(ppaInput.name_key(alias), canonical)
+                resolved = self._keys.get(ppaInput.name_key(name))
+                if resolved is None:
+                    matches = difflib.get_close_matches(name, self._names, n=1, cutoff=0.6)
+                    resolved = matches[0] if matches else name
+            self._resolve_cache[name] = resolved
+        return resolved
+
+    # --- ratings ---
+    def _decayed(self, pid, value):
+        """value for player pid with the inactivity decay up to today, as ppaPrediction.decayed applies it."""
+        if self.half_life is None or self.last_played[pid] < 0:
+            return value
+        idle = max(0, elo_module.day_number(np.datetime64('today', 'D')) - int(self.last_played[pid]))
+        f = 0.5 ** (idle / self.half_life)
+        return value if f == 1.0 else self.initial_elo + (value - self.initial_elo) * f
+
+    def elo_of(self, pid):
+        return self._decayed(pid, float(self.elo[pid]))
+
+    def rating(self, name):
+        pid = self.player_id(name)
+        return self.initial_elo if pid < 0 else self.elo_of(pid)
+
+    def reliability_score(self, name):
+        pid = self.player_id(name)
+        return 0.0 if pid < 0 else float(self.reliability[pid])
+
+    def rank(self, name):
+        pid = self.player_id(name)
+        return None if pid < 0 else pid + 1
+
+    def leaderboard(self, offset=0, limit=10):
+        return [{'rank': pid + 1, 'player': self.name(pid), 'elo': self.elo_of(pid),
+                 'matches_played': int(self.matches_played[pid]), 'reliability_score': float(self.reliability[pid])}
+                for pid in range(offset, min(self.n, offset + limit))]
+
+    def _pair(self, a, b):
+        """(pair_elo, matches) for players a and b by id, or (None, 0) if they never played together."""
+        if a < 0 or b < 0:
+            return None, 0
+        key = min(a, b) * self.n + max(a, b)
+        i = int(np.searchsorted(self.pair_key, key))
+        if i < len(self.pair_key) and self.pair_key[i] == key:
+            return float(self.pair_elo[i]), int(self.pair_matches[i])
+        return None, 0
+
+    def _team_strength(self, ids):
+        p1, p2 = (self.unrated_effective if pid < 0 else self._decayed(pid, float(self.effective[pid])) for pid in ids)
+        individual_strength = 0.6 * max(p1, p2) + 0.4 * min(p1, p2)
+        pair, matches = self._pair(*ids)
+        weight = self.pair_tier_weights[bisect.bisect_right(self.pair_tiers, matches) - 1]
+        if weight > 0:
+            return (1 - weight) * individual_strength + weight * pair
+        return individual_strength
+
+    def predict(self, team1, team2, calibrated=True):
+        """Win probability for team1, exactly as ppaPrediction.predict computes it at the snapshot's scale."""
+        ids = [self.player_id(p) for p in list(team1) + list(team2)]
+        diff = self._team_strength(ids[:2]) - self._team_strength(ids[2:])
+        prob = 1 / (1 + math.exp(-diff / self.scale))
+        avg_reliability = sum(0.0 if pid < 0 else float(self.reliability[pid]) for pid in ids) / 400
+        uncertainty = 1 - avg_reliability
+        prob = prob * (1 - uncertainty) + 0.5 * uncertainty
+        if calibrated and self.calibration is not None:
+            prob = float(elo_module.apply_calibration(prob, self.calibration))
+        return prob
+
+
+def open_snapshot(path):
+    return SnapshotModel(path)
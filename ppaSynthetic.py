@@ -0,0 +1,261 @@
+import csv
+import math
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from ppaInput import HEADERS
+import ppaPrediction as elo_module
+
+# ====== CONFIG ======
+# Defaults give a league shaped like the bundled men's data: ~500 players,
+# 64-team draws every two weeks, most teams keeping their partner.
+DEFAULTS = {
+    'players': 500,
+    'tournaments': 67,
+    'draw_size': 64,
+    'stickiness': 0.85,
+    'cadence_days': 14,
+    'consolation': True,
+    'skill_sd': 0.25,
+    'skill_drift': 0.01,
+    'true_scale': 0.1,
+    'start_date': '2023-01-15',
+    'division': 'Mens Doubles',
+    'seed': 0,
+}
+
+SYLLABLES = ['ka', 'ro', 'mi', 'ten', 'sa', 'lo', 'vi', 'dor', 'el', 'ba', 'nu', 'fer',
+             'ti', 'gan', 'so', 'ren', 'li', 'mo', 'har', 'de', 'wen', 'ju', 'pel', 'cor']
+INITIALS = 'ABCDEFGHIJKLMNORSTVWZ'
+ROUND_NAMES = {2: 'Finals', 4: 'Semi-Finals', 8: 'Quarter Finals'}
+
+
+def round_name(teams_left, prefix=''):
+    return prefix + ROUND_NAMES.get(teams_left, f'Round {teams_left}')
+
+
+def make_names(n, rng):
+    """n unique 'Surname X.' names in the same shape as the scraped data."""
+    names = set()
+    while len(names) < n:
+        surname = ''.join(rng.choice(SYLLABLES, size=rng.integers(2, 4))).capitalize()
+        names.add(f'{surname} {rng.choice(list(INITIALS))}.')
+    return sorted(names)
+
+
+def days_before(rnd):
+    """Early rounds are played on the days leading up to finals day."""
+    if rnd.endswith(('Finals', 'Semi-Finals', 'Bronze Medal Match')) and 'Quarter' not in rnd:
+        return 0
+    return 1 if 'Quarter' in rnd else 2
+
+
+def fmt_raw_date(date):
+    return f'{date:%b} {date.day}, {date.year}'
+
+
+# ====== SIMULATION ======
+def team_skill(skills, team):
+    a, b = skills[team[0]], skills[team[1]]
+    return 0.6 * max(a, b) + 0.4 * min(a, b)
+
+
+def play_match(skills, team1, team2, true_scale, rng):
+    """Best of three games; returns (team1_sets, team2_sets, game scores)."""
+    p = 1 / (1 + math.exp(-(team_skill(skills, team1) - team_skill(skills, team2)) / true_scale))
+    sets = [0, 0]
+    games = []
+    while max(sets) < 2:
+        winner = 0 if rng.random() < p else 1
+        loser_points = int(rng.integers(0, 10))
+        games.append((11, loser_points) if winner == 0 else (loser_points, 11))
+        sets[winner] += 1
+    return sets[0], sets[1], games
+
+
+def form_teams(players, partner, stickiness, rng):
+    """Pair up the field, keeping last event's partner with probability stickiness."""
+    available = set(players)
+    teams = []
+    for p in rng.permutation(players):
+        if p not in available:
+            continue
+        q = partner.get(p)
+        if q in available and q != p and rng.random() < stickiness:
+            available -= {p, q}
+            teams.append((p, q))
+    rest = rng.permutation(sorted(available))
+    for i in range(0, len(rest) - 1, 2):
+        teams.append((rest[i], rest[i + 1]))
+    for p, q in teams:
+        partner[p], partner[q] = q, p
+    return teams
+
+
+def run_bracket(teams, skills, true_scale, rng, prefix=''):
+    """Single elimination over teams (a power of two).
+
+    Returns the played matches plus the first-round and semi-final losers.
+    """
+    matches = []
+    first_round_losers = []
+    semi_losers = []
+    current = list(teams)
+    while len(current) > 1:
+        name = round_name(len(current), prefix)
+        winners = []
+        for i in range(0, len(current), 2):
+            t1, t2 = current[i], current[i + 1]
+            s1, s2, games = play_match(skills, t1, t2, true_scale, rng)
+            matches.append((name, t1, t2, s1, s2, games))
+            winners.append(t1 if s1 > s2 else t2)
+            loser = t2 if s1 > s2 else t1
+            if len(current) == len(teams):
+                first_round_losers.append(loser)
+            if len(current) == 4:
+                semi_losers.append(loser)
+        current = winners
+    return matches, first_round_losers, semi_losers
+
+
+def generate(players=None, tournaments=None, draw_size=None, stickiness=None, cadence_days=None,
+             consolation=None, skill_sd=None, skill_drift=None, true_scale=None, start_date=None,
+             seed=None):
+    """Simulate a league from hidden skills.
+
+    Returns (matches, truth): matches is a list of dicts with HEADERS keys plus
+    'games' (per-game scores), truth a DataFrame of each player's final true skill.
+    """
+    overrides = {k: v for k, v in locals().items() if v is not None}
+    cfg = dict(DEFAULTS, **overrides)
+    rng = np.random.default_rng(cfg['seed'])
+    names = make_names(cfg['players'], rng)
+    skills = dict(zip(names, elo_module.INITIAL_ELO + rng.normal(0, cfg['skill_sd'], len(names))))
+    partner = {}
+    draw = min(cfg['draw_size'], 2 ** int(math.log2(len(names) // 2)))
+    date = datetime.date.fromisoformat(cfg['start_date'])
+    matches = []
+    year_counts = {}
+    for _ in range(cfg['tournaments']):
+        year_counts[date.year] = year_counts.get(date.year, 0) + 1
+        tournament = f'{date.year} PPA Synthetic Open {year_counts[date.year]}'
+        teams = form_teams(names, partner, cfg['stickiness'], rng)
+        # Seeded entry: the strongest teams usually make the draw, with noise.
+        entry_score = [team_skill(skills, t) + rng.normal(0, cfg['skill_sd'] / 2) for t in teams]
+        field = [teams[i] for i in np.argsort(entry_score)[::-1][:draw]]
+        field = [field[i] for i in rng.permutation(len(field))]
+        main, first_losers, semi_losers = run_bracket(field, skills, cfg['true_scale'], rng)
+        bracket = list(main)
+        if len(semi_losers) == 2:
+            s1, s2, games = play_match(skills, semi_losers[0], semi_losers[1], cfg['true_scale'], rng)
+            bracket.append(('Bronze Medal Match', semi_losers[0], semi_losers[1], s1, s2, games))
+        if cfg['consolation'] and len(first_losers) >= 2:
+            cons, _, _ = run_bracket(first_losers, skills, cfg['true_scale'], rng, 'Consolation Bracket ')
+            bracket.extend(cons)
+        for rnd, t1, t2, s1, s2, games in bracket:
+            matches.append({
+                'tournament': tournament, 'round': rnd,
+                'date': (date - datetime.timedelta(days=days_before(rnd))).isoformat(),
+                'team1_player1': t1[0], 'team1_player2': t1[1],
+                'team2_player1': t2[0], 'team2_player2': t2[1],
+                'team1_sets': s1, 'team2_sets': s2, 'games': games,
+            })
+        if cfg['skill_drift']:
+            for n, d in zip(names, rng.normal(0, cfg['skill_drift'], len(names))):
+                skills[n] += d
+        date += datetime.timedelta(days=cfg['cadence_days'])
+    truth = pd.DataFrame({'player': names, 'true_skill': [skills[n] for n in names]})
+    return matches, truth
+
+
+# ====== OUTPUT ======
+def write_matches_csv(matches, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        for m in matches:
+            writer.writerow([m[h] for h in HEADERS])
+
+
+def write_raw_text(matches, path, division=DEFAULTS['division']):
+    """Write matches in the ppa_raw.txt layout that ppaInput.parse_file reads."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for m in matches:
+            date = datetime.date.fromisoformat(m['date'])
+            f.write(f"{m['tournament']}\n{m['round']} • {division} • {fmt_raw_date(date)}\n")
+            if m['round'] in ('Finals', 'Bronze Medal Match'):
+                f.write('Medal\n')
+            f.write(f"{m['team1_player1']} / {m['team1_player2']}\n{m['team1_sets']}\n")
+            f.write(''.join(f'{g[0]}\n' for g in m['games']))
+            f.write(f"{m['team2_player1']} / {m['team2_player2']}\n{m['team2_sets']}\n")
+            f.write(''.join(f'{g[1]}\n' for g in m['games']))
+            f.write('View\n')
+
+
+# ====== CONVERGENCE ======
+def convergence(match_csv, truth, every=500, min_matches=5, scale=0.1):
+    """Replay match_csv and track how closely ratings track the hidden skills.
+
+    Every `every` matches, reports Pearson and Spearman correlation and RMSE
+    (after removing the mean offset) between ELO and true skill for players
+    with at least min_matches.
+    """
+    df = pd.read_csv(match_csv).sort_values(by='date', kind='stable')
+    true_skill = dict(zip(truth['player'], truth['true_skill']))
+    elo_module.reset_ratings()
+    elo_module.tournaments_seen = set()
+    rows = []
+    for i, (_, row) in enumerate(df.iterrows(), start=1):
+        team1 = [row['team1_player1'], row['team1_player2']]
+        team2 = [row['team2_player1'], row['team2_player2']]
+        elo_module.tournaments_seen.add(row['tournament'])
+        elo_module.update_elo(team1, team2, row['team1_sets'], row['team2_sets'], scale=scale)
+        if i % every == 0 or i == len(df):
+            players = [p for p, n in elo_module.matches_played.items() if n >= min_matches]
+            if len(players) < 3:
+                continue
+            elo = np.array([elo_module.player_elo[p] for p in players])
+            skill = np.array([true_skill[p] for p in players])
+            err = (elo - elo.mean()) - (skill - skill.mean())
+            rows.append({
+                'matches': i,
+                'players': len(players),
+                'pearson': float(np.corrcoef(elo, skill)[0, 1]),
+                'spearman': float(pd.Series(elo).rank().corr(pd.Series(skill).rank())),
+                'rmse': float(np.sqrt(np.mean(err ** 2))),
+            })
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic doubles league from hidden skills.')
+    parser.add_argument('--players', type=int, default=DEFAULTS['players'])
+    parser.add_argument('--tournaments', type=int, default=DEFAULTS['tournaments'])
+    parser.add_argument('--draw', type=int, default=DEFAULTS['draw_size'], help='teams per main draw (power of two)')
+    parser.add_argument('--stickiness', type=float, default=DEFAULTS['stickiness'],
+                        help='probability a team stays together for the next event')
+    parser.add_argument('--cadence', type=int, default=DEFAULTS['cadence_days'], help='days between tournaments')
+    parser.add_argument('--no-consolation', action='store_true', help='main draw and bronze match only')
+    parser.add_argument('--drift', type=float, default=DEFAULTS['skill_drift'], help='per-tournament skill random walk sd')
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'])
+    parser.add_argument('--out', default='synthetic_matches.csv')
+    parser.add_argument('--raw', help='also write ppa_raw.txt-style text here')
+    parser.add_argument('--truth', default='synthetic_truth.csv')
+    parser.add_argument('--convergence', action='store_true', help='replay the output and report convergence to truth')
+    args = parser.parse_args()
+
+    matches, truth = generate(players=args.players, tournaments=args.tournaments, draw_size=args.draw,
+                              stickiness=args.stickiness, cadence_days=args.cadence,
+                              consolation=not args.no_consolation, skill_drift=args.drift, seed=args.seed)
+    write_matches_csv(matches, args.out)
+    truth.to_csv(args.truth, index=False)
+    print(f"Generated {len(matches)} matches for {args.players} players → {args.out} (truth: {args.truth})")
+    if args.raw:
+        write_raw_text(matches, args.raw)
+        print(f"Raw text → {args.raw}")
+    if args.convergence:
+        report = convergence(args.out, truth)
+        print(report.to_string(index=False))